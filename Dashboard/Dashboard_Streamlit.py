@@ -3,17 +3,170 @@ import altair as alt
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import pandas as pd
 import numpy as np
-from snowflake.snowpark.context import get_active_session
+import os
+import atexit
+from dataclasses import replace
 from datetime import datetime
+from functools import partial
+from query_cache import QueryCache
+from aggregate_cube import DEFAULT_CUBES, CubeRouter
+from disproportionality import ContingencyTable, pair_counts_sql
+from dimension_catalog import DimensionCatalogStore, catalog_sql
+from feedback_schema import apply_schema, concat_frames
+from forecasting import HORIZON_MONTHS, MIN_OBSERVED_MONTHS, ForecastStore, monthly_sql
+from labeling import ScoreLabeler
+from local_engine import CHECKSUM_SQL, LocalAnalyticsEngine
+from local_session import LocalSession
+from query_executor import QueryExecutor, fetch_pandas
+from query_filters import FeedbackFilter
+from report_export import ExportDirectory, available_formats, session_batches
+from report_pager import FEEDBACK_KEYS, KeysetPager, OffsetPager
+from page_queries import (
+    REPORT_TYPES, drug_performance_plan, executive_plan, geographic_plan, report_query, report_summary_sql, safety_plan,
+    segmentation_plan,
+)
+
+try:
+    from snowflake.snowpark.context import get_active_session
+except ImportError:  # no Snowpark: run on the local session backend
+    get_active_session = None
 
-session = get_active_session()
 DATABASE = "SF_HACKATHON_DB"
 SCHEMA = "CRYPTO_COUGARS_SCHEMA" 
 TABLE = "MODIFIED_DATA"
 BASE_TABLE = f"{DATABASE}.{SCHEMA}.{TABLE}"
 
+# "snowflake" queries the active Snowpark session; "local" (DuckDB when
+# installed, else SQLite), "duckdb" or "sqlite" answer the same SQL from
+# Dataset/Enriched_data.csv without a warehouse, e.g. for CI load tests
+SESSION_BACKEND = os.environ.get("DASHBOARD_SESSION_BACKEND", "snowflake" if get_active_session else "local")
+
+@st.cache_resource
+def get_local_session(backend):
+    return LocalSession(table_name=TABLE, schema=SCHEMA, backend=None if backend == "local" else backend)
+
+session = get_active_session() if SESSION_BACKEND == "snowflake" else get_local_session(SESSION_BACKEND)
+
+# Query result cache settings (shared by every viewer of the app)
+CACHE_TTL_SECONDS = 600
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+VERSION_CHECK_SECONDS = 60
+
+# "local" answers page queries from an in-process columnar snapshot of the
+# table, "warehouse" sends every page query to Snowflake
+ENGINE_MODE = "local"
+LOCAL_SNAPSHOT_PATH = None
+
+# True sends each page as one GROUPING SETS statement; False runs one
+# statement per chart, concurrently on the query executor
+QUERY_BATCHING = True
+QUERY_MAX_WORKERS = 6
+QUERY_TIMEOUT_SECONDS = 60
+
+# Reports show this many rows per page; exports always contain every row
+REPORT_PAGE_ROWS = 100
+
+# Answer page aggregations from pre-aggregated summary cubes where possible;
+# enrichment.py and ingestion.py keep the warehouse cubes current
+AGGREGATE_CUBES = True
+
+# Backends without GROUPING SETS (the SQLite session) run one statement per chart
+QUERY_BATCHING = QUERY_BATCHING and getattr(session, "supports_grouping_sets", True)
+
+@st.cache_resource
+def get_query_cache():
+    return QueryCache(ttl_seconds=CACHE_TTL_SECONDS, max_bytes=CACHE_MAX_BYTES)
+
+@st.cache_resource
+def get_catalog_store():
+    return DimensionCatalogStore()
+
+@st.cache_resource
+def get_local_engine():
+    if ENGINE_MODE != "local" or not LocalAnalyticsEngine.available():
+        return None
+    dialect = SESSION_BACKEND if SESSION_BACKEND == "snowflake" else session.backend.name
+    return LocalAnalyticsEngine(BASE_TABLE, snapshot_path=LOCAL_SNAPSHOT_PATH,
+                                cubes=DEFAULT_CUBES if AGGREGATE_CUBES else (), labeler=ScoreLabeler(),
+                                checksum_sql=CHECKSUM_SQL.get(dialect))
+
+@st.cache_resource
+def get_forecast_store():
+    return ForecastStore()
+
+@st.cache_resource
+def get_cube_router():
+    return CubeRouter(BASE_TABLE, DEFAULT_CUBES) if AGGREGATE_CUBES else None
+
+@st.cache_resource
+def get_query_executor():
+    executor = QueryExecutor(max_workers=QUERY_MAX_WORKERS, timeout_seconds=QUERY_TIMEOUT_SECONDS)
+    # Cancels warehouse jobs still running when the server stops
+    atexit.register(executor.shutdown)
+    return executor
+
+query_cache = get_query_cache()
+catalog_store = get_catalog_store()
+local_engine = get_local_engine()
+query_executor = get_query_executor()
+cube_router = get_cube_router()
+forecast_store = get_forecast_store()
+
+def run_query(sql, params=()):
+    """Run a page query on the local snapshot, or through the shared result cache
+
+    ``params`` are the ``?`` bind values; together with the SQL text they
+    form the cache key.
+    """
+    params = list(params)
+    if local_engine is not None and local_engine.ready:
+        return local_engine.sql(sql, params)
+    return query_cache.get_or_load(
+        sql, params,
+        lambda: fetch_pandas(session, sql, timeout=QUERY_TIMEOUT_SECONDS,
+                             cancel_event=query_executor.cancel_event, params=params),
+        tables=(TABLE,)
+    )
+
+def prefetch_query(sql, params=()):
+    """Warm the result cache for a query the user is likely to open next"""
+    if local_engine is not None and local_engine.ready:
+        return
+    query_executor.submit(partial(run_query, sql, params))
+
+def route_page_plan(plan):
+    """Apply the batching setting and send what the cubes can answer to them"""
+    plan.use_grouping_sets = QUERY_BATCHING
+    if cube_router is None:
+        return plan
+    if local_engine is not None and local_engine.ready:
+        return cube_router.route(plan)
+    return cube_router.route(plan, cube_router.available)
+
+def stream_page_plan(plan):
+    """Yield ``(chart name, DataFrame or exception)`` as each page query completes"""
+    return route_page_plan(plan).stream(run_query, query_executor)
+
+def run_page_plan(plan):
+    return route_page_plan(plan).run(run_query, query_executor)
+
+def drug_event_table(filters):
+    """Drug x side-effect counts of the filtered population; every drug stays in it as the comparator"""
+    where, params = replace(filters, drugs=()).where()
+    return ContingencyTable.from_counts(run_query(pair_counts_sql(BASE_TABLE, where), params))
+
+@st.cache_data(ttl=VERSION_CHECK_SECONDS, show_spinner=False)
+def current_table_version():
+    """Cheap metadata probe that changes whenever MODIFIED_DATA is rewritten"""
+    version_sql = f"""
+    SELECT ROW_COUNT, LAST_ALTERED
+    FROM {DATABASE}.INFORMATION_SCHEMA.TABLES
+    WHERE TABLE_SCHEMA = '{SCHEMA}' AND TABLE_NAME = '{TABLE}'
+    """
+    row = session.sql(version_sql).to_pandas()
+    return tuple(str(v) for v in row.iloc[0]) if not row.empty else None
+
 st.set_page_config(
     page_title="AstraZeneca Pharmaceutical Analytics",
     page_icon="💊",
@@ -21,6 +174,48 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+try:
+    data_version = current_table_version()
+except Exception:
+    data_version = None
+
+if data_version is not None:
+    query_cache.sync_table_version(TABLE, data_version)
+
+def fetch_snapshot_rows(sql):
+    """Rows for the local snapshot, converted to the compact schema batch by batch"""
+    return concat_frames(apply_schema(batch) for batch in session_batches(session, sql))
+
+def sync_local_engine():
+    """Load the local snapshot, or pull new rows when the table version changes"""
+    if local_engine is None or (local_engine.ready and local_engine.version == data_version):
+        return
+    expected_rows = int(data_version[0]) if data_version and data_version[0].isdigit() else None
+    try:
+        with st.spinner("Loading local analytics snapshot..."):
+            local_engine.refresh(fetch_snapshot_rows,
+                                 version=data_version, expected_rows=expected_rows)
+    except Exception as e:
+        st.warning(f"Local engine unavailable, using warehouse queries: {str(e)}")
+
+sync_local_engine()
+
+def check_aggregate_cubes():
+    """Look up which warehouse summary cubes are current, once per table version"""
+    if cube_router is None or (local_engine is not None and local_engine.ready):
+        return
+    try:
+        cube_router.sync(data_version, lambda sql, params: session.sql(sql, params=params).to_pandas())
+    except Exception as e:
+        cube_router.invalidate()
+        st.warning(f"Aggregate cubes unavailable, querying the base table: {str(e)}")
+
+check_aggregate_cubes()
+
+def load_filter_catalog():
+    """Filter options from the shared catalog, reloaded only when the table changes"""
+    return catalog_store.get(data_version, lambda: run_query(catalog_sql(BASE_TABLE)))
+
 PRIMARY_PURPLE = "#8A0051"
 GOLD = "#FFD700"
 ACCENT_PURPLE = "#6A003D"
@@ -387,18 +582,26 @@ with st.sidebar:
     
     page = st.session_state.selected_page
     
+    if st.button("🔄 Refresh Data", key="refresh_data", use_container_width=True):
+        query_cache.invalidate(TABLE)
+        catalog_store.invalidate()
+        if local_engine is not None:
+            local_engine.reset()
+            sync_local_engine()
+        if cube_router is not None:
+            cube_router.invalidate()
+            check_aggregate_cubes()
+    
     if page != "drug_performance":
         #st.markdown("---")
         
         
         try:
-            drugs_df = session.sql(f"SELECT DISTINCT DRUG_NAME FROM {BASE_TABLE} ORDER BY DRUG_NAME").to_pandas()
-            regions_df = session.sql(f"SELECT DISTINCT REGION FROM {BASE_TABLE} ORDER BY REGION").to_pandas()
-            countries_df = session.sql(f"SELECT DISTINCT COUNTRY FROM {BASE_TABLE} ORDER BY COUNTRY").to_pandas()
+            catalog = load_filter_catalog()
             
-            selected_drugs = st.multiselect("Drugs", drugs_df['DRUG_NAME'].tolist())
-            selected_regions = st.multiselect("Regions", regions_df['REGION'].tolist())
-            selected_countries = st.multiselect("Countries", countries_df['COUNTRY'].tolist())
+            selected_drugs = st.multiselect("Drugs", list(catalog.drugs))
+            selected_regions = st.multiselect("Regions", list(catalog.regions))
+            selected_countries = st.multiselect("Countries", list(catalog.countries))
             
         except Exception as e:
             st.error(f"Filter loading error: {str(e)}")
@@ -406,76 +609,21 @@ with st.sidebar:
     else:
         selected_drugs, selected_regions, selected_countries = [], [], []
 
-def build_where_clause(start_date=None, end_date=None, drugs=None, regions=None, countries=None):
-    """Build SQL WHERE clause with filters"""
-    conditions = ["1=1"]
-    
-    if start_date and end_date:
-        conditions.append(f"FEEDBACK_DATE BETWEEN '{start_date}' AND '{end_date}'")
-    if drugs:
-        drug_list = "','".join(drugs)
-        conditions.append(f"DRUG_NAME IN ('{drug_list}')")
-    if regions:
-        region_list = "','".join(regions)
-        conditions.append(f"REGION IN ('{region_list}')")
-    if countries:
-        country_list = "','".join(countries)
-        conditions.append(f"COUNTRY IN ('{country_list}')")
-    
-    return "WHERE " + " AND ".join(conditions)
+sidebar_filter = FeedbackFilter.of(drugs=selected_drugs, regions=selected_regions, countries=selected_countries)
 
 if page == "executive":
     st.markdown("# Executive Dashboard")
     st.markdown("### Real-time pharmaceutical insights and performance metrics")
     st.markdown("---")
     
-    # Load KPIs
-    try:
-        where_clause = build_where_clause(drugs=selected_drugs, regions=selected_regions, countries=selected_countries)
-        
-        kpi_sql = f"""
-        SELECT 
-            COUNT(DISTINCT ID) AS total_feedback,
-            COUNT(DISTINCT PATIENT_NAME) AS unique_patients,
-            COUNT(DISTINCT DRUG_NAME) AS drugs_analyzed,
-            ROUND(AVG(SENTIMENT_CAT), 2) AS avg_sentiment,
-            SUM(CASE WHEN LABELS IN ('Cured', 'Improvement') THEN 1 ELSE 0 END) AS success_count,
-            SUM(CASE WHEN LABELS IN ('Adverse', 'Worsen') THEN 1 ELSE 0 END) AS adverse_count,
-            COUNT(*) AS total_cases,
-            ROUND(AVG(AGE_AT_FEEDBACK), 1) AS avg_age
-        FROM {BASE_TABLE}
-        {where_clause}
-        """
-        
-        kpis = session.sql(kpi_sql).to_pandas().iloc[0]
-        
-        # KPI Cards
-        col1, col2, col3, col4, col5, col6 = st.columns(6)
-        
-        with col1:
-            st.metric("Total Feedback", f"{int(kpis['TOTAL_FEEDBACK']):,}")
-        with col2:
-            st.metric("Unique Patients", f"{int(kpis['UNIQUE_PATIENTS']):,}")
-        with col3:
-            st.metric("Avg Sentiment", f"{kpis['AVG_SENTIMENT']:.1f}/10")
-        with col4:
-            success_rate = (kpis['SUCCESS_COUNT'] / kpis['TOTAL_FEEDBACK'] * 100) if kpis['TOTAL_FEEDBACK'] > 0 else 0
-            st.metric("Success Rate", f"{success_rate:.1f}%")
-        with col5:
-            adverse_rate = (kpis['ADVERSE_COUNT'] / kpis['TOTAL_FEEDBACK'] * 100) if kpis['TOTAL_FEEDBACK'] > 0 else 0
-            st.metric("Adverse Rate", f"{adverse_rate:.1f}%")
-        with col6:
-            st.metric("Total Cases", f"{int(kpis['TOTAL_CASES']):,}")
-        
-    except Exception as e:
-        st.error(f"Error loading KPIs: {str(e)}")
+    kpi_container = st.container()
     
     st.markdown("<br>", unsafe_allow_html=True)
     
     # Main Content in Two Columns
-    col1, col2 = st.columns([2, 1])
+    trend_col, overview_col = st.columns([2, 1])
     
-    with col1:
+    with trend_col:
         # Sentiment Trend Over Time
         st.markdown("### Sentiment Trend Over Time")
         
@@ -489,21 +637,43 @@ if page == "executive":
             st.markdown(f"""<div class='date-info'>
                 Analysis period: {start_date.strftime('%B %d, %Y')} to {end_date.strftime('%B %d, %Y')}
             </div>""", unsafe_allow_html=True)
-        
+    
+    # Every chart on the page comes from one batched query
+    try:
+        exec_frames = run_page_plan(executive_plan(BASE_TABLE, sidebar_filter, start_date, end_date))
+    except Exception as e:
+        st.error(f"Error loading dashboard data: {str(e)}")
+        exec_frames = {}
+    
+    # Load KPIs
+    with kpi_container:
         try:
-            trend_where = build_where_clause(start_date, end_date, selected_drugs, selected_regions, selected_countries)
-            trend_sql = f"""
-            SELECT 
-                YEAR(FEEDBACK_DATE) AS year,
-                AVG(SENTIMENT_CAT) AS avg_sentiment,
-                COUNT(*) AS feedback_count
-            FROM {BASE_TABLE}
-            {trend_where}
-            GROUP BY year
-            ORDER BY year
-            """
-            
-            trend_df = session.sql(trend_sql).to_pandas()
+            kpis = exec_frames["kpis"].iloc[0]
+            
+            # KPI Cards
+            col1, col2, col3, col4, col5, col6 = st.columns(6)
+            
+            with col1:
+                st.metric("Total Feedback", f"{int(kpis['TOTAL_FEEDBACK']):,}")
+            with col2:
+                st.metric("Unique Patients", f"{int(kpis['UNIQUE_PATIENTS']):,}")
+            with col3:
+                st.metric("Avg Sentiment", f"{kpis['AVG_SENTIMENT']:.1f}/10")
+            with col4:
+                success_rate = (kpis['SUCCESS_COUNT'] / kpis['TOTAL_FEEDBACK'] * 100) if kpis['TOTAL_FEEDBACK'] > 0 else 0
+                st.metric("Success Rate", f"{success_rate:.1f}%")
+            with col5:
+                adverse_rate = (kpis['ADVERSE_COUNT'] / kpis['TOTAL_FEEDBACK'] * 100) if kpis['TOTAL_FEEDBACK'] > 0 else 0
+                st.metric("Adverse Rate", f"{adverse_rate:.1f}%")
+            with col6:
+                st.metric("Total Cases", f"{int(kpis['TOTAL_CASES']):,}")
+            
+        except Exception as e:
+            st.error(f"Error loading KPIs: {str(e)}")
+    
+    with trend_col:
+        try:
+            trend_df = exec_frames["trend"]
             
             if not trend_df.empty:
                 fig = px.line(trend_df, x='YEAR', y='AVG_SENTIMENT', 
@@ -536,7 +706,7 @@ if page == "executive":
         except Exception as e:
             st.error(f"Error loading trend data: {str(e)}")
     
-    with col2:
+    with overview_col:
         st.markdown("### Performance Overview")
         
         st.markdown(f"""
@@ -573,19 +743,7 @@ if page == "executive":
         # Feedback Source Analysis
         st.markdown("### Feedback Source Distribution")
         try:
-            source_where = build_where_clause(drugs=selected_drugs, regions=selected_regions, countries=selected_countries)
-            source_sql = f"""
-            SELECT 
-                FEEDBACK_SOURCE,
-                COUNT(*) AS feedback_count
-            FROM {BASE_TABLE}
-            {source_where}
-            AND FEEDBACK_SOURCE IS NOT NULL
-            GROUP BY FEEDBACK_SOURCE
-            ORDER BY feedback_count DESC
-            """
-            
-            source_df = session.sql(source_sql).to_pandas()
+            source_df = exec_frames["source"]
             
             if not source_df.empty:
                 fig = px.bar(source_df, x='FEEDBACK_SOURCE', y='FEEDBACK_COUNT',
@@ -613,21 +771,7 @@ if page == "executive":
         # Success Rate by Therapeutic Area
         st.markdown("### Success Rate by Therapeutic Area")
         try:
-            therapy_where = build_where_clause(drugs=selected_drugs, regions=selected_regions, countries=selected_countries)
-            therapy_sql = f"""
-            SELECT 
-                THERAPAUTIC_AREA,
-                COUNT(*) AS total_feedback,
-                ROUND(AVG(SENTIMENT_CAT), 2) AS avg_sentiment,
-                ROUND(SUM(CASE WHEN LABELS IN ('Cured', 'Improvement') THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 1) AS success_rate
-            FROM {BASE_TABLE}
-            {therapy_where}
-            AND THERAPAUTIC_AREA IS NOT NULL
-            GROUP BY THERAPAUTIC_AREA
-            ORDER BY success_rate DESC
-            """
-            
-            therapy_df = session.sql(therapy_sql).to_pandas()
+            therapy_df = exec_frames["therapy"]
             
             if not therapy_df.empty:
                 fig = px.bar(therapy_df, x='THERAPAUTIC_AREA', y='SUCCESS_RATE',
@@ -658,49 +802,11 @@ elif page == "drug_performance":
     
     try:
         # Drug Selection
-        drugs_list = session.sql(f"SELECT DISTINCT DRUG_NAME FROM {BASE_TABLE} ORDER BY DRUG_NAME").to_pandas()
-        selected_drug = st.selectbox("Select Drug for Analysis:", drugs_list['DRUG_NAME'].tolist())
+        selected_drug = st.selectbox("Select Drug for Analysis:", list(load_filter_catalog().drugs))
         
         # Drug Description
         st.markdown(f"### About {selected_drug}")
-        try:
-            drug_info_sql = f"""
-            SELECT 
-                THERAPAUTIC_AREA,
-                INDICATION,
-                COUNT(DISTINCT COUNTRY) AS countries_used
-            FROM {BASE_TABLE}
-            WHERE DRUG_NAME = '{selected_drug}'
-            GROUP BY THERAPAUTIC_AREA, INDICATION
-            LIMIT 1
-            """
-            
-            drug_info = session.sql(drug_info_sql).to_pandas().iloc[0]
-            
-            # Drug descriptions based on therapeutic area
-            drug_descriptions = {
-                "Cardiovascular": f"{selected_drug} is a cardiovascular medication used to treat heart-related conditions, improve blood flow, and manage cardiovascular risks.",
-                "Respiratory": f"{selected_drug} is a respiratory medication designed to treat breathing disorders, asthma, COPD, and other pulmonary conditions.",
-                "Oncology": f"{selected_drug} is an oncology medication used in cancer treatment to target specific cancer cells and improve patient outcomes.",
-                "Neurology": f"{selected_drug} is a neurological medication used to treat brain and nervous system disorders.",
-                "Diabetes": f"{selected_drug} is an antidiabetic medication used to control blood sugar levels and manage diabetes complications.",
-                "Immunology": f"{selected_drug} is an immunological medication used to modulate immune system responses and treat autoimmune conditions."
-            }
-            
-            description = drug_descriptions.get(drug_info['THERAPAUTIC_AREA'], f"{selected_drug} is a pharmaceutical medication used for therapeutic purposes.")
-            
-            st.markdown(f"""
-            <div class='drug-info'>
-                <h4 style='color: {PRIMARY_PURPLE}; margin-top: 0;'>Drug Information</h4>
-                <p><strong>Description:</strong> {description}</p>
-                <p><strong>Therapeutic Area:</strong> {drug_info['THERAPAUTIC_AREA']}</p>
-                <p><strong>Primary Indication:</strong> {drug_info['INDICATION']}</p>
-                <p><strong>Global Reach:</strong> Used in {int(drug_info['COUNTRIES_USED'])} countries</p>
-            </div>
-            """, unsafe_allow_html=True)
-            
-        except Exception as e:
-            st.info(f"Basic information about {selected_drug} will be displayed here.")
+        info_container = st.container()
         
         # Date Range
         col_date1, col_date2 = st.columns(2)
@@ -714,22 +820,40 @@ elif page == "drug_performance":
                 Analysis period: {drug_start.strftime('%B %d, %Y')} to {drug_end.strftime('%B %d, %Y')}
             </div>""", unsafe_allow_html=True)
         
-        # Enhanced Drug Metrics
-        metric_sql = f"""
-        SELECT 
-            COUNT(*) AS total_feedback,
-            ROUND(AVG(SENTIMENT_CAT), 2) AS avg_sentiment,
-            ROUND(AVG(AGE_AT_FEEDBACK), 1) AS avg_age,
-            COUNT(DISTINCT COUNTRY) AS countries,
-            MAX(THERAPAUTIC_AREA) AS therapeutic_area,
-            SUM(CASE WHEN LABELS = 'Cured' THEN 1 ELSE 0 END) AS cured_patients,
-            SUM(CASE WHEN FOLLOW_UP_ACTIONS IN ('Switched medication', 'Consider alternative treatment') THEN 1 ELSE 0 END) AS discontinued_patients
-        FROM {BASE_TABLE}
-        WHERE DRUG_NAME = '{selected_drug}'
-        AND FEEDBACK_DATE BETWEEN '{drug_start}' AND '{drug_end}'
-        """
+        # Every chart for the drug comes from one batched query
+        drug_frames = run_page_plan(drug_performance_plan(BASE_TABLE, selected_drug, drug_start, drug_end))
         
-        drug_metrics = session.sql(metric_sql).to_pandas().iloc[0]
+        with info_container:
+            try:
+                drug_info = drug_frames["drug_info"].iloc[0]
+                
+                # Drug descriptions based on therapeutic area
+                drug_descriptions = {
+                    "Cardiovascular": f"{selected_drug} is a cardiovascular medication used to treat heart-related conditions, improve blood flow, and manage cardiovascular risks.",
+                    "Respiratory": f"{selected_drug} is a respiratory medication designed to treat breathing disorders, asthma, COPD, and other pulmonary conditions.",
+                    "Oncology": f"{selected_drug} is an oncology medication used in cancer treatment to target specific cancer cells and improve patient outcomes.",
+                    "Neurology": f"{selected_drug} is a neurological medication used to treat brain and nervous system disorders.",
+                    "Diabetes": f"{selected_drug} is an antidiabetic medication used to control blood sugar levels and manage diabetes complications.",
+                    "Immunology": f"{selected_drug} is an immunological medication used to modulate immune system responses and treat autoimmune conditions."
+                }
+                
+                description = drug_descriptions.get(drug_info['THERAPAUTIC_AREA'], f"{selected_drug} is a pharmaceutical medication used for therapeutic purposes.")
+                
+                st.markdown(f"""
+                <div class='drug-info'>
+                    <h4 style='color: {PRIMARY_PURPLE}; margin-top: 0;'>Drug Information</h4>
+                    <p><strong>Description:</strong> {description}</p>
+                    <p><strong>Therapeutic Area:</strong> {drug_info['THERAPAUTIC_AREA']}</p>
+                    <p><strong>Primary Indication:</strong> {drug_info['INDICATION']}</p>
+                    <p><strong>Global Reach:</strong> Used in {int(drug_info['COUNTRIES_USED'])} countries</p>
+                </div>
+                """, unsafe_allow_html=True)
+                
+            except Exception as e:
+                st.info(f"Basic information about {selected_drug} will be displayed here.")
+        
+        # Enhanced Drug Metrics
+        drug_metrics = drug_frames["metrics"].iloc[0]
         
         # Enhanced Metrics Display
         col1, col2, col3, col4, col5, col6 = st.columns(6)
@@ -754,17 +878,7 @@ elif page == "drug_performance":
         with col1:
             st.markdown("### Treatment Outcomes Distribution")
             
-            outcome_sql = f"""
-            SELECT LABELS, COUNT(*) AS count
-            FROM {BASE_TABLE}
-            WHERE DRUG_NAME = '{selected_drug}'
-            AND FEEDBACK_DATE BETWEEN '{drug_start}' AND '{drug_end}'
-            AND LABELS IS NOT NULL
-            GROUP BY LABELS
-            ORDER BY count DESC
-            """
-            
-            outcome_df = session.sql(outcome_sql).to_pandas()
+            outcome_df = drug_frames["outcomes"]
             
             if not outcome_df.empty:
                 colors = ['#51CF66', '#FFD700', '#F8BBD0', '#E53935', '#9C27B0', '#FF9800']
@@ -813,18 +927,7 @@ elif page == "drug_performance":
         with col1:
             st.markdown("### Feedback Count Year-wise")
             
-            yearly_sql = f"""
-            SELECT 
-                YEAR(FEEDBACK_DATE) AS year,
-                COUNT(*) AS feedback_count
-            FROM {BASE_TABLE}
-            WHERE DRUG_NAME = '{selected_drug}'
-            AND FEEDBACK_DATE BETWEEN '{drug_start}' AND '{drug_end}'
-            GROUP BY year
-            ORDER BY year
-            """
-            
-            yearly_df = session.sql(yearly_sql).to_pandas()
+            yearly_df = drug_frames["yearly"]
             
             if not yearly_df.empty:
                 fig = px.bar(yearly_df, x='YEAR', y='FEEDBACK_COUNT',
@@ -849,17 +952,7 @@ elif page == "drug_performance":
         with col2:
             st.markdown("### Geographic Distribution")
             
-            geo_sql = f"""
-            SELECT COUNTRY, COUNT(*) AS feedback_count
-            FROM {BASE_TABLE}
-            WHERE DRUG_NAME = '{selected_drug}'
-            AND FEEDBACK_DATE BETWEEN '{drug_start}' AND '{drug_end}'
-            GROUP BY COUNTRY
-            ORDER BY feedback_count DESC
-            LIMIT 10
-            """
-            
-            geo_df = session.sql(geo_sql).to_pandas()
+            geo_df = drug_frames["geo"]
             
             if not geo_df.empty:
                 fig = px.bar(geo_df, x='FEEDBACK_COUNT', y='COUNTRY',
@@ -926,27 +1019,14 @@ elif page == "drug_performance":
             if st.button("Extract Side Effects", type="primary", key="side_effects"):
                 with st.spinner("Extracting side effects..."):
                     try:
-                        # Get actual side effects data
-                        side_effects_sql = f"""
-                        SELECT 
-                            SIDE_EFFECTS_REPORTED,
-                            COUNT(*) AS frequency
-                        FROM {BASE_TABLE}
-                        WHERE DRUG_NAME = '{selected_drug}'
-                        AND FEEDBACK_DATE BETWEEN '{drug_start}' AND '{drug_end}'
-                        AND SIDE_EFFECTS_REPORTED IS NOT NULL
-                        AND SIDE_EFFECTS_REPORTED != 'Unspecified'
-                        GROUP BY SIDE_EFFECTS_REPORTED
-                        ORDER BY frequency DESC
-                        LIMIT 10
-                        """
-                        
-                        side_effects_df = session.sql(side_effects_sql).to_pandas()
+                        # Same grouped counts for every drug, so switching drugs is a cache hit
+                        side_effects_df = drug_event_table(
+                            FeedbackFilter.of(drug_start, drug_end)).drug_profile(selected_drug).head(10)
                         
                         if not side_effects_df.empty:
                             effects_html = "<div class='insight-card'><h5 style='color: " + PRIMARY_PURPLE + ";'>Common Side Effects:</h5><ol>"
                             for _, row in side_effects_df.iterrows():
-                                effects_html += f"<li>{row['SIDE_EFFECTS_REPORTED']} (Reported: {int(row['FREQUENCY'])} times)</li>"
+                                effects_html += f"<li>{row['SIDE_EFFECTS_REPORTED']} (Reported: {int(row['CASES'])} times, PRR {row['PRR']:.2f})</li>"
                             effects_html += "</ol><p><em>Note: Side effects extracted from patient feedback data.</em></p></div>"
                             st.markdown(effects_html, unsafe_allow_html=True)
                         else:
@@ -969,29 +1049,19 @@ elif page == "forecasting":
     st.markdown("---")
     
     try:
-        forecast_where = build_where_clause(drugs=selected_drugs, regions=selected_regions, countries=selected_countries)
-        
-        # Historical Data
-        hist_sql = f"""
-            SELECT 
-            YEAR(FEEDBACK_DATE) AS year,
-            AVG(SENTIMENT_CAT) AS avg_sentiment,
-            COUNT(*) AS feedback_count
-            FROM {BASE_TABLE}
-            {forecast_where}
-            GROUP BY year
-            ORDER BY year
-            """
-        
-        hist_df = session.sql(hist_sql).to_pandas()
+        # Every drug, region and country series is fitted once per table version
+        forecast_store.refresh(data_version, lambda: run_query(monthly_sql(BASE_TABLE)))
+        result = forecast_store.get(sidebar_filter)
+        hist_df = result.history
+        forecast_df = result.forecast
+        params = result.params
 
-        if len(hist_df) >= 3:
-            hist_df['ma_3'] = hist_df['AVG_SENTIMENT'].rolling(window=3).mean()
-            last_ma = hist_df['ma_3'].iloc[-1] if not pd.isna(hist_df['ma_3'].iloc[-1]) else hist_df['AVG_SENTIMENT'].iloc[-1]
-            last_year = int(hist_df['YEAR'].max())
-            
-            # Create forecast data
-            forecast_years = list(range(last_year + 1, last_year + 4))
+        if params['observed_months'] >= MIN_OBSERVED_MONTHS:
+            last_12 = hist_df['AVG_SENTIMENT'].tail(12).mean()
+            next_12 = forecast_df['FORECAST'].head(12).mean()
+            predicted = forecast_df['FORECAST'].iloc[11] if len(forecast_df) >= 12 else forecast_df['FORECAST'].iloc[-1]
+            half_width = ((forecast_df['UPPER'] - forecast_df['LOWER']) / 2).head(12).mean()
+            last_month = hist_df['MONTH'].max()
             
             # Combined visualization with vibrant colors
             st.markdown("### Historical Sentiment Trend with Forecast")
@@ -1000,40 +1070,39 @@ elif page == "forecasting":
             
             # Historical line (Blue)
             fig.add_trace(go.Scatter(
-                x=hist_df['YEAR'],
+                x=hist_df['MONTH'],
                 y=hist_df['AVG_SENTIMENT'],
                 mode='lines+markers',
                 name='Historical Data',
-                line=dict(color='#1f77b4', width=4),  # Bright blue
-                marker=dict(size=10, color='#1f77b4'),
-                hovertemplate='<b>Year:</b> %{x}<br><b>Sentiment:</b> %{y:.2f}<extra></extra>'
+                line=dict(color='#1f77b4', width=2),  # Bright blue
+                marker=dict(size=5, color='#1f77b4'),
+                hovertemplate='<b>Month:</b> %{x|%b %Y}<br><b>Sentiment:</b> %{y:.2f}<extra></extra>'
             ))
             
-            # Forecast line (Bright Green)
+            # Prediction interval band
             fig.add_trace(go.Scatter(
-                x=forecast_years,
-                y=[last_ma] * 3,
-                mode='lines+markers',
-                name='Forecast',
-                line=dict(color='#00ff00', width=4, dash='dash'),  # Bright green
-                marker=dict(size=12, symbol='diamond', color='#00ff00'),
-                hovertemplate='<b>Year:</b> %{x}<br><b>Predicted Sentiment:</b> %{y:.2f}<extra></extra>'
+                x=list(forecast_df['MONTH']) + list(forecast_df['MONTH'][::-1]),
+                y=list(forecast_df['UPPER']) + list(forecast_df['LOWER'][::-1]),
+                fill='toself',
+                fillcolor='rgba(0, 255, 0, 0.2)',
+                line=dict(color='rgba(255,255,255,0)'),
+                name='95% Prediction Interval',
+                hoverinfo='skip'
             ))
             
-            # Add confidence band
+            # Forecast line (Bright Green)
             fig.add_trace(go.Scatter(
-                x=forecast_years + forecast_years[::-1],
-                y=[last_ma + 0.5] * 3 + [last_ma - 0.5] * 3,
-                fill='tonexty',
-                fillcolor='rgba(0, 255, 0, 0.2)',
-                line=dict(color='rgba(255,255,255,0)'),
-                name='Confidence Interval',
-                showlegend=False
+                x=forecast_df['MONTH'],
+                y=forecast_df['FORECAST'],
+                mode='lines',
+                name='Forecast',
+                line=dict(color='#00ff00', width=4, dash='dash'),  # Bright green
+                hovertemplate='<b>Month:</b> %{x|%b %Y}<br><b>Predicted Sentiment:</b> %{y:.2f}<extra></extra>'
             ))
             
             fig.update_layout(
-                title='Sentiment Trend Analysis with 3-Year Forecast',
-                xaxis_title='Year',
+                title=f'Monthly Sentiment Trend with {HORIZON_MONTHS // 12}-Year Forecast',
+                xaxis_title='Month',
                 yaxis_title='Average Sentiment',
                 yaxis_range=[0, 10],
                 plot_bgcolor='white',
@@ -1062,32 +1131,32 @@ elif page == "forecasting":
             
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("Predicted Sentiment", f"{last_ma:.2f}/10")
+                st.metric("Predicted Sentiment (12 mo)", f"{predicted:.2f}/10")
             with col2:
-                trend = ("Stable" if abs(hist_df['AVG_SENTIMENT'].iloc[-1] - hist_df['AVG_SENTIMENT'].iloc[-3]) < 0.5 else ("Improving" if hist_df['AVG_SENTIMENT'].iloc[-1] > hist_df['AVG_SENTIMENT'].iloc[-3] else "Declining"))
+                trend = ("Stable" if abs(next_12 - last_12) < 0.5 else ("Improving" if next_12 > last_12 else "Declining"))
                 st.metric("Trend Direction", trend)
             with col3:
-                confidence = "Moderate"
-                st.metric("Confidence Level", confidence)
+                confidence = "High" if half_width < 1 else "Moderate" if half_width < 2.5 else "Low"
+                st.metric("Confidence Level", confidence, f"±{half_width:.2f}", delta_color="off")
             with col4:
-                forecast_change = ((last_ma - hist_df['AVG_SENTIMENT'].iloc[-1]) / hist_df['AVG_SENTIMENT'].iloc[-1] * 100) if hist_df['AVG_SENTIMENT'].iloc[-1] > 0 else 0
+                forecast_change = ((next_12 - last_12) / last_12 * 100) if last_12 > 0 else 0
                 st.metric("Expected Change", f"{forecast_change:+.1f}%")
             
             st.markdown(f"""
                 <div class='insight-card'>
                 <h4 style='color: {PRIMARY_PURPLE}; margin-top: 0;'>Forecasting Insights</h4>
-                <p><strong>Model Type:</strong> 3-period moving average with trend extrapolation</p>
-                <p><strong>Historical Data:</strong> {len(hist_df)} years of sentiment data analyzed</p>
-                <p><strong>Prediction Horizon:</strong> 3 years (until {last_year + 3})</p>
-                <p><strong>Key Finding:</strong> Sentiment expected to {'remain stable' if abs(forecast_change) < 2 else 'improve' if forecast_change > 0 else 'decline slightly'} around {last_ma:.1f}/10</p>
+                <p><strong>Model Type:</strong> Holt-Winters exponential smoothing (damped trend{', 12-month seasonality' if params['seasonal'] else ''}); α={params['alpha']:.2f}, β={params['beta']:.3f}, γ={params['gamma']:.2f}, φ={params['phi']:.2f}</p>
+                <p><strong>Historical Data:</strong> {params['observed_months']} months of sentiment data analyzed (through {last_month:%B %Y})</p>
+                <p><strong>Prediction Horizon:</strong> {HORIZON_MONTHS} months (until {forecast_df['MONTH'].max():%B %Y}), 95% prediction intervals</p>
+                <p><strong>Key Finding:</strong> Sentiment expected to {'remain stable' if abs(forecast_change) < 2 else 'improve' if forecast_change > 0 else 'decline slightly'} around {next_12:.1f}/10 over the next year</p>
                 <p><strong>Strategic Recommendation:</strong> {'Maintain current patient engagement strategies' if trend == 'Stable' else 'Investigate factors driving trend changes' if trend == 'Declining' else 'Capitalize on positive momentum with expansion plans'}</p>
                 <p><strong>Risk Assessment:</strong> {'Low risk - stable sentiment pattern' if trend == 'Stable' else 'Medium risk - monitor closely' if trend == 'Declining' else 'Low risk - positive trajectory'}</p>
                 </div>
                 """, unsafe_allow_html=True)
             
         else:
-            st.warning("⚠️ Insufficient historical data for forecasting. Minimum 3 years of data required.")
-            st.info("Please adjust your filters to include more historical data or expand the date range.")
+            st.warning(f"⚠️ Insufficient historical data for forecasting. Minimum {MIN_OBSERVED_MONTHS} months of data required.")
+            st.info("Please adjust your filters to include more historical data.")
             
     except Exception as e:
         st.error(f"Error in forecasting analysis: {str(e)}")
@@ -1098,227 +1167,162 @@ elif page == "geographic":
     st.markdown("### Regional performance insights and global market analysis")
     st.markdown("---")
     
+    def show_country_feedback(country_feedback_df):
+        if not country_feedback_df.empty:
+            fig = px.bar(country_feedback_df, y='COUNTRY', x='FEEDBACK_COUNT',
+                       orientation='h',
+                       color='FEEDBACK_COUNT',
+                       color_continuous_scale='Viridis',
+                       title='Top 15 Countries by Feedback Volume')
+            
+            fig.update_layout(
+                xaxis_title="Feedback Count",
+                yaxis_title="Country",
+                plot_bgcolor='white',
+                paper_bgcolor='white',
+                font=dict(family="Segoe UI, sans-serif", size=12),
+                title_font=dict(size=14, color=PRIMARY_PURPLE),
+                yaxis={'categoryorder': 'total ascending'}
+            )
+            
+            st.plotly_chart(fig, use_container_width=True)
+    
+    def show_country_sentiment(country_sentiment_df):
+        if not country_sentiment_df.empty:
+            fig = px.bar(country_sentiment_df, y='COUNTRY', x='AVG_SENTIMENT',
+                       orientation='h',
+                       color='AVG_SENTIMENT',
+                       color_continuous_scale='RdYlGn',
+                       title='Top 15 Countries by Sentiment')
+            
+            fig.update_layout(
+                xaxis_title="Average Sentiment",
+                yaxis_title="Country",
+                xaxis_range=[0, 10],
+                plot_bgcolor='white',
+                paper_bgcolor='white',
+                font=dict(family="Segoe UI, sans-serif", size=12),
+                title_font=dict(size=14, color=PRIMARY_PURPLE),
+                yaxis={'categoryorder': 'total ascending'}
+            )
+            
+            st.plotly_chart(fig, use_container_width=True)
+    
+    def show_language(language_df):
+        if not language_df.empty:
+            fig = px.pie(language_df, names='LANGUAGE', values='FEEDBACK_COUNT',
+                       title='Language Distribution of Feedback',
+                       color_discrete_sequence=px.colors.qualitative.Set3)
+            
+            fig.update_layout(
+                font=dict(family="Segoe UI, sans-serif", size=12),
+                title_font=dict(size=14, color=PRIMARY_PURPLE)
+            )
+            
+            st.plotly_chart(fig, use_container_width=True)
+    
+    def show_duration(duration_df):
+        if not duration_df.empty:
+            fig = px.scatter(duration_df, x='AVG_DURATION', y='COUNTRY',
+                           size='PATIENT_COUNT',
+                           color='AVG_DURATION',
+                           color_continuous_scale='Viridis',
+                           title='Average Treatment Duration by Country')
+            
+            fig.update_layout(
+                xaxis_title="Average Treatment Duration (Days)",
+                yaxis_title="Country",
+                plot_bgcolor='white',
+                paper_bgcolor='white',
+                font=dict(family="Segoe UI, sans-serif", size=12),
+                title_font=dict(size=14, color=PRIMARY_PURPLE)
+            )
+            
+            st.plotly_chart(fig, use_container_width=True)
+    
+    def show_regional_adherence(regional_adherence_df):
+        if not regional_adherence_df.empty:
+            fig = px.bar(regional_adherence_df, x='REGION', y='PATIENT_COUNT',
+                       color='ADHERENCE',
+                       title='Regional Adherence Patterns',
+                       color_discrete_sequence=px.colors.qualitative.Set2)
+            
+            fig.update_layout(
+                xaxis_title="Region",
+                yaxis_title="Patient Count",
+                plot_bgcolor='white',
+                paper_bgcolor='white',
+                font=dict(family="Segoe UI, sans-serif", size=12),
+                title_font=dict(size=14, color=PRIMARY_PURPLE)
+            )
+            
+            st.plotly_chart(fig, use_container_width=True)
+    
+    def show_region(region_df):
+        if not region_df.empty:
+            fig = px.treemap(region_df, path=['REGION'], values='FEEDBACK_COUNT',
+                           color='AVG_SENTIMENT',
+                           color_continuous_scale='RdYlGn',
+                           title='Regional Feedback Distribution (Treemap)')
+            
+            fig.update_layout(
+                font=dict(family="Segoe UI, sans-serif", size=12),
+                title_font=dict(size=14, color=PRIMARY_PURPLE)
+            )
+            
+            st.plotly_chart(fig, use_container_width=True)
+    
     try:
-        geo_where = build_where_clause(drugs=selected_drugs, regions=selected_regions, countries=selected_countries)
-        
-        # Country Feedback Count Chart
+        # Lay out every chart slot first, then fill each one as its query finishes
         st.markdown("### Global Feedback Distribution")
-        
         col1, col2 = st.columns(2)
-        
         with col1:
             st.markdown("#### Feedback Count by Country")
-            country_feedback_sql = f"""
-            SELECT 
-                COUNTRY,
-                COUNT(*) AS feedback_count
-            FROM {BASE_TABLE}
-            {geo_where}
-            GROUP BY COUNTRY
-            ORDER BY feedback_count DESC
-            LIMIT 15
-            """
-            
-            country_feedback_df = session.sql(country_feedback_sql).to_pandas()
-            
-            if not country_feedback_df.empty:
-                fig = px.bar(country_feedback_df, y='COUNTRY', x='FEEDBACK_COUNT',
-                           orientation='h',
-                           color='FEEDBACK_COUNT',
-                           color_continuous_scale='Viridis',
-                           title='Top 15 Countries by Feedback Volume')
-                
-                fig.update_layout(
-                    xaxis_title="Feedback Count",
-                    yaxis_title="Country",
-                    plot_bgcolor='white',
-                    paper_bgcolor='white',
-                    font=dict(family="Segoe UI, sans-serif", size=12),
-                    title_font=dict(size=14, color=PRIMARY_PURPLE),
-                    yaxis={'categoryorder': 'total ascending'}
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
-        
+            country_feedback_slot = st.container()
         with col2:
             st.markdown("#### Country-wise Sentiment Analysis")
-            country_sentiment_sql = f"""
-            SELECT 
-                COUNTRY,
-                ROUND(AVG(SENTIMENT_CAT), 2) AS avg_sentiment,
-                COUNT(*) AS feedback_count
-            FROM {BASE_TABLE}
-            {geo_where}
-            GROUP BY COUNTRY
-            HAVING COUNT(*) >= 5
-            ORDER BY avg_sentiment DESC
-            LIMIT 15
-            """
-            
-            country_sentiment_df = session.sql(country_sentiment_sql).to_pandas()
-            
-            if not country_sentiment_df.empty:
-                fig = px.bar(country_sentiment_df, y='COUNTRY', x='AVG_SENTIMENT',
-                           orientation='h',
-                           color='AVG_SENTIMENT',
-                           color_continuous_scale='RdYlGn',
-                           title='Top 15 Countries by Sentiment')
-                
-                fig.update_layout(
-                    xaxis_title="Average Sentiment",
-                    yaxis_title="Country",
-                    xaxis_range=[0, 10],
-                    plot_bgcolor='white',
-                    paper_bgcolor='white',
-                    font=dict(family="Segoe UI, sans-serif", size=12),
-                    title_font=dict(size=14, color=PRIMARY_PURPLE),
-                    yaxis={'categoryorder': 'total ascending'}
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
+            country_sentiment_slot = st.container()
         
-        # Language Distribution
         st.markdown("### Language Distribution Analysis")
-        
         col1, col2 = st.columns(2)
-        
         with col1:
             st.markdown("#### Feedback by Language")
-            language_sql = f"""
-            SELECT 
-                LANGUAGE,
-                COUNT(*) AS feedback_count
-            FROM {BASE_TABLE}
-            {geo_where}
-            AND LANGUAGE IS NOT NULL
-            GROUP BY LANGUAGE
-            ORDER BY feedback_count DESC
-            LIMIT 10
-            """
-            
-            language_df = session.sql(language_sql).to_pandas()
-            
-            if not language_df.empty:
-                fig = px.pie(language_df, names='LANGUAGE', values='FEEDBACK_COUNT',
-                           title='Language Distribution of Feedback',
-                           color_discrete_sequence=px.colors.qualitative.Set3)
-                
-                fig.update_layout(
-                    font=dict(family="Segoe UI, sans-serif", size=12),
-                    title_font=dict(size=14, color=PRIMARY_PURPLE)
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
-        
+            language_slot = st.container()
         with col2:
             st.markdown("#### Country-wise Treatment Duration")
-            duration_sql = f"""
-            SELECT 
-                COUNTRY,
-                ROUND(AVG(TREATMENT_DURATION_DAYS), 0) AS avg_duration,
-                COUNT(*) AS patient_count
-            FROM {BASE_TABLE}
-            {geo_where}
-            AND TREATMENT_DURATION_DAYS IS NOT NULL
-            GROUP BY COUNTRY
-            HAVING COUNT(*) >= 10
-            ORDER BY avg_duration DESC
-            LIMIT 15
-            """
-            
-            duration_df = session.sql(duration_sql).to_pandas()
-            
-            if not duration_df.empty:
-                fig = px.scatter(duration_df, x='AVG_DURATION', y='COUNTRY',
-                               size='PATIENT_COUNT',
-                               color='AVG_DURATION',
-                               color_continuous_scale='Viridis',
-                               title='Average Treatment Duration by Country')
-                
-                fig.update_layout(
-                    xaxis_title="Average Treatment Duration (Days)",
-                    yaxis_title="Country",
-                    plot_bgcolor='white',
-                    paper_bgcolor='white',
-                    font=dict(family="Segoe UI, sans-serif", size=12),
-                    title_font=dict(size=14, color=PRIMARY_PURPLE)
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
+            duration_slot = st.container()
         
-        # Regional Analysis
         st.markdown("### Regional Performance Comparison")
-        
         col1, col2 = st.columns(2)
-        
         with col1:
             st.markdown("#### Regional Adherence Comparison")
-            regional_adherence_sql = f"""
-            SELECT 
-                REGION,
-                ADHERENCE,
-                COUNT(*) AS patient_count,
-                ROUND(AVG(SENTIMENT_CAT), 2) AS avg_sentiment
-            FROM {BASE_TABLE}
-            {geo_where}
-            AND ADHERENCE IS NOT NULL
-            AND REGION IS NOT NULL
-            GROUP BY REGION, ADHERENCE
-            ORDER BY REGION, ADHERENCE
-            """
-            
-            regional_adherence_df = session.sql(regional_adherence_sql).to_pandas()
-            
-            if not regional_adherence_df.empty:
-                fig = px.bar(regional_adherence_df, x='REGION', y='PATIENT_COUNT',
-                           color='ADHERENCE',
-                           title='Regional Adherence Patterns',
-                           color_discrete_sequence=px.colors.qualitative.Set2)
-                
-                fig.update_layout(
-                    xaxis_title="Region",
-                    yaxis_title="Patient Count",
-                    plot_bgcolor='white',
-                    paper_bgcolor='white',
-                    font=dict(family="Segoe UI, sans-serif", size=12),
-                    title_font=dict(size=14, color=PRIMARY_PURPLE)
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
-        
+            regional_adherence_slot = st.container()
         with col2:
             st.markdown("#### Alternative Regional View")
-            region_sql = f"""
-            SELECT 
-                REGION,
-                COUNT(*) AS feedback_count,
-                ROUND(AVG(SENTIMENT_CAT), 2) AS avg_sentiment,
-                COUNT(DISTINCT COUNTRY) AS countries
-            FROM {BASE_TABLE}
-            {geo_where}
-            GROUP BY REGION
-            ORDER BY feedback_count DESC
-            """
-            
-            region_df = session.sql(region_sql).to_pandas()
-            
-            if not region_df.empty:
-                fig = px.treemap(region_df, path=['REGION'], values='FEEDBACK_COUNT',
-                               color='AVG_SENTIMENT',
-                               color_continuous_scale='RdYlGn',
-                               title='Regional Feedback Distribution (Treemap)')
-                
-                fig.update_layout(
-                    font=dict(family="Segoe UI, sans-serif", size=12),
-                    title_font=dict(size=14, color=PRIMARY_PURPLE)
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
+            region_slot = st.container()
         
-        # Summary Table
         st.markdown("### Geographic Summary")
-        if 'country_sentiment_df' in locals() and not country_sentiment_df.empty:
-            st.dataframe(country_sentiment_df, use_container_width=True, hide_index=True)
+        summary_slot = st.container()
+        
+        geo_charts = {
+            "country_feedback": (country_feedback_slot, show_country_feedback),
+            "country_sentiment": (country_sentiment_slot, show_country_sentiment),
+            "language": (language_slot, show_language),
+            "duration": (duration_slot, show_duration),
+            "regional_adherence": (regional_adherence_slot, show_regional_adherence),
+            "region": (region_slot, show_region),
+        }
+        
+        for name, result in stream_page_plan(geographic_plan(BASE_TABLE, sidebar_filter)):
+            slot, show = geo_charts[name]
+            with slot:
+                if isinstance(result, Exception):
+                    st.error(f"Error loading {name.replace('_', ' ')}: {str(result)}")
+                    continue
+                show(result)
+            if name == "country_sentiment" and not result.empty:
+                with summary_slot:
+                    st.dataframe(result, use_container_width=True, hide_index=True)
             
     except Exception as e:
         st.error(f"Error in geographic analysis: {str(e)}")
@@ -1329,25 +1333,12 @@ elif page == "segmentation":
     st.markdown("---")
     
     try:
-        seg_where = build_where_clause(drugs=selected_drugs, regions=selected_regions, countries=selected_countries)
+        seg_frames = run_page_plan(segmentation_plan(BASE_TABLE, sidebar_filter))
         
         # Language-based Feedback Analysis
         st.markdown("### Language-based Feedback Distribution")
         
-        language_feedback_sql = f"""
-        SELECT 
-            LANGUAGE,
-            COUNT(*) AS feedback_count,
-            ROUND(AVG(SENTIMENT_CAT), 2) AS avg_sentiment
-        FROM {BASE_TABLE}
-        {seg_where}
-        AND LANGUAGE IS NOT NULL
-        GROUP BY LANGUAGE
-        ORDER BY feedback_count DESC
-        LIMIT 15
-        """
-        
-        language_feedback_df = session.sql(language_feedback_sql).to_pandas()
+        language_feedback_df = seg_frames["language_feedback"]
         
         if not language_feedback_df.empty:
             fig = px.bar(language_feedback_df, x='LANGUAGE', y='FEEDBACK_COUNT',
@@ -1370,22 +1361,7 @@ elif page == "segmentation":
         # Gender Age Analysis
         st.markdown("### Gender-based Age Analysis")
         
-        gender_age_sql = f"""
-        SELECT 
-            GENDER,
-            MIN(AGE_AT_FEEDBACK) AS min_age,
-            MAX(AGE_AT_FEEDBACK) AS max_age,
-            ROUND(AVG(AGE_AT_FEEDBACK), 1) AS avg_age,
-            COUNT(*) AS feedback_count
-        FROM {BASE_TABLE}
-        {seg_where}
-        AND GENDER IS NOT NULL
-        AND AGE_AT_FEEDBACK IS NOT NULL
-        GROUP BY GENDER
-        ORDER BY feedback_count DESC
-        """
-        
-        gender_age_df = session.sql(gender_age_sql).to_pandas()
+        gender_age_df = seg_frames["gender_age"]
         
         if not gender_age_df.empty:
             col1, col2, col3 = st.columns(3)
@@ -1412,19 +1388,7 @@ elif page == "segmentation":
         
         with col1:
             st.markdown("#### Adherence vs Feedback Count")
-            adherence_sql = f"""
-            SELECT 
-                ADHERENCE,
-                COUNT(*) AS feedback_count,
-                ROUND(AVG(SENTIMENT_CAT), 2) AS avg_sentiment
-            FROM {BASE_TABLE}
-            {seg_where}
-            AND ADHERENCE IS NOT NULL
-            GROUP BY ADHERENCE
-            ORDER BY feedback_count DESC
-            """
-            
-            adherence_df = session.sql(adherence_sql).to_pandas()
+            adherence_df = seg_frames["adherence"]
             
             if not adherence_df.empty:
                 fig = px.bar(adherence_df, x='ADHERENCE', y='FEEDBACK_COUNT',
@@ -1445,20 +1409,7 @@ elif page == "segmentation":
         
         with col2:
             st.markdown("#### Adherence vs Labels Correlation")
-            adherence_labels_sql = f"""
-            SELECT 
-                ADHERENCE,
-                LABELS,
-                COUNT(*) AS count
-            FROM {BASE_TABLE}
-            {seg_where}
-            AND ADHERENCE IS NOT NULL
-            AND LABELS IS NOT NULL
-            GROUP BY ADHERENCE, LABELS
-            ORDER BY ADHERENCE, LABELS
-            """
-            
-            adherence_labels_df = session.sql(adherence_labels_sql).to_pandas()
+            adherence_labels_df = seg_frames["adherence_labels"]
             
             if not adherence_labels_df.empty:
                 # Create pivot table for heatmap using plotly
@@ -1486,23 +1437,7 @@ elif page == "segmentation":
         
         with col1:
             st.markdown("#### Word Count vs Treatment Outcomes")
-            word_labels_sql = f"""
-            SELECT 
-                FEEDBACK_WORD_COUNT,
-                LABELS,
-                SENTIMENT_CAT,
-                COUNT(*) AS frequency
-            FROM {BASE_TABLE}
-            {seg_where}
-            AND FEEDBACK_WORD_COUNT IS NOT NULL
-            AND LABELS IS NOT NULL
-            AND FEEDBACK_WORD_COUNT > 0
-            GROUP BY FEEDBACK_WORD_COUNT, LABELS, SENTIMENT_CAT
-            HAVING COUNT(*) >= 1
-            ORDER BY FEEDBACK_WORD_COUNT
-            """
-            
-            word_labels_df = session.sql(word_labels_sql).to_pandas()
+            word_labels_df = seg_frames["word_labels"]
             
             if not word_labels_df.empty:
                 fig = px.scatter(word_labels_df, x='FEEDBACK_WORD_COUNT', y='SENTIMENT_CAT',
@@ -1523,24 +1458,7 @@ elif page == "segmentation":
         
         with col2:
             st.markdown("#### Risk Groups by Comorbidities")
-            comorbid_risk_sql = f"""
-            SELECT 
-                COMORBIDITIES,
-                COUNT(*) AS patient_count,
-                ROUND(AVG(SENTIMENT_CAT), 2) AS avg_sentiment,
-                SUM(CASE WHEN LABELS IN ('Adverse', 'Worsen') THEN 1 ELSE 0 END) AS adverse_count,
-                ROUND(SUM(CASE WHEN LABELS IN ('Adverse', 'Worsen') THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 1) AS risk_percentage
-            FROM {BASE_TABLE}
-            {seg_where}
-            AND COMORBIDITIES IS NOT NULL
-            AND COMORBIDITIES != 'Unspecified'
-            GROUP BY COMORBIDITIES
-            HAVING COUNT(*) >= 10
-            ORDER BY risk_percentage DESC
-            LIMIT 10
-            """
-            
-            comorbid_risk_df = session.sql(comorbid_risk_sql).to_pandas()
+            comorbid_risk_df = seg_frames["comorbid_risk"]
             
             if not comorbid_risk_df.empty:
                 fig = px.scatter(comorbid_risk_df, x='PATIENT_COUNT', y='RISK_PERCENTAGE',
@@ -1580,24 +1498,10 @@ elif page == "safety":
     st.markdown("---")
     
     try:
-        safety_where = build_where_clause(drugs=selected_drugs, regions=selected_regions, countries=selected_countries)
+        safety_frames = run_page_plan(safety_plan(BASE_TABLE, sidebar_filter))
         
         # Safety Overview
-        safety_sql = f"""
-        SELECT 
-            DRUG_NAME,
-            SUM(CASE WHEN LABELS IN ('Adverse', 'Worsen') THEN 1 ELSE 0 END) AS adverse_count,
-            COUNT(*) AS total_feedback,
-            ROUND(SUM(CASE WHEN LABELS IN ('Adverse', 'Worsen') THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 2) AS adverse_rate
-        FROM {BASE_TABLE}
-        {safety_where}
-        GROUP BY DRUG_NAME
-        HAVING COUNT(*) >= 10
-        ORDER BY adverse_rate DESC
-        LIMIT 20
-        """
-        
-        safety_df = session.sql(safety_sql).to_pandas()
+        safety_df = safety_frames["safety"]
         
         if not safety_df.empty:
             # Safety KPIs
@@ -1639,23 +1543,7 @@ elif page == "safety":
             # Side Effects Analysis
             st.markdown("### Side Effects Analysis")
             
-            side_effects_sql = f"""
-            SELECT 
-                SIDE_EFFECTS_REPORTED,
-                COUNT(*) AS case_count,
-                ROUND(AVG(SENTIMENT_CAT), 2) AS avg_sentiment,
-                COUNT(DISTINCT DRUG_NAME) AS drugs_involved
-            FROM {BASE_TABLE}
-            {safety_where}
-            AND SIDE_EFFECTS_REPORTED IS NOT NULL
-            AND SIDE_EFFECTS_REPORTED != 'Unspecified'
-            GROUP BY SIDE_EFFECTS_REPORTED
-            HAVING COUNT(*) >= 5
-            ORDER BY case_count DESC
-            LIMIT 15
-            """
-            
-            side_effects_df = session.sql(side_effects_sql).to_pandas()
+            side_effects_df = safety_frames["side_effects"]
             
             if not side_effects_df.empty:
                 col1, col2 = st.columns([2, 1])
@@ -1685,6 +1573,31 @@ elif page == "safety":
                     st.markdown("#### Side Effects Summary")
                     st.dataframe(side_effects_df, use_container_width=True, hide_index=True)
             
+            # Disproportionality: every drug x side effect pair against all other drugs
+            st.markdown("### Disproportionality Signals")
+            
+            signals_df = drug_event_table(sidebar_filter).signals()
+            if sidebar_filter.drugs:
+                signals_df = signals_df[signals_df['DRUG_NAME'].isin(sidebar_filter.drugs)]
+            
+            if not signals_df.empty:
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Drug-Event Pairs Screened", f"{len(signals_df):,}")
+                with col2:
+                    st.metric("Signals Detected", int(signals_df['SIGNAL'].sum()))
+                with col3:
+                    st.metric("Highest PRR", f"{signals_df['PRR'].max():.2f}")
+                
+                st.caption("Signal: at least 3 cases with PRR ≥ 2 and χ² ≥ 4, or a ROR 95% lower bound above 1")
+                st.dataframe(
+                    signals_df[['DRUG_NAME', 'SIDE_EFFECTS_REPORTED', 'CASES', 'PRR', 'PRR_LOWER', 'PRR_UPPER',
+                                'ROR', 'ROR_LOWER', 'ROR_UPPER', 'CHI_SQUARE', 'SIGNAL']].round(2),
+                    use_container_width=True, hide_index=True
+                )
+            else:
+                st.info("No side effects reported for the selected filters")
+            
             # Detailed Safety Data
             st.markdown("### Detailed Safety Data")
             st.dataframe(safety_df, use_container_width=True, hide_index=True)
@@ -1700,103 +1613,27 @@ elif page == "reports":
     st.markdown("### Comprehensive data export and custom reporting")
     st.markdown("---")
     
-    report_where = build_where_clause(drugs=selected_drugs, regions=selected_regions, countries=selected_countries)
+    report_where, report_params = sidebar_filter.where()
+    
+    def query_batches(sql, params):
+        """Stream a report's full result, bypassing the result cache"""
+        if local_engine is not None and local_engine.ready:
+            return local_engine.sql_batches(sql, list(params))
+        return session_batches(session, sql, list(params))
     
-    report_type = st.selectbox("Select Report Type:", [
-        "Complete Feedback Report",
-        "Drug Performance Report", 
-        "Safety & Adverse Events Report",
-        "Patient Demographics Report",
-        "Custom SQL Query"
-    ])
+    report_type = st.selectbox("Select Report Type:", [*REPORT_TYPES, "Custom SQL Query"])
+    
+    report_headings = {
+        "Complete Feedback Report": "### Complete Patient Feedback Dataset",
+        "Drug Performance Report": "### Comprehensive Drug Performance Analysis",
+        "Safety & Adverse Events Report": "### Safety & Adverse Events Analysis",
+        "Patient Demographics Report": "### Patient Demographics Breakdown",
+    }
     
     try:
-        if report_type == "Complete Feedback Report":
-            st.markdown("### Complete Patient Feedback Dataset")
-            
-            sql = f"""
-            SELECT 
-                ID, PATIENT_NAME, DRUG_NAME, COUNTRY, REGION,
-                AGE_AT_FEEDBACK, GENDER, SENTIMENT_CAT, LABELS,
-                FEEDBACK_DATE, TREATMENT_DURATION_DAYS, ADHERENCE,
-                SIDE_EFFECTS_REPORTED, COMORBIDITIES, THERAPAUTIC_AREA
-            FROM {BASE_TABLE}
-            {report_where}
-            ORDER BY FEEDBACK_DATE DESC
-            LIMIT 2000
-            """
-            
-        elif report_type == "Drug Performance Report":
-            st.markdown("### Comprehensive Drug Performance Analysis")
-            
-            sql = f"""
-            SELECT 
-                DRUG_NAME,
-                THERAPAUTIC_AREA,
-                COUNT(DISTINCT PATIENT_NAME) AS unique_patients,
-                COUNT(*) AS total_feedback,
-                ROUND(AVG(SENTIMENT_CAT), 2) AS avg_sentiment,
-                ROUND(AVG(AGE_AT_FEEDBACK), 1) AS avg_patient_age,
-                ROUND(AVG(TREATMENT_DURATION_DAYS), 0) AS avg_treatment_days,
-                SUM(CASE WHEN LABELS = 'Cured' THEN 1 ELSE 0 END) AS cured_count,
-                SUM(CASE WHEN LABELS = 'Improvement' THEN 1 ELSE 0 END) AS improved_count,
-                SUM(CASE WHEN LABELS = 'No Progress' THEN 1 ELSE 0 END) AS no_progress_count,
-                SUM(CASE WHEN LABELS IN ('Adverse', 'Worsen') THEN 1 ELSE 0 END) AS adverse_count,
-                ROUND(SUM(CASE WHEN LABELS IN ('Cured', 'Improvement') THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 1) AS success_rate,
-                COUNT(DISTINCT COUNTRY) AS countries_served
-            FROM {BASE_TABLE}
-            {report_where}
-            GROUP BY DRUG_NAME, THERAPAUTIC_AREA
-            ORDER BY total_feedback DESC
-            """
-            
-        elif report_type == "Safety & Adverse Events Report":
-            st.markdown("### Safety & Adverse Events Analysis")
-            
-            sql = f"""
-            SELECT 
-                DRUG_NAME,
-                PATIENT_NAME,
-                AGE_AT_FEEDBACK,
-                GENDER,
-                COUNTRY,
-                SIDE_EFFECTS_REPORTED,
-                FEEDBACK_DATE,
-                SENTIMENT_CAT,
-                LABELS,
-                COMORBIDITIES,
-                TREATMENT_DURATION_DAYS
-            FROM {BASE_TABLE}
-            {report_where}
-            AND LABELS IN ('Adverse', 'Worsen')
-            ORDER BY FEEDBACK_DATE DESC
-            LIMIT 1000
-            """
-            
-        elif report_type == "Patient Demographics Report":
-            st.markdown("### Patient Demographics Breakdown")
-            
-            sql = f"""
-            SELECT 
-                CASE 
-                    WHEN AGE_AT_FEEDBACK < 30 THEN '18-29'
-                    WHEN AGE_AT_FEEDBACK < 50 THEN '30-49'
-                    WHEN AGE_AT_FEEDBACK < 65 THEN '50-64'
-                    ELSE '65+'
-                END AS age_group,
-                GENDER,
-                COUNTRY,
-                REGION,
-                COUNT(*) AS patient_count,
-                ROUND(AVG(SENTIMENT_CAT), 2) AS avg_sentiment,
-                SUM(CASE WHEN LABELS IN ('Cured', 'Improvement') THEN 1 ELSE 0 END) AS success_count,
-                ROUND(AVG(TREATMENT_DURATION_DAYS), 0) AS avg_treatment_days
-            FROM {BASE_TABLE}
-            {report_where}
-            GROUP BY age_group, GENDER, COUNTRY, REGION
-            ORDER BY patient_count DESC
-            LIMIT 1000
-            """
+        if report_type in REPORT_TYPES:
+            st.markdown(report_headings[report_type])
+            sql, report_order = report_query(report_type, BASE_TABLE, report_where)
             
         else:  # Custom SQL Query
             st.markdown("### Custom SQL Query Interface")
@@ -1813,6 +1650,9 @@ elif page == "reports":
                 try:
                     with st.spinner("Executing custom query..."):
                         df = session.sql(custom_query).to_pandas()
+                        if not custom_query.lstrip().upper().startswith(("SELECT", "WITH", "SHOW", "DESC")):
+                            # Statements that may rewrite the table drop its cached results
+                            query_cache.invalidate(TABLE)
                         st.success(f"✅ Query executed successfully! {len(df)} rows returned")
                         st.dataframe(df, use_container_width=True, hide_index=True)
                         
@@ -1831,46 +1671,100 @@ elif page == "reports":
             sql = None
         
         if sql:
-            df = session.sql(sql).to_pandas()
+            if not report_order:
+                pager = KeysetPager(sql, report_params, keys=FEEDBACK_KEYS, page_size=REPORT_PAGE_ROWS)
+            else:
+                pager = OffsetPager(sql, report_params, order_by=report_order, page_size=REPORT_PAGE_ROWS)
+            export_key = (sql, tuple(report_params))
+            
+            # Cursors of the pages visited so far, reset whenever the report changes
+            pages = st.session_state.get("report_pages")
+            if pages is None or pages["key"] != export_key:
+                pages = {"key": export_key, "cursors": [None], "next": None}
+                st.session_state["report_pages"] = pages
+            
+            page_df = run_query(*pager.page_sql(pages["cursors"][-1]))
             
-            if not df.empty:
-                st.success(f"✅ Report generated successfully! {len(df)} records found")
+            if not page_df.empty:
+                summary = run_query(report_summary_sql(sql, page_df.columns), report_params).iloc[0]
+                total_records = int(summary['TOTAL_RECORDS'])
+                st.success(f"✅ Report generated successfully! {total_records:,} records found")
                 
-                # Display sample data
+                # Display the current page only
                 st.markdown("#### Data Preview")
-                st.dataframe(df.head(100), use_container_width=True, hide_index=True)
+                st.dataframe(page_df, use_container_width=True, hide_index=True)
                 
-                if len(df) > 100:
-                    st.info(f"Showing first 100 rows. Full dataset contains {len(df)} records.")
+                first_row = (len(pages["cursors"]) - 1) * REPORT_PAGE_ROWS + 1
+                last_row = first_row + len(page_df) - 1
+                pages["next"] = pager.next_cursor(page_df, pages["cursors"][-1]) if last_row < total_records else None
+                if pages["next"] is not None:
+                    prefetch_query(*pager.page_sql(pages["next"]))
                 
-                # Download functionality
-                csv = df.to_csv(index=False)
-                report_filename = f"{report_type.lower().replace(' ', '_').replace('&', 'and')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+                def previous_report_page():
+                    pages["cursors"].pop()
                 
-                st.download_button(
-                    label="📥 Download Complete Report",
-                    data=csv,
-                    file_name=report_filename,
-                    mime="text/csv",
-                    help=f"Download the complete {report_type.lower()} as CSV file"
-                )
+                def next_report_page():
+                    pages["cursors"].append(pages["next"])
+                
+                prev_col, info_col, next_col = st.columns([1, 2, 1])
+                with prev_col:
+                    st.button("◀ Previous", key="report_prev_page", on_click=previous_report_page,
+                              disabled=len(pages["cursors"]) == 1, use_container_width=True)
+                with info_col:
+                    total_pages = max(1, -(-total_records // REPORT_PAGE_ROWS))
+                    st.markdown(f"<p style='text-align: center;'>Page {len(pages['cursors'])} of {total_pages:,} "
+                                f"(rows {first_row:,}-{last_row:,} of {total_records:,})</p>", unsafe_allow_html=True)
+                with next_col:
+                    st.button("Next ▶", key="report_next_page", on_click=next_report_page,
+                              disabled=pages["next"] is None, use_container_width=True)
+                
+                # Download functionality: the full result is streamed to a file in batches
+                report_stem = f"{report_type.lower().replace(' ', '_').replace('&', 'and')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                
+                fmt_col, prepare_col = st.columns([2, 1])
+                with fmt_col:
+                    export_format = st.selectbox("Export format:", available_formats(), key="report_export_format")
+                with prepare_col:
+                    st.markdown("<br>", unsafe_allow_html=True)
+                    prepare_export = st.button("Prepare Export", key="prepare_report_export", use_container_width=True)
+                
+                # One temp directory per browser session, removed when the session ends
+                if "report_exports" not in st.session_state:
+                    st.session_state["report_exports"] = ExportDirectory()
+                exports = st.session_state["report_exports"]
+                if prepare_export:
+                    with st.spinner(f"Exporting {total_records:,} records..."):
+                        exports.write((export_key, export_format),
+                                      query_batches(f"{sql} {pager.order_by}", report_params),
+                                      export_format, report_stem)
+                
+                # A file prepared for other filters or another format is deleted here
+                export_file = exports.get((export_key, export_format))
+                if export_file is not None:
+                    with open(export_file.path, "rb") as export_data:
+                        st.download_button(
+                            label="📥 Download Complete Report",
+                            data=export_data,
+                            file_name=export_file.file_name,
+                            mime=export_file.mime,
+                            help=f"Download all {export_file.rows:,} rows of the {report_type.lower()} ({export_file.size_bytes / 1024 / 1024:.1f} MB)"
+                        )
                 
                 # Summary statistics
-                if 'SENTIMENT_CAT' in df.columns:
+                if 'SENTIMENT_CAT' in page_df.columns:
                     st.markdown("#### Report Summary")
                     
                     col1, col2, col3, col4 = st.columns(4)
                     with col1:
-                        st.metric("Total Records", f"{len(df):,}")
+                        st.metric("Total Records", f"{total_records:,}")
                     with col2:
-                        if 'DRUG_NAME' in df.columns:
-                            st.metric("Unique Drugs", df['DRUG_NAME'].nunique())
+                        if 'DRUG_NAME' in page_df.columns:
+                            st.metric("Unique Drugs", int(summary['UNIQUE_DRUGS']))
                     with col3:
-                        if 'COUNTRY' in df.columns:
-                            st.metric("Countries", df['COUNTRY'].nunique())
+                        if 'COUNTRY' in page_df.columns:
+                            st.metric("Countries", int(summary['COUNTRIES']))
                     with col4:
-                        if 'SENTIMENT_CAT' in df.columns:
-                            st.metric("Avg Sentiment", f"{df['SENTIMENT_CAT'].mean():.2f}/10")
+                        st.metric("Avg Sentiment", f"{summary['AVG_SENTIMENT']:.2f}/10")
             else:
                 st.warning("No data found matching the current filters.")
                 
@@ -0,0 +1,285 @@
+"""Pre-aggregated cubes for the dashboard's common group-by dimensions.
+
+A cube is a summary table of the base table grouped by a fixed set of
+dimensions, holding the row count plus the sum and non-null count of each
+averaged column. The jobs that write the base table own the cubes: each
+enrichment run rebuilds them and micro-batch ingestion merges in the signed
+change of every batch (:func:`apply_cube_delta`). :class:`CubeRouter` only
+reads them, rewriting every page aggregation that a cube can answer --
+COUNT, AVG, conditional counts over cube dimensions, and DISTINCT/MIN/MAX
+of a dimension -- to read the cube instead of scanning raw feedback rows.
+Anything else still goes to the base table.
+"""
+
+import re
+import threading
+from dataclasses import dataclass, replace
+
+from query_planner import DIMENSION_EXPRESSIONS, PagePlan, collect_frames, stream_tasks
+
+# Every cube keeps the sidebar filter columns so filtered pages can use it
+FILTER_DIMENSIONS = ("DRUG_NAME", "REGION", "COUNTRY")
+
+# +1 for a row added to the base table, -1 for a row removed from it
+SIGN_COLUMN = "CHANGE_SIGN"
+
+SQL_KEYWORDS = {"WHERE", "AND", "OR", "NOT", "IN", "IS", "NULL", "BETWEEN", "LIKE", "TRUE", "FALSE"}
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_IDENTIFIER = re.compile(r"\b[A-Za-z_][A-Za-z0-9_]*\b")
+
+
+def referenced_columns(sql):
+    """Upper-cased identifiers in a condition, ignoring literals and keywords"""
+    if not sql:
+        return set()
+    names = {name.upper() for name in _IDENTIFIER.findall(_STRING_LITERAL.sub("''", sql))}
+    return names - SQL_KEYWORDS
+
+
+@dataclass(frozen=True)
+class CubeSpec:
+    """A summary table grouped by ``dimensions``
+
+    ``avg_columns`` are the columns whose sum and count are kept so AVG can
+    be re-derived at any coarser grain.
+    """
+
+    name: str
+    dimensions: tuple
+    avg_columns: tuple = ("SENTIMENT_CAT",)
+
+    def table_name(self, base_table):
+        return f"{base_table}_CUBE_{self.name}".upper()
+
+    def select_sql(self, base_table):
+        """The cube's contents as a single grouped scan of ``base_table``"""
+        dims = [
+            f"{DIMENSION_EXPRESSIONS[d]} AS {d}" if d in DIMENSION_EXPRESSIONS else d
+            for d in self.dimensions
+        ]
+        measures = ["COUNT(*) AS ROW_COUNT"]
+        for col in self.avg_columns:
+            measures += [f"SUM({col}) AS {col}_SUM", f"COUNT({col}) AS {col}_COUNT"]
+        group_by = ", ".join(DIMENSION_EXPRESSIONS.get(d, d) for d in self.dimensions)
+        return f"SELECT {', '.join(dims + measures)} FROM {base_table} GROUP BY {group_by}"
+
+    def build_sql(self, base_table):
+        return f"CREATE OR REPLACE TABLE {self.table_name(base_table)} AS {self.select_sql(base_table)}"
+
+    def create_sql(self, base_table):
+        """Like :meth:`build_sql`, but leaves an existing cube alone"""
+        return f"CREATE TABLE IF NOT EXISTS {self.table_name(base_table)} AS {self.select_sql(base_table)}"
+
+    def delta_sql(self, delta_table):
+        """The change to the cube's cells from ``delta_table``, base-table rows with a :data:`SIGN_COLUMN`"""
+        dims = [
+            f"{DIMENSION_EXPRESSIONS[d]} AS {d}" if d in DIMENSION_EXPRESSIONS else d
+            for d in self.dimensions
+        ]
+        measures = [f"SUM({SIGN_COLUMN}) AS ROW_COUNT"]
+        for col in self.avg_columns:
+            measures += [
+                f"SUM({SIGN_COLUMN} * {col}) AS {col}_SUM",
+                f"SUM(CASE WHEN {col} IS NULL THEN 0 ELSE {SIGN_COLUMN} END) AS {col}_COUNT",
+            ]
+        group_by = ", ".join(DIMENSION_EXPRESSIONS.get(d, d) for d in self.dimensions)
+        return f"SELECT {', '.join(dims + measures)} FROM {delta_table} GROUP BY {group_by}"
+
+    def merge_sql(self, base_table, delta_table):
+        """MERGE that adds :meth:`delta_sql` to the cube; the result equals a rebuild once :meth:`prune_sql` has run"""
+        measures = ["ROW_COUNT"]
+        updates = ["ROW_COUNT = c.ROW_COUNT + d.ROW_COUNT"]
+        for col in self.avg_columns:
+            measures += [f"{col}_SUM", f"{col}_COUNT"]
+            updates += [
+                f"{col}_SUM = CASE WHEN c.{col}_COUNT + d.{col}_COUNT = 0 THEN NULL "
+                f"ELSE COALESCE(c.{col}_SUM, 0) + COALESCE(d.{col}_SUM, 0) END",
+                f"{col}_COUNT = c.{col}_COUNT + d.{col}_COUNT",
+            ]
+        columns = list(self.dimensions) + measures
+        on = " AND ".join(f"c.{d} IS NOT DISTINCT FROM d.{d}" for d in self.dimensions)
+        return f"""
+            MERGE INTO {self.table_name(base_table)} AS c
+            USING ({self.delta_sql(delta_table)}) AS d
+            ON {on}
+            WHEN MATCHED THEN UPDATE SET {', '.join(updates)}
+            WHEN NOT MATCHED THEN INSERT ({', '.join(columns)}) VALUES ({', '.join(f"d.{c}" for c in columns)})
+        """
+
+    def prune_sql(self, base_table):
+        """Drop the cells no base-table row falls into any more"""
+        return f"DELETE FROM {self.table_name(base_table)} WHERE ROW_COUNT = 0"
+
+    def covers(self, aggregation, where=""):
+        """Whether the cube alone can answer ``aggregation`` under ``where``"""
+        dims = set(self.dimensions)
+        if aggregation.predicate_params:
+            return False
+        if not referenced_columns(where) <= dims or not referenced_columns(aggregation.predicate) <= dims:
+            return False
+        if not set(aggregation.group_by) <= dims:
+            return False
+        for measure in aggregation.measures.values():
+            if measure.func == "COUNT":
+                continue
+            if measure.func in ("COUNT_IF", "PCT_IF"):
+                if not referenced_columns(measure.column) <= dims:
+                    return False
+            elif measure.func == "AVG":
+                if measure.column not in self.avg_columns:
+                    return False
+            elif measure.column not in dims:
+                return False
+        return True
+
+
+DEFAULT_CUBES = (
+    CubeSpec("OVERVIEW", FILTER_DIMENSIONS + ("YEAR", "LABELS", "FEEDBACK_SOURCE", "THERAPAUTIC_AREA")),
+    CubeSpec("PATIENT", FILTER_DIMENSIONS + ("LABELS", "GENDER", "ADHERENCE", "LANGUAGE")),
+)
+
+
+def build_cubes(execute, base_table, cubes=DEFAULT_CUBES):
+    """Materialize every cube next to ``base_table`` using ``execute(sql)``"""
+    for cube in cubes:
+        execute(cube.build_sql(base_table))
+
+
+def build_missing_cubes(execute, base_table, cubes=DEFAULT_CUBES):
+    """Materialize the cubes that do not exist yet, e.g. before the first :func:`apply_cube_delta`"""
+    for cube in cubes:
+        execute(cube.create_sql(base_table))
+
+
+def apply_cube_delta(execute, base_table, delta_table, cubes=DEFAULT_CUBES, merge=True):
+    """Bring every cube up to date with the signed rows of ``delta_table``
+
+    Backends without MERGE (``merge=False``) rebuild the cubes instead.
+    """
+    for cube in cubes:
+        if merge:
+            execute(cube.merge_sql(base_table, delta_table))
+            execute(cube.prune_sql(base_table))
+        else:
+            execute(cube.build_sql(base_table))
+
+
+class RoutedPlan:
+    """A page plan split between cube tables and the base table
+
+    Behaves like :class:`query_planner.PagePlan` for ``stream`` and ``run``;
+    the sub-plans' statements run side by side on the executor.
+    """
+
+    def __init__(self, name, plans):
+        self.name = name
+        self.plans = list(plans)
+
+    def tasks(self, run_query):
+        tasks = {}
+        for plan in self.plans:
+            tasks.update(plan.tasks(run_query))
+        return tasks
+
+    def stream(self, run_query, executor=None):
+        return stream_tasks(self.tasks(run_query), executor)
+
+    def run(self, run_query, executor=None):
+        return collect_frames(self.stream(run_query, executor))
+
+
+class CubeRouter:
+    """Sends each page aggregation to the smallest cube that can answer it
+
+    The cubes are written by the jobs that change the base table (enrichment
+    rebuilds them, micro-batch ingestion merges each batch into them); the
+    router only reads. ``sync`` checks the warehouse catalog for which cubes
+    exist and are no older than the base table, and :meth:`route` uses just
+    those unless told otherwise. A local engine keeps its own copies of every
+    cube.
+    """
+
+    def __init__(self, base_table, cubes=DEFAULT_CUBES):
+        self.base_table = base_table
+        self.cubes = sorted(cubes, key=lambda cube: len(cube.dimensions))
+        self.available = ()
+        self.checked = False
+        self.version = None
+        self._lock = threading.Lock()
+
+    def status_sql(self):
+        """``(sql, params)`` listing TABLE_NAME and LAST_ALTERED of the base table and its cubes"""
+        *qualifier, name = self.base_table.upper().split(".")
+        names = [name] + [cube.table_name(self.base_table).split(".")[-1] for cube in self.cubes]
+        catalog = ".".join(qualifier[:1] + ["INFORMATION_SCHEMA", "TABLES"])
+        where = f"TABLE_NAME IN ({', '.join('?' for _ in names)})"
+        params = names
+        if len(qualifier) == 2:
+            where = f"TABLE_SCHEMA = ? AND {where}"
+            params = [qualifier[1]] + names
+        return f"SELECT TABLE_NAME, LAST_ALTERED FROM {catalog} WHERE {where}", params
+
+    def sync(self, version, execute):
+        """Find the usable cubes with ``execute(sql, params)`` unless already checked for ``version``
+
+        A cube altered before the base table is stale and is skipped until
+        the job that maintains it has caught up.
+        """
+        with self._lock:
+            if self.checked and version is not None and version == self.version:
+                return
+            sql, params = self.status_sql()
+            df = execute(sql, params)
+            altered = {str(name).upper(): when for name, when in zip(df["TABLE_NAME"], df["LAST_ALTERED"])}
+            base = altered.get(self.base_table.upper().split(".")[-1])
+            available = []
+            for cube in self.cubes:
+                when = altered.get(cube.table_name(self.base_table).split(".")[-1])
+                if when is not None and (base is None or when >= base):
+                    available.append(cube)
+            self.available = tuple(available)
+            self.checked = True
+            self.version = version
+
+    def invalidate(self):
+        with self._lock:
+            self.available = ()
+            self.checked = False
+            self.version = None
+
+    def cube_for(self, aggregation, where="", cubes=None):
+        for cube in self.cubes if cubes is None else cubes:
+            if cube.covers(aggregation, where):
+                return cube
+        return None
+
+    def route(self, plan, cubes=None):
+        """Return ``plan`` itself, or a :class:`RoutedPlan` reading cubes where possible
+
+        ``cubes`` limits routing to those cubes, e.g. :attr:`available`;
+        by default every cube is assumed to exist.
+        """
+        if plan.table != self.base_table:
+            return plan
+        routed = {}
+        raw = []
+        for agg in plan.aggregations:
+            cube = self.cube_for(agg, plan.where, cubes)
+            if cube is None:
+                raw.append(agg)
+            else:
+                rolled_up = {alias: replace(m, rollup=True) for alias, m in agg.measures.items()}
+                routed.setdefault(cube, []).append(replace(agg, measures=rolled_up))
+        if not routed:
+            return plan
+        plans = [
+            PagePlan(f"{plan.name}@{cube.name}", cube.table_name(self.base_table), plan.where, members,
+                     use_grouping_sets=plan.use_grouping_sets, params=plan.params, dimension_expressions={})
+            for cube, members in routed.items()
+        ]
+        if raw:
+            plans.append(PagePlan(plan.name, plan.table, plan.where, raw,
+                                  use_grouping_sets=plan.use_grouping_sets, params=plan.params,
+                                  dimension_expressions=plan.dimension_expressions))
+        return RoutedPlan(plan.name, plans)
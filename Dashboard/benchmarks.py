@@ -0,0 +1,388 @@
+"""Benchmarks for the dashboard's page queries and the ETL cleaning stages.
+
+The query suite loads a synthetic feedback table of each requested size
+into a :class:`local_session.LocalSession` backend and times every
+statement the Executive, Drug Performance, Safety, Forecasting,
+Geographic, Segmentation and Reports pages issue on first load
+(:func:`page_statements`, built from the same plans as the app), both
+unfiltered and with a sidebar selection. The ETL suite streams raw
+feedback of each size through :func:`feedback_etl.transform_stages` in
+ETL-sized chunks and times every stage. Synthetic rows are the bundled
+dataset resampled with fresh IDs; the long free-text columns no page
+query reads are left out of the query table.
+
+Every query or stage is run once to warm up, then ``repeats`` times for
+p50/p95 latency, then once more under memory tracking: the peak of
+Python allocations (``tracemalloc``, which includes pandas and NumPy
+buffers) and, on Linux, the peak growth of the process RSS, which also
+covers the embedded database. Results go to a JSON file;
+:func:`compare` lines two result files up and reports what got faster
+or slower.
+
+Usage::
+
+    python benchmarks.py run --scales 10000 1000000 --out baseline.json
+    python benchmarks.py run --scales 10000 1000000 --out candidate.json
+    python benchmarks.py compare baseline.json candidate.json
+
+``compare`` exits with status 1 when anything got slower.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from date_parsing import DateParser
+from dimension_catalog import catalog_sql
+from disproportionality import pair_counts_sql
+from feature_engineering import FeatureStage
+from feedback_etl import CHUNK_ROWS, csv_chunks, transform_stages
+from forecasting import monthly_sql
+from local_session import DEFAULT_DATASET, LocalSession, load_dataset
+from page_queries import (
+    REPORT_TYPES, drug_performance_plan, executive_plan, geographic_plan, report_query, report_summary_sql, safety_plan,
+    segmentation_plan,
+)
+from query_filters import FeedbackFilter
+from report_pager import FEEDBACK_KEYS, KeysetPager, OffsetPager
+
+DEFAULT_SCALES = (10_000, 1_000_000, 10_000_000)
+DEFAULT_BACKENDS = ("duckdb",)
+DEFAULT_REPEATS = 5
+PAGES = ("executive", "drug_performance", "safety", "forecasting", "geographic", "segmentation", "reports")
+RAW_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Dataset", "NFeedback_Data.csv")
+TABLE = "MODIFIED_DATA"
+LOAD_CHUNK_ROWS = 500_000
+FREE_TEXT_COLUMNS = ("FEEDBACK", "T_FEEDBACK", "REPLY")
+REPORT_PAGE_ROWS = 100
+# The dashboard's default date pickers
+START_DATE = "2010-01-01"
+END_DATE = "2025-12-31"
+ETL_AS_OF = "2025-01-01"
+REGRESSION_THRESHOLD = 0.10
+RSS_SAMPLE_SECONDS = 0.002
+
+
+def resampled_chunks(base, rows, chunk_rows, seed=0):
+    """``rows`` rows drawn from ``base`` with replacement, ``chunk_rows`` at a time, IDs 1..rows"""
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, chunk_rows):
+        n = min(chunk_rows, rows - start)
+        chunk = base.take(rng.integers(0, len(base), n)).reset_index(drop=True)
+        if "ID" in chunk.columns:
+            chunk["ID"] = np.arange(start + 1, start + n + 1, dtype=np.int64)
+        yield chunk
+
+
+def load_table(backend, rows, seed=0):
+    """A :class:`LocalSession` on ``backend`` holding ``rows`` synthetic feedback rows as :data:`TABLE`"""
+    session = LocalSession(dataset_path=None, backend=backend)
+    base = load_dataset(DEFAULT_DATASET).drop(columns=list(FREE_TEXT_COLUMNS), errors="ignore")
+    for i, chunk in enumerate(resampled_chunks(base, rows, LOAD_CHUNK_ROWS, seed)):
+        session.write_pandas(chunk, TABLE, auto_create_table=True, overwrite=i == 0)
+    return session
+
+
+def plan_statements(plan):
+    """``[(name, sql, params)]`` the app runs for ``plan``"""
+    if plan.use_grouping_sets:
+        return [(plan.name, plan.sql(), plan.sql_params())]
+    return [
+        (f"{plan.name}.{agg.name}", agg.standalone_sql(plan.table, plan.where, plan.dimension_expressions),
+         agg.standalone_params(plan.params))
+        for agg in plan.aggregations
+    ]
+
+
+def _grouping(plan, use_grouping_sets):
+    plan.use_grouping_sets = use_grouping_sets
+    return plan
+
+
+def page_statements(table, filters, drug, columns_of, use_grouping_sets=True):
+    """``{page: [(name, sql, params)]}`` of every statement a page runs on first load
+
+    ``columns_of(sql, params)`` returns a statement's result columns (for
+    the report footers, which depend on them).
+    """
+    date_range, date_params = FeedbackFilter.of(START_DATE, END_DATE).where()
+    statements = {
+        "executive": plan_statements(_grouping(executive_plan(table, filters, START_DATE, END_DATE), use_grouping_sets))
+        + [("filter_catalog", catalog_sql(table), ())],
+        "drug_performance": plan_statements(
+            _grouping(drug_performance_plan(table, drug, START_DATE, END_DATE), use_grouping_sets))
+        + [("side_effects", pair_counts_sql(table, date_range), date_params)],
+        "safety": plan_statements(_grouping(safety_plan(table, filters), use_grouping_sets)),
+        "forecasting": [("monthly_series", monthly_sql(table), ())],
+        "geographic": plan_statements(_grouping(geographic_plan(table, filters), use_grouping_sets)),
+        "segmentation": plan_statements(_grouping(segmentation_plan(table, filters), use_grouping_sets)),
+        "reports": [],
+    }
+    population, population_params = FeedbackFilter.of(regions=filters.regions, countries=filters.countries).where()
+    statements["safety"].append(("disproportionality", pair_counts_sql(table, population), population_params))
+
+    where, params = filters.where()
+    for report_type in REPORT_TYPES:
+        sql, order_by = report_query(report_type, table, where)
+        if order_by:
+            pager = OffsetPager(sql, params, order_by=order_by, page_size=REPORT_PAGE_ROWS)
+        else:
+            pager = KeysetPager(sql, params, keys=FEEDBACK_KEYS, page_size=REPORT_PAGE_ROWS)
+        name = report_type.lower().replace(" & ", "_").replace(" ", "_")
+        page_sql, page_params = pager.page_sql(None)
+        statements["reports"] += [
+            (f"{name}.first_page", page_sql, page_params),
+            (f"{name}.summary", report_summary_sql(sql, columns_of(sql, params)), params),
+        ]
+    return statements
+
+
+class _PeakRss:
+    """Highest process RSS growth while the block runs, sampled from ``/proc`` (None elsewhere)"""
+
+    def __init__(self, interval=RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self.peak_bytes = None
+        self._page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+        self._stop = threading.Event()
+
+    def _rss(self):
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self._page
+        except OSError:
+            return None
+
+    def _sample(self, start):
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, self._rss() - start)
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        start = self._rss()
+        if start is not None:
+            self.peak_bytes = 0
+            self._thread = threading.Thread(target=self._sample, args=(start,), daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.peak_bytes is not None:
+            self._stop.set()
+            self._thread.join()
+
+
+def _mb(value):
+    return None if value is None else round(value / 2 ** 20, 2)
+
+
+def summarize(seconds):
+    seconds = np.asarray(seconds, dtype=float) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(seconds, 50)), 3),
+        "p95_ms": round(float(np.percentile(seconds, 95)), 3),
+        "mean_ms": round(float(seconds.mean()), 3),
+        "runs": int(len(seconds)),
+    }
+
+
+def measure(func, repeats=DEFAULT_REPEATS):
+    """Latency percentiles of ``func()`` over ``repeats`` runs after a warm-up, plus its peak memory"""
+    func()
+    seconds = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        with _PeakRss() as rss:
+            func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {**summarize(seconds), "peak_python_mb": _mb(peak), "peak_rss_mb": _mb(rss.peak_bytes)}
+
+
+def run_query_suite(backend, rows, repeats=DEFAULT_REPEATS, pages=PAGES, progress=print):
+    """One result per page statement, unfiltered and filtered, on ``rows`` synthetic rows"""
+    session = load_table(backend, rows)
+
+    def run(sql, params):
+        return session.sql(sql, params=list(params)).to_pandas() if params else session.sql(sql).to_pandas()
+
+    def columns_of(sql, params):
+        return list(run(f"SELECT * FROM ({sql}) AS report LIMIT 0", params).columns)
+
+    catalog = run(catalog_sql(TABLE), ())
+    drugs = sorted(catalog["DRUG_NAME"].dropna().unique())
+    regions = sorted(catalog["REGION"].dropna().unique())
+    scenarios = {
+        "all": FeedbackFilter.of(),
+        "filtered": FeedbackFilter.of(drugs=drugs[:3], regions=regions[:2]),
+    }
+    results = []
+    for scenario, filters in scenarios.items():
+        statements = page_statements(TABLE, filters, drugs[0], columns_of, session.supports_grouping_sets)
+        for page in pages:
+            for name, sql, params in statements[page]:
+                result = {"suite": "query", "group": page, "name": f"{name}[{scenario}]", "backend": backend,
+                          "rows": rows, **measure(lambda: run(sql, params), repeats)}
+                results.append(result)
+                if progress is not None:
+                    progress(f"{backend} {rows:>11,} {page:<17} {result['name']:<48} "
+                             f"p50 {result['p50_ms']:>10.2f} ms  p95 {result['p95_ms']:>10.2f} ms")
+    return results
+
+
+def run_etl_suite(rows, repeats=DEFAULT_REPEATS, chunk_rows=CHUNK_ROWS, progress=print):
+    """One result per :func:`feedback_etl.transform_stages` stage, summed over ``rows`` rows in chunks"""
+    base = next(csv_chunks(RAW_DATASET, chunk_rows=10 ** 9))
+
+    def one_run(track_memory=False):
+        seconds, peaks = {}, {}
+        stages = transform_stages(features=FeatureStage(ETL_AS_OF), date_parser=DateParser())
+        for chunk in resampled_chunks(base, rows, chunk_rows):
+            for name, step in stages:
+                if track_memory:
+                    tracemalloc.reset_peak()
+                    with _PeakRss() as rss:
+                        chunk = step(chunk)
+                    python_peak, rss_peak = peaks.get(name, (0, None))
+                    peaks[name] = (max(python_peak, tracemalloc.get_traced_memory()[1]),
+                                   None if rss.peak_bytes is None else max(rss_peak or 0, rss.peak_bytes))
+                else:
+                    started = time.perf_counter()
+                    chunk = step(chunk)
+                    seconds[name] = seconds.get(name, 0.0) + time.perf_counter() - started
+        return seconds, peaks
+
+    one_run()
+    runs = [one_run()[0] for _ in range(repeats)]
+    tracemalloc.start()
+    try:
+        _, peaks = one_run(track_memory=True)
+    finally:
+        tracemalloc.stop()
+    results = []
+    for name, _ in transform_stages():
+        python_peak, rss_peak = peaks[name]
+        result = {"suite": "etl", "group": "transform", "name": name, "backend": None, "rows": rows,
+                  **summarize([run[name] for run in runs]),
+                  "peak_python_mb": _mb(python_peak), "peak_rss_mb": _mb(rss_peak)}
+        results.append(result)
+        if progress is not None:
+            progress(f"etl    {rows:>11,} {name:<66} p50 {result['p50_ms']:>10.2f} ms  p95 {result['p95_ms']:>10.2f} ms")
+    return results
+
+
+def environment():
+    try:
+        import duckdb
+        duckdb_version = duckdb.__version__
+    except ImportError:
+        duckdb_version = None
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "duckdb": duckdb_version,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run_benchmarks(scales=DEFAULT_SCALES, backends=DEFAULT_BACKENDS, repeats=DEFAULT_REPEATS, pages=PAGES,
+                   etl=True, progress=print):
+    results = []
+    for rows in scales:
+        for backend in backends:
+            results += run_query_suite(backend, rows, repeats, pages, progress)
+        if etl:
+            results += run_etl_suite(rows, repeats, progress=progress)
+    return {"environment": environment(), "repeats": repeats, "results": results}
+
+
+def _key(result):
+    return result["suite"], result["group"], result["name"], result["backend"], result["rows"]
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Side-by-side p50s of two result files with a verdict per query or stage
+
+    A change is ``faster``/``slower`` only when the p50 moved by at least
+    ``threshold`` and the new p50-p95 range does not overlap the old one;
+    anything else is ``same``.
+    """
+    old = {_key(r): r for r in baseline["results"]}
+    new = {_key(r): r for r in current["results"]}
+    rows = []
+    for key in list(old) + [k for k in new if k not in old]:
+        before, after = old.get(key), new.get(key)
+        row = dict(zip(("SUITE", "GROUP", "NAME", "BACKEND", "ROWS"), key))
+        row["OLD_P50_MS"] = before["p50_ms"] if before else None
+        row["NEW_P50_MS"] = after["p50_ms"] if after else None
+        row["OLD_PEAK_PYTHON_MB"] = before["peak_python_mb"] if before else None
+        row["NEW_PEAK_PYTHON_MB"] = after["peak_python_mb"] if after else None
+        if before is None or after is None:
+            row["CHANGE"] = None
+            row["VERDICT"] = "new" if before is None else "missing"
+        else:
+            change = after["p50_ms"] / before["p50_ms"] - 1 if before["p50_ms"] else 0.0
+            row["CHANGE"] = round(change, 4)
+            if change <= -threshold and after["p95_ms"] < before["p50_ms"]:
+                row["VERDICT"] = "faster"
+            elif change >= threshold and after["p50_ms"] > before["p95_ms"]:
+                row["VERDICT"] = "slower"
+            else:
+                row["VERDICT"] = "same"
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard queries and ETL stages")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="run the benchmarks and write a JSON result file")
+    run.add_argument("--scales", type=int, nargs="+", default=list(DEFAULT_SCALES))
+    run.add_argument("--backends", nargs="+", default=list(DEFAULT_BACKENDS), choices=("duckdb", "sqlite"))
+    run.add_argument("--pages", nargs="+", default=list(PAGES), choices=PAGES)
+    run.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    run.add_argument("--skip-etl", action="store_true")
+    run.add_argument("--out", default="benchmark_results.json")
+    diff = commands.add_parser("compare", help="compare two result files")
+    diff.add_argument("baseline")
+    diff.add_argument("current")
+    diff.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        report = run_benchmarks(args.scales, args.backends, args.repeats, args.pages, etl=not args.skip_etl)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"{len(report['results'])} results written to {args.out}")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    table = compare(baseline, current, args.threshold)
+    with pd.option_context("display.max_rows", None, "display.width", 200, "display.max_colwidth", 60):
+        print(table.to_string(index=False))
+    counts = table["VERDICT"].value_counts()
+    print(", ".join(f"{counts.get(v, 0)} {v}" for v in ("faster", "slower", "same", "new", "missing")))
+    return 1 if counts.get("slower", 0) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
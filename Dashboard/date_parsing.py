@@ -0,0 +1,112 @@
+"""Fast, format-aware date parsing for the feedback loaders.
+
+``pd.to_datetime`` without a format guesses it from the data every time it
+is called, and the feedback exports use ``m/d/YYYY``, which pandas cannot
+parse on its ISO fast path. :class:`DateParser` detects each column's
+format once from a small sample, remembers it for every later chunk of the
+same column, and parses only the distinct strings of a column (a few
+thousand dates cover millions of rows), gathering the results back by
+code. Dates stay ``datetime64`` from then on; they are only turned back
+into text by the CSV writer.
+"""
+
+import threading
+
+import pandas as pd
+
+# The format that parses most sampled values wins; ties go to the earlier one
+CANDIDATE_FORMATS = (
+    "%m/%d/%Y",
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S",
+    "%d/%m/%Y",
+    "%m/%d/%y",
+    "%d-%b-%Y",
+)
+SAMPLE_SIZE = 1000
+OUTPUT_FORMAT = "%Y-%m-%d"
+
+
+def detect_format(values, candidates=CANDIDATE_FORMATS, sample_size=SAMPLE_SIZE):
+    """The one of ``candidates`` that parses most of a sample of ``values``, or None if none parses any
+
+    Stray values in another format (such as a ``1850-01-01`` placeholder
+    among ``m/d/YYYY`` dates) do not change the column's format; they
+    become NaT like any other unparseable value.
+    """
+    sample = pd.Series(pd.unique(pd.Series(values).dropna().astype(str))[:sample_size])
+    best, best_count = None, 0
+    for fmt in candidates:
+        count = int(pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum())
+        if count > best_count:
+            best, best_count = fmt, count
+        if best_count == len(sample):
+            break
+    return best
+
+
+def _to_datetime(text, fmt):
+    return pd.to_datetime(text, format=fmt, errors="coerce") if fmt else pd.to_datetime(text, errors="coerce")
+
+
+class DateParser:
+    """Parses date columns with a per-column format detected once and cached
+
+    Values that do not match the column's format become NaT, as with
+    ``errors="coerce"``. A cached format that fails on most of a column's
+    distinct values (the same column name from a different source) is
+    detected again. Columns whose format cannot be detected fall back to
+    pandas' own inference.
+    """
+
+    def __init__(self, candidates=CANDIDATE_FORMATS, sample_size=SAMPLE_SIZE):
+        self.candidates = tuple(candidates)
+        self.sample_size = sample_size
+        self.formats = {}
+        self._lock = threading.Lock()
+
+    def format_for(self, column, values, redetect=False):
+        """Cached format of ``column``, detected from ``values`` the first time one is found"""
+        with self._lock:
+            if redetect or self.formats.get(column) is None:
+                self.formats[column] = detect_format(values, self.candidates, self.sample_size)
+            return self.formats[column]
+
+    def parse(self, series, column=None):
+        """``series`` as ``datetime64``; already-typed dates are returned unchanged"""
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            return series
+        column = series.name if column is None else column
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy()
+            uniques = series.cat.categories
+        else:
+            codes, uniques = pd.factorize(series)
+        if len(uniques) == 0:
+            return pd.to_datetime(series, errors="coerce")
+        text = pd.Series(uniques).astype(str)
+        fmt = self.format_for(column, text)
+        parsed = _to_datetime(text, fmt)
+        if fmt is not None and parsed.isna().sum() * 2 > len(text):
+            fmt = self.format_for(column, text, redetect=True)
+            parsed = _to_datetime(text, fmt)
+        # code -1 (missing) becomes NaT
+        return pd.Series(parsed.array.take(codes, allow_fill=True), index=series.index, name=series.name)
+
+    def parse_columns(self, df, columns):
+        """Copy of ``df`` with each of ``columns`` that it has parsed"""
+        df = df.copy()
+        for col in columns:
+            if col in df.columns:
+                df[col] = self.parse(df[col], col)
+        return df
+
+
+DATE_PARSER = DateParser()
+
+
+def parse_dates(series, column=None):
+    """:meth:`DateParser.parse` with the shared, process-wide format cache"""
+    return DATE_PARSER.parse(series, column)
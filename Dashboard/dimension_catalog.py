@@ -0,0 +1,75 @@
+"""In-memory catalog of the sidebar filter dimensions.
+
+All filter values are fetched with a single grouped query over the base
+table and kept until the table's version token changes, so rendering the
+sidebar does not touch the warehouse on every rerun.
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+
+FILTER_DIMENSIONS = ("DRUG_NAME", "REGION", "COUNTRY")
+
+
+def catalog_sql(table):
+    """One grouped scan returning every distinct filter combination"""
+    columns = ", ".join(FILTER_DIMENSIONS)
+    return f"SELECT {columns} FROM {table} GROUP BY {columns}"
+
+
+def _distinct_sorted(values):
+    return tuple(sorted({str(v) for v in values if v is not None and v == v}))
+
+
+@dataclass(frozen=True)
+class DimensionCatalog:
+    """Sorted distinct values for each filter dimension"""
+
+    drugs: tuple = ()
+    regions: tuple = ()
+    countries: tuple = ()
+    version: tuple = None
+    loaded_at: float = field(default_factory=time.time)
+
+    @classmethod
+    def from_frame(cls, df, version=None):
+        return cls(
+            drugs=_distinct_sorted(df["DRUG_NAME"]),
+            regions=_distinct_sorted(df["REGION"]),
+            countries=_distinct_sorted(df["COUNTRY"]),
+            version=version,
+        )
+
+
+class DimensionCatalogStore:
+    """Holds the current catalog and reloads it only when the table changes
+
+    ``max_age_seconds`` bounds how long a catalog is trusted when no version
+    token is available (for example if the metadata probe fails).
+    """
+
+    def __init__(self, max_age_seconds=3600):
+        self.max_age_seconds = max_age_seconds
+        self._catalog = None
+        self._lock = threading.Lock()
+
+    def get(self, version, loader):
+        """Return the catalog, calling ``loader()`` for a fresh frame if stale"""
+        with self._lock:
+            if not self._is_stale(version):
+                return self._catalog
+            self._catalog = DimensionCatalog.from_frame(loader(), version=version)
+            return self._catalog
+
+    def invalidate(self):
+        with self._lock:
+            self._catalog = None
+
+    def _is_stale(self, version):
+        catalog = self._catalog
+        if catalog is None:
+            return True
+        if version is None or catalog.version is None:
+            return time.time() - catalog.loaded_at > self.max_age_seconds
+        return catalog.version != version
@@ -0,0 +1,139 @@
+"""Pharmacovigilance disproportionality statistics for drug x side-effect pairs.
+
+:class:`ContingencyTable` holds the report count of every drug x
+SIDE_EFFECTS_REPORTED pair that occurs (the non-zero cells of the full
+matrix) plus the drug and side-effect totals, built from one grouped scan
+(:func:`pair_counts_sql`) or from raw feedback rows. :meth:`~ContingencyTable.signals`
+derives each pair's 2x2 table from those counts and computes, for every
+pair at once:
+
+- PRR, the proportional reporting ratio, with its 95% confidence interval
+- ROR, the reporting odds ratio, with its 95% confidence interval
+- the Yates-corrected chi-square
+
+and flags signals by the usual screening rules (at least 3 cases,
+PRR >= 2 and chi-square >= 4; or a ROR lower bound above 1). Reports
+without a side effect (missing, 'Unspecified' or 'None Reported') count towards the
+totals but never form a pair. New feedback is added with
+:meth:`~ContingencyTable.add` / :meth:`~ContingencyTable.add_rows` without
+recounting what is already in the table.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+DRUG_COLUMN = "DRUG_NAME"
+EFFECT_COLUMN = "SIDE_EFFECTS_REPORTED"
+NO_EVENT_VALUES = ("Unspecified", "None Reported")
+INTERVAL_Z = 1.96
+MIN_CASES = 3
+MIN_PRR = 2.0
+MIN_CHI_SQUARE = 4.0
+
+
+def pair_counts_sql(table, where=""):
+    """Report count per drug and side effect (missing side effects included) in one grouped scan"""
+    return f"""
+        SELECT {DRUG_COLUMN}, {EFFECT_COLUMN}, COUNT(*) AS REPORTS
+        FROM {table}
+        {where}
+        GROUP BY {DRUG_COLUMN}, {EFFECT_COLUMN}
+    """
+
+
+class ContingencyTable:
+    """Sparse drug x side-effect report counts with the statistics derived from them"""
+
+    def __init__(self, no_event_values=NO_EVENT_VALUES):
+        self.no_event_values = tuple(no_event_values)
+        self.pairs = pd.Series(dtype="int64")     # (drug, effect) -> reports, events only
+        self.drug_totals = pd.Series(dtype="int64")  # drug -> all reports of the drug
+        self.total = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_counts(cls, df, **kwargs):
+        table = cls(**kwargs)
+        table.add(df)
+        return table
+
+    def add(self, df):
+        """Add a :func:`pair_counts_sql` style frame (drug, side effect, REPORTS)"""
+        df = df.copy()
+        df.columns = [str(c).upper() for c in df.columns]
+        drugs = df[DRUG_COLUMN].astype(object)
+        effects = df[EFFECT_COLUMN].astype(object)
+        reports = df["REPORTS"].to_numpy(dtype=np.int64)
+        known = drugs.notna().to_numpy()
+        event = known & effects.notna().to_numpy() & ~effects.isin(self.no_event_values).to_numpy()
+        drug_totals = pd.Series(reports[known], index=drugs[known].to_numpy()).groupby(level=0).sum()
+        pairs = pd.Series(reports[event], index=pd.MultiIndex.from_arrays(
+            [drugs[event].to_numpy(), effects[event].to_numpy()], names=[DRUG_COLUMN, EFFECT_COLUMN]))
+        pairs = pairs.groupby(level=[0, 1]).sum()
+        with self._lock:
+            self.pairs = pairs if self.pairs.empty else self.pairs.add(pairs, fill_value=0).astype("int64")
+            self.drug_totals = drug_totals if self.drug_totals.empty else \
+                self.drug_totals.add(drug_totals, fill_value=0).astype("int64")
+            self.total += int(reports[known].sum())
+
+    def add_rows(self, feedback):
+        """Add raw feedback rows"""
+        counts = feedback.groupby([DRUG_COLUMN, EFFECT_COLUMN], dropna=False, observed=True).size()
+        self.add(counts.rename("REPORTS").reset_index())
+
+    def signals(self, z=INTERVAL_Z):
+        """One row per drug x side-effect pair with PRR, ROR, chi-square and signal flags, strongest first"""
+        with self._lock:
+            pairs, drug_totals, total = self.pairs, self.drug_totals, self.total
+        if pairs.empty:
+            return pd.DataFrame(columns=[DRUG_COLUMN, EFFECT_COLUMN, "CASES", "PRR", "PRR_LOWER", "PRR_UPPER",
+                                         "ROR", "ROR_LOWER", "ROR_UPPER", "CHI_SQUARE", "SIGNAL"])
+        drugs = pairs.index.get_level_values(0)
+        effects = pairs.index.get_level_values(1)
+        effect_totals = pairs.groupby(level=1).sum()
+
+        # 2x2 table per pair: a = drug with effect, b = drug without, c = other drugs with effect, d = the rest
+        a = pairs.to_numpy(dtype=float)
+        b = drug_totals.reindex(drugs).to_numpy(dtype=float) - a
+        c = effect_totals.reindex(effects).to_numpy(dtype=float) - a
+        d = float(total) - a - b - c
+        n = a + b + c + d
+
+        # Haldane correction where a cell is empty
+        zero = (a == 0) | (b == 0) | (c == 0) | (d == 0)
+        ha, hb, hc, hd = (np.where(zero, x + 0.5, x) for x in (a, b, c, d))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            prr = (ha / (ha + hb)) / (hc / (hc + hd))
+            prr_se = np.sqrt(1 / ha - 1 / (ha + hb) + 1 / hc - 1 / (hc + hd))
+            ror = (ha * hd) / (hb * hc)
+            ror_se = np.sqrt(1 / ha + 1 / hb + 1 / hc + 1 / hd)
+            chi_square = n * np.maximum(np.abs(a * d - b * c) - n / 2, 0) ** 2 / ((a + b) * (c + d) * (a + c) * (b + d))
+        chi_square = np.nan_to_num(chi_square)
+
+        out = pd.DataFrame({
+            DRUG_COLUMN: drugs,
+            EFFECT_COLUMN: effects,
+            "CASES": a.astype(np.int64),
+            "DRUG_REPORTS": (a + b).astype(np.int64),
+            "EFFECT_REPORTS": (a + c).astype(np.int64),
+            "PRR": prr,
+            "PRR_LOWER": np.exp(np.log(prr) - z * prr_se),
+            "PRR_UPPER": np.exp(np.log(prr) + z * prr_se),
+            "ROR": ror,
+            "ROR_LOWER": np.exp(np.log(ror) - z * ror_se),
+            "ROR_UPPER": np.exp(np.log(ror) + z * ror_se),
+            "CHI_SQUARE": chi_square,
+        })
+        out["PRR_SIGNAL"] = (out["CASES"] >= MIN_CASES) & (out["PRR"] >= MIN_PRR) & (out["CHI_SQUARE"] >= MIN_CHI_SQUARE)
+        out["ROR_SIGNAL"] = (out["CASES"] >= MIN_CASES) & (out["ROR_LOWER"] > 1)
+        out["SIGNAL"] = out["PRR_SIGNAL"] | out["ROR_SIGNAL"]
+        return out.sort_values(["SIGNAL", "PRR_LOWER", "CHI_SQUARE", "CASES"], ascending=False,
+                               kind="mergesort").reset_index(drop=True)
+
+    def drug_profile(self, drug):
+        """:meth:`signals` rows of one drug, most reported side effect first"""
+        out = self.signals()
+        out = out[out[DRUG_COLUMN] == drug]
+        return out.sort_values(["CASES", "PRR"], ascending=False, kind="mergesort").reset_index(drop=True)
@@ -0,0 +1,274 @@
+"""Incremental Cortex enrichment of the feedback table.
+
+Replaces the notebook's full-table ``UPDATE ... SET T_FEEDBACK =
+TRANSLATE(...)`` / ``SENTIMENT`` / ``LABELS`` passes. Only rows never
+enriched, or whose FEEDBACK text changed since they were last enriched
+(tracked with a SHA-256 of FEEDBACK in ``ENRICHED_HASH``), are processed,
+plus scored rows missing their category or label, and within a row only
+the missing or stale outputs are recomputed. Each Cortex function runs at
+most once per row: translation is staged first (through the sentence-level
+:class:`translation_memory.TranslationMemory` unless it is disabled), the
+sentiment score is computed once from the staged translation (or by a
+local :class:`sentiment_engine.SentimentScorer` when one is given), and
+the bucket and label are derived from that stored score. With a Python
+``translate`` function and a local scorer the job makes no Cortex calls
+and runs offline on :class:`local_session.LocalSession`. Replies are
+generated afterwards by :class:`reply_generation.ReplyJob`, which can put
+the freshly labelled Adverse and Worsen rows first.
+
+Rows are processed in ID order in batches. After each batch is written
+back, the last ID is saved to a checkpoint table in the same transaction,
+so an interrupted job resumes where it stopped instead of starting over.
+A run that changed any row rebuilds the dashboard's summary cubes
+(:mod:`aggregate_cube`) at the end; the dashboard only reads them.
+"""
+
+import time
+from dataclasses import dataclass
+
+from aggregate_cube import DEFAULT_CUBES, build_cubes, build_missing_cubes
+from labeling import ScoreLabeler
+from portable_sql import add_missing_columns, rows_sql
+from translation_memory import TranslationMemory
+
+CORTEX = "SNOWFLAKE.CORTEX"
+CHECKPOINT_TABLE = "ENRICHMENT_CHECKPOINTS"
+
+ENRICHED_COLUMNS = ("T_FEEDBACK", "SENTIMENT_SCORE", "SENTIMENT_CAT", "LABELS")
+# Derived from the stored score without a Cortex call
+DERIVED_COLUMNS = ("SENTIMENT_CAT", "LABELS")
+COLUMN_TYPES = {
+    "T_FEEDBACK": "STRING",
+    "SENTIMENT_SCORE": "FLOAT",
+    "SENTIMENT_CAT": "NUMBER(2)",
+    "LABELS": "STRING",
+    "ENRICHED_HASH": "STRING",
+}
+
+
+@dataclass
+class EnrichmentStats:
+    batches: int = 0
+    rows: int = 0
+    last_id: int = None
+    seconds: float = 0.0
+    sentences: int = 0
+    translated: int = 0
+
+
+class EnrichmentJob:
+    """Resumable, batched enrichment of ``table`` through ``execute(sql, params) -> DataFrame``
+
+    ``execute`` runs one statement and returns its result as a DataFrame
+    (``None``/empty for DDL and DML), e.g.
+    ``lambda sql, params=None: session.sql(sql, params=params).to_pandas()``.
+    ``translate(texts, languages)`` (such as :func:`ingestion.cortex_translator`)
+    translates the staged rows in Python instead of the translation memory.
+    ``cubes`` are the summary cubes kept next to ``table``.
+    """
+
+    def __init__(self, table, execute, batch_size=500, job_name="feedback_enrichment",
+                 checkpoint_table=CHECKPOINT_TABLE, translation_memory=True, scorer=None,
+                 labeler=ScoreLabeler(), translate=None, cubes=DEFAULT_CUBES):
+        self.table = table
+        self.execute = execute
+        self.batch_size = batch_size
+        self.job_name = job_name
+        self.checkpoint_table = checkpoint_table
+        self.stage_table = f"{table.split('.')[-1]}_ENRICH_STAGE"
+        self.translate = translate
+        if translate is not None:
+            self.memory = None
+        else:
+            self.memory = TranslationMemory(execute) if translation_memory is True else translation_memory or None
+        self.scorer = scorer
+        self.labeler = labeler
+        self.cubes = cubes
+
+    def prepare(self):
+        """Add the enrichment and checkpoint columns/tables if they do not exist"""
+        # First, so a backend without the memory's SQL is reported before anything changes
+        if self.memory is not None:
+            self.memory.prepare()
+        add_missing_columns(self.execute, self.table, COLUMN_TYPES)
+        self.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.checkpoint_table} ("
+            f"JOB STRING, LAST_ID NUMBER, ROWS_DONE NUMBER, STATUS STRING, UPDATED_AT TIMESTAMP_NTZ)"
+        )
+
+    def pending_condition(self):
+        """Rows that need at least one enriched column (re)computed
+
+        ENRICHED_HASH records the text a row was last enriched from, even
+        when Cortex returned no translation or score, so such rows are not
+        sent again on every run; clear ENRICHED_HASH to retry them. Rows
+        with a score but no category or label only have those re-derived.
+        """
+        derived = " OR ".join(f"{col} IS NULL" for col in DERIVED_COLUMNS)
+        stale = "ENRICHED_HASH IS NULL OR ENRICHED_HASH <> SHA2(FEEDBACK, 256)"
+        return f"(FEEDBACK IS NOT NULL AND ({stale} OR (SENTIMENT_SCORE IS NOT NULL AND ({derived}))))"
+
+    def pending_count(self):
+        df = self.execute(f"SELECT COUNT(*) AS PENDING FROM {self.table} WHERE {self.pending_condition()}")
+        return int(df.iloc[0, 0])
+
+    def checkpoint(self):
+        """``(last_id, rows_done)`` of an unfinished run, or ``(None, 0)``"""
+        df = self.execute(
+            f"SELECT LAST_ID, ROWS_DONE, STATUS FROM {self.checkpoint_table} WHERE JOB = ?",
+            [self.job_name],
+        )
+        if df is None or df.empty or df.iloc[0]["STATUS"] != "running":
+            return None, 0
+        return int(df.iloc[0]["LAST_ID"]), int(df.iloc[0]["ROWS_DONE"])
+
+    def run(self, max_batches=None, progress=None):
+        """Enrich pending rows batch by batch, resuming from the last checkpoint
+
+        ``progress(stats)`` is called after every batch. Returns the
+        :class:`EnrichmentStats` of this invocation.
+        """
+        started = time.monotonic()
+        self.prepare()
+        last_id, rows_done = self.checkpoint()
+        if last_id is None:
+            last_id = -1
+            self._save_checkpoint(last_id, 0, "running")
+        stats = EnrichmentStats(last_id=last_id)
+        while max_batches is None or stats.batches < max_batches:
+            batch_rows, batch_last_id = self._stage_batch(last_id)
+            if batch_rows == 0:
+                self._save_checkpoint(last_id, rows_done, "complete")
+                break
+            if self.memory is not None:
+                counts = self.memory.translate_into(self.stage_table)
+                stats.sentences += counts["sentences"]
+                stats.translated += counts["translated"]
+            elif self.translate is not None:
+                stats.translated += self._translate_stage()
+            self._score_stage()
+            self._merge_stage(batch_last_id, rows_done + batch_rows)
+            last_id = batch_last_id
+            rows_done += batch_rows
+            stats.batches += 1
+            stats.rows += batch_rows
+            stats.last_id = last_id
+            if progress is not None:
+                progress(stats)
+        if stats.rows:
+            build_cubes(self.execute, self.table, self.cubes)
+        else:
+            build_missing_cubes(self.execute, self.table, self.cubes)
+        stats.seconds = time.monotonic() - started
+        return stats
+
+    def _stage_batch(self, after_id):
+        """Stage the next batch with translation filled in where needed
+
+        With a translation memory or ``translate`` function, stale
+        translations are staged as NULL and filled in afterwards.
+        """
+        changed = "(ENRICHED_HASH IS NULL OR ENRICHED_HASH <> FEEDBACK_HASH)"
+        if self.memory is not None or self.translate is not None:
+            translate = "NULL"
+        else:
+            translate = f"{CORTEX}.TRANSLATE(FEEDBACK, LANGUAGE_CODE, 'en')"
+        self.execute(f"""
+            CREATE OR REPLACE TEMPORARY TABLE {self.stage_table} AS
+            WITH batch AS (
+                SELECT ID, FEEDBACK, LANGUAGE_CODE, T_FEEDBACK, SENTIMENT_SCORE, ENRICHED_HASH,
+                       SHA2(FEEDBACK, 256) AS FEEDBACK_HASH
+                FROM {self.table}
+                WHERE ID > ? AND {self.pending_condition()}
+                ORDER BY ID
+                LIMIT {int(self.batch_size)}
+            )
+            SELECT
+                ID,
+                FEEDBACK,
+                LANGUAGE_CODE,
+                FEEDBACK_HASH,
+                CASE WHEN {changed} OR T_FEEDBACK IS NULL
+                     THEN {translate}
+                     ELSE T_FEEDBACK END AS T_FEEDBACK,
+                CASE WHEN {changed} OR T_FEEDBACK IS NULL THEN NULL
+                     ELSE SENTIMENT_SCORE END AS SENTIMENT_SCORE
+            FROM batch
+        """, [after_id])
+        df = self.execute(f"SELECT COUNT(*) AS N, MAX(ID) AS LAST_ID FROM {self.stage_table}")
+        rows = int(df.iloc[0, 0])
+        return rows, (int(df.iloc[0, 1]) if rows else after_id)
+
+    def _translate_stage(self):
+        """Fill the staged rows' missing T_FEEDBACK with ``translate``; returns the rows translated"""
+        df = self.execute(f"SELECT ID, FEEDBACK, LANGUAGE_CODE FROM {self.stage_table} WHERE T_FEEDBACK IS NULL")
+        if df is None or df.empty:
+            return 0
+        translated = self.translate(df["FEEDBACK"].tolist(), df["LANGUAGE_CODE"].tolist())
+        self._update_stage("T_FEEDBACK", zip(df["ID"].tolist(), translated))
+        return len(df)
+
+    def _update_stage(self, column, values):
+        """Set ``column`` of the staged rows from ``(id, value)`` pairs"""
+        rows = [(int(row_id), value) for row_id, value in values]
+        if not rows:
+            return
+        sql, params = rows_sql(("ID", "VALUE"), rows)
+        self.execute(f"""
+            UPDATE {self.stage_table}
+            SET {column} = v.VALUE
+            FROM ({sql}) AS v
+            WHERE {self.stage_table}.ID = v.ID
+        """, params)
+
+    def _score_stage(self):
+        """One SENTIMENT call per staged row that has no valid score yet"""
+        if self.scorer is not None:
+            return self._score_stage_locally()
+        self.execute(f"""
+            UPDATE {self.stage_table}
+            SET SENTIMENT_SCORE = {CORTEX}.SENTIMENT(T_FEEDBACK)
+            WHERE SENTIMENT_SCORE IS NULL
+        """)
+
+    def _score_stage_locally(self):
+        df = self.execute(f"SELECT ID, T_FEEDBACK FROM {self.stage_table} WHERE SENTIMENT_SCORE IS NULL")
+        if df is None or df.empty:
+            return
+        scores = self.scorer.score(df["T_FEEDBACK"].tolist())
+        # NaN when the text is missing
+        self._update_stage("SENTIMENT_SCORE", ((row_id, float(score))
+                                               for row_id, score in zip(df["ID"].tolist(), scores) if score == score))
+
+    def _merge_stage(self, last_id, rows_done):
+        """Write the batch back and advance the checkpoint atomically"""
+        self.execute("BEGIN")
+        try:
+            self.execute(f"""
+                UPDATE {self.table} AS t
+                SET T_FEEDBACK = s.T_FEEDBACK,
+                    SENTIMENT_SCORE = s.SENTIMENT_SCORE,
+                    SENTIMENT_CAT = s.SENTIMENT_CAT,
+                    LABELS = s.LABELS,
+                    ENRICHED_HASH = s.FEEDBACK_HASH
+                FROM (
+                    SELECT ID, FEEDBACK_HASH, T_FEEDBACK, SENTIMENT_SCORE,
+                           {self.labeler.category_sql()} AS SENTIMENT_CAT,
+                           {self.labeler.labels_sql()} AS LABELS
+                    FROM {self.stage_table}
+                ) AS s
+                WHERE t.ID = s.ID
+            """)
+            self._save_checkpoint(last_id, rows_done, "running")
+            self.execute("COMMIT")
+        except Exception:
+            self.execute("ROLLBACK")
+            raise
+
+    def _save_checkpoint(self, last_id, rows_done, status):
+        self.execute(f"DELETE FROM {self.checkpoint_table} WHERE JOB = ?", [self.job_name])
+        self.execute(
+            f"INSERT INTO {self.checkpoint_table} (JOB, LAST_ID, ROWS_DONE, STATUS, UPDATED_AT) "
+            f"VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP())",
+            [self.job_name, last_id, rows_done, status],
+        )
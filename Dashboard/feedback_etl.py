@@ -0,0 +1,223 @@
+"""Streaming version of the FEEDBACK_ETL notebook.
+
+The raw feedback (the FEEDBACK_DATA table or a CSV export of it) is read
+in bounded chunks, every cleaning and feature-engineering step of the
+notebook is applied to one chunk at a time by :func:`transform`, and each
+cleaned chunk is appended to the output before the next one is read, so
+memory is bounded by the chunk size rather than the table size.
+
+FEEDBACK_COUNT is the only step that needs the whole table (it counts rows
+per patient ID); it is computed up front by a cheap ID-only pass and
+looked up per chunk. The other derived features come from
+:class:`feature_engineering.FeatureStage`, whose ``as_of`` date is fixed
+once per run so every chunk fills open-ended treatments with the same date. Low-cardinality columns are
+categoricals (:mod:`feedback_schema`) throughout, so replacements and
+string clean-up run once per distinct value rather than once per row.
+Dates are parsed with a format detected once per run (:mod:`date_parsing`)
+and stay ``datetime64`` until the sink writes them.
+"""
+
+import time
+from dataclasses import dataclass
+from functools import partial
+
+import pandas as pd
+
+from date_parsing import OUTPUT_FORMAT, DateParser
+from feature_engineering import FeatureStage
+from feedback_schema import CATEGORICAL_COLUMNS, CSV_DTYPES, map_categories
+from normalization_rules import FEEDBACK_RULES, RuleSet
+from report_export import session_batches
+
+SOURCE_TABLE = "FEEDBACK_DATA"
+TARGET_TABLE = "PROCESSED_FEEDBACK"
+CHUNK_ROWS = 100_000
+
+TITLE_CASE_COLUMNS = [
+    "PATIENT_NAME", "COUNTRY", "LANGUAGE", "DRUG_NAME", "THERAPAUTIC_AREA",
+    "FEEDBACK", "LANGUAGE_CODE", "GENDER", "INDICATION", "COMORBIDITIES",
+    "DIAGNOSIS", "SIDE_EFFECTS_REPORTED", "FEEDBACK_SOURCE", "HEALTHCARE_PROVIDER",
+    "DOCTOR_NAME", "REGION", "FOLLOW_UP_ACTIONS",
+]
+DATE_COLUMNS = ["DOB", "FEEDBACK_DATE", "TREATMENT_START_DATE", "TREATMENT_END_DATE"]
+
+SENTINEL_RULES = RuleSet(FEEDBACK_RULES)
+
+
+def csv_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Chunks of a raw feedback CSV; only empty cells are missing, as in the warehouse table"""
+    yield from pd.read_csv(path, chunksize=chunk_rows, keep_default_na=False, na_values=[""], dtype=CSV_DTYPES)
+
+
+def table_chunks(session, table=SOURCE_TABLE):
+    """Chunks of the raw feedback table as Snowpark hands them out"""
+    yield from session_batches(session, f"SELECT * FROM {table}")
+
+
+def csv_feedback_counts(path, chunk_rows=CHUNK_ROWS):
+    counts = None
+    for chunk in pd.read_csv(path, usecols=["ID"], chunksize=chunk_rows):
+        part = chunk["ID"].value_counts()
+        counts = part if counts is None else counts.add(part, fill_value=0)
+    return counts.astype("int64") if counts is not None else pd.Series(dtype="int64")
+
+
+def table_feedback_counts(session, table=SOURCE_TABLE):
+    df = session.sql(f"SELECT ID, COUNT(*) AS FEEDBACK_COUNT FROM {table} GROUP BY ID").to_pandas()
+    return df.set_index("ID")["FEEDBACK_COUNT"].astype("int64")
+
+
+def normalize_sentinels(df):
+    """The notebook's null and sentinel replacements as one pass of :data:`SENTINEL_RULES`"""
+    return SENTINEL_RULES.apply(df)
+
+
+def _text(series, func):
+    """``func(series.astype(str))``, computed once per category when the column is categorical"""
+    if isinstance(series.dtype, pd.CategoricalDtype) and not series.isna().any():
+        return map_categories(series, func)
+    return func(series.astype(str))
+
+
+def _title(values):
+    return values.str.strip().str.title()
+
+
+def _lower(values):
+    return values.str.strip().str.lower()
+
+
+def _categorize(df):
+    return df.astype({c: "category" for c in CATEGORICAL_COLUMNS if c in df.columns})
+
+
+def _title_case(df):
+    out = df.copy(deep=False)
+    for col in TITLE_CASE_COLUMNS:
+        out[col] = _text(out[col], _title)
+    return out
+
+
+def _parse_dates(df, date_parser):
+    out = df.copy(deep=False)
+    for col in DATE_COLUMNS:
+        out[col] = date_parser.parse(out[col], col)
+    return out
+
+
+def _filter_ages(df):
+    return df[df["AGE_AT_FEEDBACK"].between(0, 100).fillna(False).to_numpy(dtype=bool)].copy()
+
+
+def _lower_language_code(df):
+    out = df.copy(deep=False)
+    out["LANGUAGE_CODE"] = _text(out["LANGUAGE_CODE"], _lower)
+    return out
+
+
+def transform_stages(feedback_counts=None, features=None, date_parser=None):
+    """``[(name, step)]`` making up :func:`transform`; each step takes a frame and returns a new one"""
+    features = FeatureStage() if features is None else features
+    date_parser = DateParser() if date_parser is None else date_parser
+    return [
+        ("categorize", _categorize),
+        ("normalize_sentinels", normalize_sentinels),
+        ("title_case", _title_case),
+        ("parse_dates", partial(_parse_dates, date_parser=date_parser)),
+        ("features", partial(features.apply, feedback_counts=feedback_counts)),
+        ("filter_ages", _filter_ages),
+        ("lower_language_code", _lower_language_code),
+    ]
+
+
+def transform(chunk, feedback_counts=None, features=None, date_parser=None):
+    """Clean one chunk of raw feedback like the notebook
+
+    ``feedback_counts`` maps ID to its number of rows in the whole source;
+    without it FEEDBACK_COUNT is counted within the chunk. ``features`` is
+    the run's :class:`FeatureStage` (as of today by default) and
+    ``date_parser`` keeps the detected date formats between chunks. Date
+    columns are returned as ``datetime64``; FEEDBACK_WORD_COUNT is recounted
+    from the cleaned feedback.
+    """
+    df = chunk
+    for _, step in transform_stages(feedback_counts, features, date_parser):
+        df = step(df)
+    return df
+
+
+class CsvSink:
+    """Appends cleaned chunks to one CSV file, writing the header once and dates as YYYY-MM-DD"""
+
+    def __init__(self, path):
+        self.path = path
+        self._started = False
+
+    def write(self, df):
+        df.to_csv(self.path, mode="a" if self._started else "w", header=not self._started, index=False,
+                  date_format=OUTPUT_FORMAT)
+        self._started = True
+
+
+class TableSink:
+    """Appends cleaned chunks to a warehouse table; the first chunk replaces its contents
+
+    Dates are written as timestamps (``use_logical_type``) rather than text.
+    """
+
+    def __init__(self, session, table_name=TARGET_TABLE):
+        self.session = session
+        self.table_name = table_name
+        self._started = False
+
+    def write(self, df):
+        self.session.write_pandas(
+            df.reset_index(drop=True),
+            table_name=self.table_name,
+            auto_create_table=True,
+            overwrite=not self._started,
+            use_logical_type=True,
+        )
+        self._started = True
+
+
+@dataclass
+class ETLStats:
+    chunks: int = 0
+    rows_in: int = 0
+    rows_out: int = 0
+    seconds: float = 0.0
+
+
+def run_etl(chunks, sink, feedback_counts=None, as_of=None, progress=None):
+    """Transform every chunk and append it to ``sink``; ``progress(stats)`` after each chunk
+
+    ``as_of`` (default today) fills open-ended treatments for the whole run.
+    """
+    started = time.monotonic()
+    features = FeatureStage(as_of)
+    date_parser = DateParser()
+    stats = ETLStats()
+    for chunk in chunks:
+        cleaned = transform(chunk, feedback_counts, features, date_parser)
+        if len(cleaned) or stats.chunks == 0:
+            sink.write(cleaned)
+        stats.chunks += 1
+        stats.rows_in += len(chunk)
+        stats.rows_out += len(cleaned)
+        if progress is not None:
+            progress(stats)
+    stats.seconds = time.monotonic() - started
+    return stats
+
+
+def run_csv_etl(source_path, target_path, chunk_rows=CHUNK_ROWS, as_of=None, progress=None):
+    """Offline ETL from a raw feedback CSV to a cleaned CSV"""
+    return run_etl(csv_chunks(source_path, chunk_rows), CsvSink(target_path),
+                   csv_feedback_counts(source_path, chunk_rows), as_of, progress)
+
+
+def run_table_etl(session, source_table=SOURCE_TABLE, target_table=TARGET_TABLE, as_of=None, progress=None):
+    """Warehouse ETL from the raw feedback table into ``target_table``"""
+    return run_etl(table_chunks(session, source_table), TableSink(session, target_table),
+                   table_feedback_counts(session, source_table), as_of, progress)
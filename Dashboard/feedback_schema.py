@@ -0,0 +1,82 @@
+"""Compact in-memory representation of feedback records.
+
+Shared by the ETL and the dashboard's local snapshot. The low-cardinality
+text columns are held as pandas categoricals -- a small dictionary of the
+distinct values plus an int8/int16 code per row -- instead of one Python
+string per cell; dates are parsed once to ``datetime64`` by
+:mod:`date_parsing`; integer columns
+are downcast to the narrowest dtype that holds them.
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from date_parsing import parse_dates
+
+CATEGORICAL_COLUMNS = (
+    "COUNTRY", "LANGUAGE", "LANGUAGE_CODE", "DRUG_NAME", "THERAPAUTIC_AREA", "INDICATION",
+    "REGION", "GENDER", "ADHERENCE", "FEEDBACK_SOURCE", "HEALTHCARE_PROVIDER", "LABELS",
+    "FOLLOW_UP_ACTIONS",
+)
+DATE_COLUMNS = ("DOB", "FEEDBACK_DATE", "TREATMENT_START_DATE", "TREATMENT_END_DATE", "TREATMENT_END_DATE_FILL")
+INTEGER_COLUMNS = (
+    "ID", "FEEDBACK_WORD_COUNT", "FEEDBACK_COUNT", "AGE_AT_FEEDBACK", "TREATMENT_DURATION_DAYS", "SENTIMENT_CAT",
+)
+
+# dtype= for pd.read_csv so categoricals are built while parsing
+CSV_DTYPES = {col: "category" for col in CATEGORICAL_COLUMNS}
+
+
+def _downcast(series):
+    if series.isna().any():
+        return series
+    numeric = pd.to_numeric(series, errors="coerce")
+    if numeric.isna().any() or not np.all(np.mod(numeric, 1) == 0):
+        return series
+    return pd.to_numeric(numeric, downcast="integer")
+
+
+def apply_schema(df):
+    """``df`` with categorical, date and integer columns in their compact dtypes"""
+    out = {}
+    for col in df.columns:
+        series = df[col]
+        if col in CATEGORICAL_COLUMNS and not isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype("category")
+        elif col in DATE_COLUMNS:
+            series = parse_dates(series, col)
+        elif col in INTEGER_COLUMNS:
+            series = _downcast(series)
+        out[col] = series
+    return pd.DataFrame(out, index=df.index)
+
+
+def map_categories(series, func):
+    """Categorical with ``func`` (Series -> Series) applied to the categories only; collisions are merged"""
+    mapped = list(func(pd.Series(series.cat.categories).astype(str)))
+    new_categories = pd.Index(pd.unique(pd.Series(mapped)))
+    lookup = np.append(new_categories.get_indexer(mapped), -1)  # code -1 (missing) stays missing
+    codes = lookup[series.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, new_categories), index=series.index, name=series.name)
+
+
+def concat_frames(frames):
+    """Concatenate schema frames, unioning categories so categoricals stay categorical"""
+    frames = [f for f in frames]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    columns = {}
+    for col in frames[0].columns:
+        parts = [f[col] for f in frames]
+        if all(isinstance(p.dtype, pd.CategoricalDtype) for p in parts):
+            columns[col] = pd.Series(union_categoricals(parts, ignore_order=True))
+        else:
+            columns[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def memory_bytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
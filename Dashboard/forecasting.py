@@ -0,0 +1,275 @@
+"""Batch sentiment forecasting for the Forecasting page.
+
+Every monthly series the page can show -- all feedback, and each drug,
+region and country on its own -- is fitted at once with additive
+Holt-Winters exponential smoothing (ETS with damped trend and 12-month
+seasonality). The recursions run over time with NumPy arrays holding
+every series and every candidate parameter set side by side, and each
+series keeps the parameters with the smallest one-step-ahead squared
+error. Months without feedback are gaps: the state is carried forward
+without an update. Series with fewer than two years of data are fitted
+without the seasonal term.
+
+Forecasts come with prediction intervals from the model's h-step
+variance. :class:`ForecastStore` keeps the fitted parameters and
+forecasts; when the table changes it refits only the series whose
+monthly data changed. Other filter combinations are fitted on request
+and kept as well.
+"""
+
+import hashlib
+import threading
+from dataclasses import dataclass
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+SERIES_DIMENSIONS = ("DRUG_NAME", "REGION", "COUNTRY")
+SEASON_LENGTH = 12
+HORIZON_MONTHS = 36
+INTERVAL_Z = 1.96  # 95% prediction intervals
+MIN_OBSERVED_MONTHS = 12
+
+# Candidate smoothing parameters: level, trend (as a share of alpha), season, damping
+ALPHAS = (0.05, 0.1, 0.2, 0.35, 0.5)
+BETA_SHARES = (0.0, 0.05, 0.2)
+GAMMAS = (0.0, 0.05, 0.15)
+PHIS = (0.9, 0.98)
+
+
+def monthly_sql(table):
+    """Monthly sentiment sums and counts per drug, region and country"""
+    dims = ", ".join(SERIES_DIMENSIONS)
+    return f"""
+        SELECT MONTH_YEAR, {dims},
+               SUM(SENTIMENT_CAT) AS SENTIMENT_SUM,
+               COUNT(SENTIMENT_CAT) AS SENTIMENT_COUNT,
+               COUNT(*) AS FEEDBACK_COUNT
+        FROM {table}
+        WHERE MONTH_YEAR IS NOT NULL
+        GROUP BY MONTH_YEAR, {dims}
+    """
+
+
+def series_key(filters):
+    """Cache key for a :class:`query_filters.FeedbackFilter` selection (dates are not part of it)"""
+    return (("DRUG_NAME", tuple(filters.drugs)), ("REGION", tuple(filters.regions)), ("COUNTRY", tuple(filters.countries)))
+
+
+def _parameter_grid():
+    grid = np.array([(a, a * b, g, p) for a, b, g, p in product(ALPHAS, BETA_SHARES, GAMMAS, PHIS)])
+    return grid[:, 0], grid[:, 1], grid[:, 2], grid[:, 3]
+
+
+def _nanmean(values, axis):
+    count = (~np.isnan(values)).sum(axis=axis)
+    return np.where(count > 0, np.nansum(values, axis=axis) / np.maximum(count, 1), np.nan)
+
+
+def _initial_state(Y, seasonal, m):
+    """Level, trend and seasonal start values for every series"""
+    S, T = Y.shape
+    overall = np.nan_to_num(_nanmean(Y, axis=1))
+    first_year = _nanmean(Y[:, :m], axis=1)
+    level = np.where(np.isnan(first_year), overall, first_year)
+    # Average deviation from the series mean for each position in the cycle
+    padded = np.full((S, -(-T // m) * m), np.nan)
+    padded[:, :T] = Y - overall[:, None]
+    by_position = np.nan_to_num(_nanmean(padded.reshape(S, -1, m), axis=1))
+    season = np.where(seasonal[:, None], by_position - by_position.mean(axis=1, keepdims=True), 0.0)
+    return level, np.zeros(S), season
+
+
+def _smooth(Y, alpha, beta, gamma, phi, level, trend, season, m):
+    """Run the ETS(A,Ad,A) recursions for every series (rows) and parameter set (columns)
+
+    Returns the final states, the one-step squared error sum and the number
+    of observed months.
+    """
+    S, T = Y.shape
+    sse = np.zeros(level.shape)
+    for t in range(T):
+        position = t % m
+        forecast = level + phi * trend + season[..., position]
+        y = Y[:, t][:, None]
+        error = np.where(np.isnan(y), 0.0, y - forecast)
+        sse += error ** 2
+        level = level + phi * trend + alpha * error
+        trend = phi * trend + beta * error
+        season[..., position] = season[..., position] + gamma * error
+    observed = (~np.isnan(Y)).sum(axis=1)
+    return level, trend, season, sse, observed
+
+
+def _interval_scale(alpha, beta, gamma, phi, horizon, m):
+    """sqrt(1 + sum c_j^2) for h = 1..horizon, per series"""
+    steps = np.arange(1, horizon)
+    damped = np.cumsum(phi[:, None] ** steps[None, :], axis=1)
+    c = alpha[:, None] + beta[:, None] * damped + gamma[:, None] * (steps % m == 0)[None, :]
+    cumulative = np.concatenate([np.zeros((len(alpha), 1)), np.cumsum(c ** 2, axis=1)], axis=1)
+    return np.sqrt(1.0 + cumulative)
+
+
+@dataclass
+class SeriesForecast:
+    """History, fitted parameters and forecast of one monthly series"""
+
+    key: tuple
+    history: pd.DataFrame
+    params: dict
+    forecast: pd.DataFrame
+    fingerprint: str = ""
+
+
+def fit_series(Y, months, keys, horizon=HORIZON_MONTHS, m=SEASON_LENGTH, counts=None):
+    """Fit every row of ``Y`` (series x months, NaN for gaps) and return a :class:`SeriesForecast` per key"""
+    Y = np.asarray(Y, dtype=float)
+    S, T = Y.shape
+    observed = (~np.isnan(Y)).sum(axis=1)
+    seasonal = observed >= 2 * m
+    alpha, beta, gamma, phi = _parameter_grid()
+    K = len(alpha)
+    level0, trend0, season0 = _initial_state(Y, seasonal, m)
+    gammas = np.where(seasonal[:, None], gamma[None, :], 0.0)
+    level, trend, season, sse, n = _smooth(
+        Y, alpha[None, :], beta[None, :], gammas, phi[None, :],
+        np.repeat(level0[:, None], K, axis=1), np.repeat(trend0[:, None], K, axis=1),
+        np.repeat(season0[:, None, :], K, axis=1), m,
+    )
+    best = np.argmin(sse, axis=1)
+    rows = np.arange(S)
+    a, b, g, p = alpha[best], beta[best], gammas[rows, best], phi[best]
+    level, trend, season = level[rows, best], trend[rows, best], season[rows, best]
+    sigma = np.sqrt(sse[rows, best] / np.maximum(n, 1))
+
+    steps = np.arange(1, horizon + 1)
+    damped = np.cumsum(p[:, None] ** steps[None, :], axis=1)
+    positions = (T + steps - 1) % m
+    point = level[:, None] + damped * trend[:, None] + season[:, positions]
+    half_width = INTERVAL_Z * sigma[:, None] * _interval_scale(a, b, g, p, horizon, m)
+
+    future = pd.period_range(months[-1] + 1, periods=horizon, freq="M") if len(months) else pd.PeriodIndex([], freq="M")
+    results = {}
+    for i, key in enumerate(keys):
+        history = pd.DataFrame({"MONTH": months.to_timestamp(), "AVG_SENTIMENT": Y[i]})
+        if counts is not None:
+            history["FEEDBACK_COUNT"] = counts[i]
+        results[key] = SeriesForecast(
+            key=key,
+            history=history.dropna(subset=["AVG_SENTIMENT"]).reset_index(drop=True),
+            params={"alpha": float(a[i]), "beta": float(b[i]), "gamma": float(g[i]), "phi": float(p[i]),
+                    "sigma": float(sigma[i]), "seasonal": bool(seasonal[i]), "observed_months": int(observed[i])},
+            forecast=pd.DataFrame({
+                "MONTH": future.to_timestamp(),
+                "FORECAST": point[i],
+                "LOWER": point[i] - half_width[i],
+                "UPPER": point[i] + half_width[i],
+            }),
+        )
+    return results
+
+
+def monthly_panel(df):
+    """The :func:`monthly_sql` result with upper-case columns and a monthly ``MONTH`` period"""
+    df = df.copy()
+    df.columns = [str(c).upper() for c in df.columns]
+    months = pd.to_datetime(df["MONTH_YEAR"].astype(str), format="%Y-%m", errors="coerce")
+    df = df[months.notna()].copy()
+    df["MONTH"] = pd.PeriodIndex(months[months.notna()], freq="M")
+    return df
+
+
+def default_keys(panel):
+    """All feedback, plus every single drug, region and country"""
+    empty = {dim: () for dim in SERIES_DIMENSIONS}
+    keys = [tuple(empty.items())]
+    for dim in SERIES_DIMENSIONS:
+        for value in sorted(panel[dim].dropna().astype(str).unique()):
+            keys.append(tuple({**empty, dim: (value,)}.items()))
+    return keys
+
+
+def series_matrix(panel, keys):
+    """``(averages, feedback counts, months)`` with one row per key over the panel's full month range"""
+    months = pd.period_range(panel["MONTH"].min(), panel["MONTH"].max(), freq="M") if len(panel) else \
+        pd.PeriodIndex([], freq="M")
+    T = len(months)
+    position = months.get_indexer(panel["MONTH"])
+    columns = {dim: panel[dim].astype(str).to_numpy() for dim in SERIES_DIMENSIONS}
+    sums = np.zeros((len(keys), T))
+    scored = np.zeros((len(keys), T))
+    feedback = np.zeros((len(keys), T))
+    for i, key in enumerate(keys):
+        mask = np.ones(len(panel), dtype=bool)
+        for dim, values in key:
+            if values:
+                mask &= np.isin(columns[dim], values)
+        sums[i] = np.bincount(position[mask], weights=panel["SENTIMENT_SUM"].to_numpy(float)[mask], minlength=T)
+        scored[i] = np.bincount(position[mask], weights=panel["SENTIMENT_COUNT"].to_numpy(float)[mask], minlength=T)
+        feedback[i] = np.bincount(position[mask], weights=panel["FEEDBACK_COUNT"].to_numpy(float)[mask], minlength=T)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        averages = np.where(scored > 0, sums / scored, np.nan)
+    return averages, feedback.astype(np.int64), months
+
+
+def _fingerprint(months, averages, counts):
+    digest = hashlib.sha256(str(months[-1] if len(months) else "").encode())
+    digest.update(np.nan_to_num(averages, nan=-1.0).tobytes())
+    digest.update(counts.tobytes())
+    return digest.hexdigest()
+
+
+class ForecastStore:
+    """Fitted forecasts for every series, refitted only where the monthly data changed
+
+    ``refitted`` is the number of series the last :meth:`refresh` fitted.
+    """
+
+    def __init__(self, horizon=HORIZON_MONTHS):
+        self.horizon = horizon
+        self.version = None
+        self.panel = None
+        self.refitted = 0
+        self._forecasts = {}
+        self._lock = threading.Lock()
+
+    def refresh(self, version, loader):
+        """Reload the panel with ``loader()`` unless already loaded for ``version``, then refit changed series"""
+        with self._lock:
+            if self.panel is not None and version is not None and version == self.version:
+                return
+            panel = monthly_panel(loader())
+            keys = list(dict.fromkeys(default_keys(panel) + list(self._forecasts)))
+            averages, counts, months = series_matrix(panel, keys)
+            stale = []
+            for i, key in enumerate(keys):
+                fingerprint = _fingerprint(months, averages[i], counts[i])
+                current = self._forecasts.get(key)
+                if current is None or current.fingerprint != fingerprint:
+                    stale.append((i, fingerprint))
+            if stale:
+                rows = [i for i, _ in stale]
+                fitted = fit_series(averages[rows], months, [keys[i] for i in rows], self.horizon, counts=counts[rows])
+                for i, fingerprint in stale:
+                    fitted[keys[i]].fingerprint = fingerprint
+                    self._forecasts[keys[i]] = fitted[keys[i]]
+            self.panel = panel
+            self.version = version
+            self.refitted = len(stale)
+
+    def get(self, filters):
+        """The :class:`SeriesForecast` for a filter selection, fitting it first if it is not cached"""
+        key = series_key(filters)
+        with self._lock:
+            if key not in self._forecasts:
+                if self.panel is None:
+                    raise RuntimeError("ForecastStore.refresh must run before get")
+                averages, counts, months = series_matrix(self.panel, [key])
+                fitted = fit_series(averages, months, [key], self.horizon, counts=counts)[key]
+                fitted.fingerprint = _fingerprint(months, averages[0], counts[0])
+                self._forecasts[key] = fitted
+            return self._forecasts[key]
+
+    def __len__(self):
+        return len(self._forecasts)
@@ -0,0 +1,354 @@
+"""Micro-batch ingestion of new feedback into the dashboard table.
+
+Instead of rerunning the ETL and Cortex notebooks, which rewrite the whole
+table, :class:`MicroBatchIngestor` takes a batch of raw feedback records
+and:
+
+1. cleans it with the ETL's :func:`feedback_etl.transform`;
+2. enriches it (T_FEEDBACK, SENTIMENT_SCORE, SENTIMENT_CAT, LABELS) with a
+   :class:`BatchEnricher`;
+3. MERGE-upserts it into the table by ID through a staging table,
+   stamping ENRICHED_HASH so the enrichment job does not redo the rows;
+4. updates the aggregate cubes with only the batch's change, i.e. the
+   incoming rows (+1) minus the rows they replace (-1) (see
+   :func:`aggregate_cube.apply_cube_delta`), creating any cube that does
+   not exist yet first.
+
+Columns the batch does not carry (replies, for instance) keep their values
+on updated rows. Where the session has no transactions, a failed batch is
+undone by restoring the rows it replaced and rebuilding the cubes.
+
+:class:`DirectoryWatcher` is a local stand-in for a stage: CSV and JSON
+lines files dropped into a directory are picked up once they stop
+changing, ingested together as one micro-batch and moved to
+``processed/`` (or ``failed/``); a batch that fails is set aside and the
+watcher carries on. The dashboard sees new rows at its next table-version
+check.
+
+Run headless with ``python ingestion.py <directory>``.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+
+import pandas as pd
+
+from aggregate_cube import DEFAULT_CUBES, SIGN_COLUMN, apply_cube_delta, build_cubes, build_missing_cubes
+from date_parsing import DateParser
+from feature_engineering import FeatureStage
+from feedback_etl import transform
+from feedback_schema import CSV_DTYPES
+from labeling import ScoreLabeler
+from sentiment_engine import CortexScorer, HashedNGramScorer
+
+TARGET_TABLE = "MODIFIED_DATA"
+KEY_COLUMN = "ID"
+HASH_COLUMN = "ENRICHED_HASH"
+FILE_PATTERNS = (".csv", ".jsonl", ".json")
+SETTLE_SECONDS = 2          # files modified more recently are still being written
+MAX_BATCH_ROWS = 100_000
+POLL_SECONDS = 30
+SOURCE_LANGUAGE_SKIP = "en"
+
+
+def cortex_translator(execute, target="en"):
+    """``translate(texts, languages)`` running ``SNOWFLAKE.CORTEX.TRANSLATE`` for a whole batch in one statement"""
+    def translate(texts, languages):
+        if not texts:
+            return []
+        payload = [{"t": t, "l": l} for t, l in zip(texts, languages)]
+        df = execute(f"""
+            SELECT f.INDEX AS I, SNOWFLAKE.CORTEX.TRANSLATE(f.VALUE:t::STRING, f.VALUE:l::STRING, '{target}') AS T
+            FROM TABLE(FLATTEN(INPUT => PARSE_JSON(?))) AS f
+        """, [json.dumps(payload)])
+        out = [None] * len(texts)
+        for i, text in zip(df["I"].tolist(), df["T"].tolist()):
+            out[int(i)] = text
+        return out
+    return translate
+
+
+class BatchEnricher:
+    """Fills T_FEEDBACK, SENTIMENT_SCORE, SENTIMENT_CAT and LABELS for a cleaned batch
+
+    ``translate(texts, languages)`` returns English texts; without it (or
+    for English rows) T_FEEDBACK is the feedback itself. ``scorer`` is a
+    :class:`sentiment_engine.SentimentScorer`, the lexicon
+    :class:`~sentiment_engine.HashedNGramScorer` by default.
+    """
+
+    def __init__(self, scorer=None, translate=None, labeler=ScoreLabeler()):
+        self.scorer = HashedNGramScorer.from_lexicon() if scorer is None else scorer
+        self.translate = translate
+        self.labeler = labeler
+
+    def apply(self, df):
+        out = df.copy()
+        text = out["FEEDBACK"].astype(object)
+        translated = text.copy()
+        if self.translate is not None:
+            languages = out["LANGUAGE_CODE"].astype(object)
+            foreign = (text.notna() & languages.ne(SOURCE_LANGUAGE_SKIP)).to_numpy()
+            if foreign.any():
+                translated[foreign] = self.translate(text[foreign].tolist(), languages[foreign].tolist())
+        out["T_FEEDBACK"] = translated
+        return self.scorer.score_frame(out, "T_FEEDBACK", labeler=self.labeler)
+
+
+def feedback_hash(text):
+    """``SHA2(text, 256)`` as the enrichment job computes it; None for missing text"""
+    return None if pd.isna(text) else hashlib.sha256(str(text).encode("utf-8")).hexdigest()
+
+
+def read_feedback_file(path):
+    """Raw feedback records of a CSV or JSON lines file"""
+    if path.endswith(".csv"):
+        df = pd.read_csv(path, keep_default_na=False, na_values=[""], dtype=CSV_DTYPES)
+    else:
+        df = pd.read_json(path, lines=path.endswith(".jsonl"), dtype=False)
+    df.columns = [str(c).upper() for c in df.columns]
+    return df
+
+
+class DirectoryWatcher:
+    """New feedback files in ``path``, oldest first; handled files move to ``processed/`` or ``failed/``"""
+
+    def __init__(self, path, patterns=FILE_PATTERNS, settle_seconds=SETTLE_SECONDS):
+        self.path = path
+        self.patterns = tuple(patterns)
+        self.settle_seconds = settle_seconds
+        self.processed_dir = os.path.join(path, "processed")
+        self.failed_dir = os.path.join(path, "failed")
+
+    def pending(self):
+        now = time.time()
+        files = []
+        for entry in os.scandir(self.path):
+            if entry.is_file() and entry.name.endswith(self.patterns) and not entry.name.startswith("."):
+                mtime = entry.stat().st_mtime
+                if now - mtime >= self.settle_seconds:
+                    files.append((mtime, entry.name, entry.path))
+        return [path for _, _, path in sorted(files)]
+
+    def _move(self, path, directory):
+        os.makedirs(directory, exist_ok=True)
+        shutil.move(path, os.path.join(directory, os.path.basename(path)))
+
+    def mark_processed(self, path):
+        self._move(path, self.processed_dir)
+
+    def mark_failed(self, path):
+        self._move(path, self.failed_dir)
+
+
+@dataclass
+class IngestStats:
+    batches: int = 0
+    files: int = 0
+    failed_batches: int = 0
+    failed_files: int = 0
+    rows_in: int = 0
+    inserted: int = 0
+    updated: int = 0
+    seconds: float = 0.0
+    last_error: str = None
+
+
+class MicroBatchIngestor:
+    """Cleans, enriches and MERGE-upserts feedback batches into ``target_table``
+
+    ``session`` is a Snowpark session or :class:`local_session.LocalSession`
+    (anything with ``sql`` and ``write_pandas``). ``cubes`` are the
+    :class:`aggregate_cube.CubeSpec` summaries kept next to the table.
+    Backends without MERGE (``supports_merge``) update and insert in two
+    statements and rebuild the cubes instead.
+    """
+
+    def __init__(self, session, target_table=TARGET_TABLE, enricher=None, cubes=DEFAULT_CUBES,
+                 key_column=KEY_COLUMN, as_of=None):
+        self.session = session
+        self.target_table = target_table
+        self.local_name = target_table.split(".")[-1]
+        self.stage_table = f"{self.local_name}_INGEST_STAGE"
+        self.delta_table = f"{self.local_name}_INGEST_DELTA"
+        self.backup_table = f"{self.local_name}_INGEST_BACKUP"
+        self.enricher = BatchEnricher() if enricher is None else enricher
+        self.cubes = tuple(cubes)
+        self.key_column = key_column
+        self.features = FeatureStage(as_of)
+        self.date_parser = DateParser()
+        self.merge = getattr(session, "supports_merge", True)
+        self.transactions = getattr(session, "supports_transactions", True)
+        self._columns = None
+        self._cubes_ready = False
+
+    def execute(self, sql, params=None):
+        return self.session.sql(sql, params=params).to_pandas() if params else self.session.sql(sql).to_pandas()
+
+    @property
+    def columns(self):
+        """The target table's columns"""
+        if self._columns is None:
+            self._columns = list(self.execute(f"SELECT * FROM {self.target_table} LIMIT 0").columns)
+        return self._columns
+
+    def prepare(self, df):
+        """Clean and enrich raw records into rows shaped like the target table, one per ID"""
+        df = df.copy()
+        df.columns = [str(c).upper() for c in df.columns]
+        cleaned = transform(df, features=self.features, date_parser=self.date_parser)
+        enriched = self.enricher.apply(cleaned)
+        enriched = enriched.drop_duplicates(self.key_column, keep="last")
+        if HASH_COLUMN in self.columns:
+            scored = enriched["SENTIMENT_SCORE"].notna()
+            enriched[HASH_COLUMN] = enriched["FEEDBACK"].astype(object).map(feedback_hash).where(scored, None)
+        return enriched[[c for c in self.columns if c in enriched.columns]].reset_index(drop=True)
+
+    def ingest(self, df):
+        """Upsert one batch of raw records; returns ``(inserted, updated)``"""
+        rows = self.prepare(df)
+        if rows.empty:
+            return 0, 0
+        if self.cubes and not self._cubes_ready:
+            build_missing_cubes(self.execute, self.target_table, self.cubes)
+            self._cubes_ready = True
+        self.session.write_pandas(rows, table_name=self.stage_table, auto_create_table=True, overwrite=True,
+                                  table_type="temporary", use_logical_type=True)
+        columns = list(rows.columns)
+        key = self.key_column
+        matched = f"SELECT {key} FROM {self.stage_table}"
+        updated = int(self.execute(
+            f"SELECT COUNT(*) AS N FROM {self.target_table} WHERE {key} IN ({matched})").iloc[0, 0])
+        # DDL, so before the transaction opens
+        if self.cubes and self.merge:
+            # Rows leaving the cubes (-1) and entering them (+1)
+            self.execute(f"""
+                CREATE OR REPLACE TEMPORARY TABLE {self.delta_table} AS
+                SELECT -1 AS {SIGN_COLUMN}, {', '.join(columns)} FROM {self.target_table} WHERE {key} IN ({matched})
+                UNION ALL
+                SELECT 1 AS {SIGN_COLUMN}, {', '.join(columns)} FROM {self.stage_table}
+            """)
+        if not self.transactions:
+            self.execute(f"CREATE OR REPLACE TEMPORARY TABLE {self.backup_table} AS "
+                         f"SELECT * FROM {self.target_table} WHERE {key} IN ({matched})")
+        if self.transactions:
+            self.execute("BEGIN")
+        try:
+            self._upsert(columns)
+            if self.cubes:
+                apply_cube_delta(self.execute, self.target_table, self.delta_table, self.cubes, merge=self.merge)
+            if self.transactions:
+                self.execute("COMMIT")
+        except Exception:
+            if self.transactions:
+                self.execute("ROLLBACK")
+            else:
+                self._restore_backup()
+            raise
+        return len(rows) - updated, updated
+
+    def _restore_backup(self):
+        """Undo a failed batch without a transaction: put the replaced rows back and rebuild the cubes"""
+        key = self.key_column
+        self.execute(f"DELETE FROM {self.target_table} WHERE {key} IN (SELECT {key} FROM {self.stage_table})")
+        self.execute(f"INSERT INTO {self.target_table} SELECT * FROM {self.backup_table}")
+        if self.cubes:
+            build_cubes(self.execute, self.target_table, self.cubes)
+
+    def _upsert(self, columns):
+        key = self.key_column
+        updates = ", ".join(f"{c} = s.{c}" for c in columns if c != key)
+        if self.merge:
+            self.execute(f"""
+                MERGE INTO {self.target_table} AS t
+                USING {self.stage_table} AS s
+                ON t.{key} = s.{key}
+                WHEN MATCHED THEN UPDATE SET {updates}
+                WHEN NOT MATCHED THEN INSERT ({', '.join(columns)}) VALUES ({', '.join(f"s.{c}" for c in columns)})
+            """)
+        else:
+            # The same effect in two statements; columns the stage lacks keep their values, as with MERGE
+            self.execute(f"UPDATE {self.target_table} AS t SET {updates} FROM {self.stage_table} AS s "
+                         f"WHERE t.{key} = s.{key}")
+            self.execute(f"INSERT INTO {self.target_table} ({', '.join(columns)}) "
+                         f"SELECT {', '.join(columns)} FROM {self.stage_table} AS s "
+                         f"WHERE NOT EXISTS (SELECT 1 FROM {self.target_table} AS t WHERE t.{key} = s.{key})")
+
+    def run(self, watcher, poll_seconds=POLL_SECONDS, max_batch_rows=MAX_BATCH_ROWS, stop=None, progress=None):
+        """Ingest ``watcher``'s files as they arrive until ``stop()``; ``progress(stats)`` after each batch"""
+        started = time.monotonic()
+        stats = IngestStats()
+        while stop is None or not stop():
+            frames, files = [], []
+            for path in watcher.pending():
+                try:
+                    frames.append(read_feedback_file(path))
+                except Exception:
+                    watcher.mark_failed(path)
+                    stats.failed_files += 1
+                    continue
+                files.append(path)
+                if sum(len(f) for f in frames) >= max_batch_rows:
+                    break
+            if frames:
+                batch = pd.concat(frames, ignore_index=True)
+                try:
+                    inserted, updated = self.ingest(batch)
+                except Exception as exc:
+                    # The batch was rolled back; set its files aside and keep watching
+                    for path in files:
+                        watcher.mark_failed(path)
+                    stats.failed_batches += 1
+                    stats.failed_files += len(files)
+                    stats.last_error = f"{type(exc).__name__}: {exc}"
+                    if progress is not None:
+                        progress(stats)
+                    continue
+                for path in files:
+                    watcher.mark_processed(path)
+                stats.batches += 1
+                stats.files += len(files)
+                stats.rows_in += len(batch)
+                stats.inserted += inserted
+                stats.updated += updated
+                stats.seconds = time.monotonic() - started
+                if progress is not None:
+                    progress(stats)
+            else:
+                time.sleep(poll_seconds)
+        stats.seconds = time.monotonic() - started
+        return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest feedback files from a directory as they arrive")
+    parser.add_argument("directory", help="directory watched for CSV / JSON lines feedback files")
+    parser.add_argument("--table", default=TARGET_TABLE)
+    parser.add_argument("--poll-seconds", type=float, default=POLL_SECONDS)
+    args = parser.parse_args(argv)
+
+    try:
+        from snowflake.snowpark.context import get_active_session
+        session = get_active_session()
+        execute = lambda sql, params=None: session.sql(sql, params=params).to_pandas()
+        enricher = BatchEnricher(CortexScorer(execute), cortex_translator(execute))
+    except Exception:
+        from local_session import LocalSession
+        session = LocalSession()
+        enricher = BatchEnricher()
+    def progress(stats):
+        failed = f"; {stats.failed_batches} failed ({stats.last_error})" if stats.failed_batches else ""
+        print(f"{stats.batches} batches, {stats.files} files: {stats.inserted:,} inserted, "
+              f"{stats.updated:,} updated{failed}", flush=True)
+
+    ingestor = MicroBatchIngestor(session, args.table, enricher)
+    ingestor.run(DirectoryWatcher(args.directory), args.poll_seconds, progress=progress)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Sentiment score bucketing and outcome labels.
+
+SENTIMENT_CAT and LABELS are both pure functions of SENTIMENT_SCORE, so
+:class:`ScoreLabeler` derives them together: one ``np.searchsorted`` over
+sorted edge arrays per column, or the equivalent SQL expressions for use
+inside the enrichment MERGE. Label bins are half-open ``[low, high)``
+intervals that tile the score range without overlapping (the last bin
+also includes the top of the range), so every score has exactly one label
+regardless of the order the bins are written in. The default bins give
+the same labels as the notebook's first-match ``CASE ... BETWEEN``.
+"""
+
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+SCORE_MIN = -1.0
+SCORE_MAX = 1.0
+SCORE_BUCKETS = 10
+UNKNOWN_LABEL = "Unknown"
+
+
+def _sql_literal(value):
+    if value is None:
+        return "NULL"
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return repr(float(value))
+
+
+@dataclass(frozen=True)
+class Bins:
+    """Labels for the contiguous intervals between ascending ``edges``
+
+    ``labels[i]`` covers ``[edges[i], edges[i + 1])``; the last label also
+    covers ``edges[-1]``. Values outside the edges or missing get ``default``.
+    """
+
+    edges: tuple
+    labels: tuple
+    default: object = UNKNOWN_LABEL
+
+    def __post_init__(self):
+        edges = np.asarray(self.edges, dtype=float)
+        if len(edges) != len(self.labels) + 1:
+            raise ValueError("Bins need exactly one more edge than labels")
+        if np.any(np.diff(edges) <= 0):
+            raise ValueError("Bin edges must be strictly increasing")
+
+    def index(self, values):
+        """Bin number of every value, -1 where it falls outside the bins"""
+        values = np.asarray(values, dtype=float)
+        edges = np.asarray(self.edges, dtype=float)
+        idx = np.searchsorted(edges, values, side="right") - 1
+        idx[values == edges[-1]] = len(self.labels) - 1
+        idx[(idx < 0) | (idx >= len(self.labels)) | np.isnan(values)] = -1
+        return idx
+
+    def assign(self, values):
+        idx = self.index(values)
+        lookup = np.array(list(self.labels) + [self.default], dtype=object)
+        return lookup[idx]
+
+    def case_sql(self, column):
+        """SQL CASE with the same non-overlapping bins"""
+        whens = []
+        last = len(self.labels) - 1
+        for i, label in enumerate(self.labels):
+            upper = "<=" if i == last else "<"
+            whens.append(
+                f"WHEN {column} >= {_sql_literal(self.edges[i])} AND {column} {upper} "
+                f"{_sql_literal(self.edges[i + 1])} THEN {_sql_literal(label)}"
+            )
+        return "CASE " + " ".join(whens) + f" ELSE {_sql_literal(self.default)} END"
+
+
+LABEL_BINS = Bins(
+    edges=(-1.0, -0.5, -0.04, 0.2, 0.7, 1.0),
+    labels=("Adverse", "Worsen", "No progress", "Improved", "Cured"),
+)
+
+
+def width_bucket(scores, low=SCORE_MIN, high=SCORE_MAX, buckets=SCORE_BUCKETS):
+    """NumPy ``WIDTH_BUCKET``: 1..buckets inside [low, high), 0 below, buckets + 1 at or above ``high``
+
+    Missing scores stay missing; the result is a nullable ``Int64`` array.
+    """
+    scores = np.asarray(scores, dtype=float)
+    edges = np.round(np.linspace(low, high, buckets + 1), 12)  # 0.2, not 0.20000000000000018
+    bucket = np.searchsorted(edges, scores, side="right").astype(float)
+    bucket[np.isnan(scores)] = np.nan
+    return pd.array(bucket, dtype="Int64")
+
+
+@dataclass(frozen=True)
+class ScoreLabeler:
+    """Derives SENTIMENT_CAT and LABELS from SENTIMENT_SCORE"""
+
+    bins: Bins = field(default=LABEL_BINS)
+    low: float = SCORE_MIN
+    high: float = SCORE_MAX
+    buckets: int = SCORE_BUCKETS
+
+    def assign(self, scores):
+        """``(categories, labels)`` arrays for ``scores``"""
+        scores = np.asarray(scores, dtype=float)
+        return width_bucket(scores, self.low, self.high, self.buckets), self.bins.assign(scores)
+
+    def apply(self, df, score_column="SENTIMENT_SCORE", only_missing=False):
+        """Copy of ``df`` with SENTIMENT_CAT and LABELS set from ``score_column``
+
+        With ``only_missing`` existing non-null values are kept and only gaps
+        are filled.
+        """
+        out = df.copy()
+        categories, labels = self.assign(pd.to_numeric(out[score_column], errors="coerce"))
+        if only_missing and "SENTIMENT_CAT" in out.columns:
+            out["SENTIMENT_CAT"] = out["SENTIMENT_CAT"].astype("Int64").fillna(pd.Series(categories, index=out.index))
+        else:
+            out["SENTIMENT_CAT"] = categories
+        if only_missing and "LABELS" in out.columns:
+            out["LABELS"] = out["LABELS"].astype(object).where(out["LABELS"].notna(), labels)
+        else:
+            out["LABELS"] = labels
+        return out
+
+    def category_sql(self, column="SENTIMENT_SCORE"):
+        return f"WIDTH_BUCKET({column}, {_sql_literal(self.low)}, {_sql_literal(self.high)}, {int(self.buckets)})"
+
+    def labels_sql(self, column="SENTIMENT_SCORE"):
+        return self.bins.case_sql(column)
@@ -0,0 +1,243 @@
+"""Local columnar analytics engine for the Patient Pulse dashboard.
+
+The base table is pulled once into an in-process DuckDB table (columnar,
+compressed, vectorized execution) and the dashboard's page SQL runs
+against that snapshot instead of the warehouse. Later refreshes only pull
+rows at or after the FEEDBACK_DATE watermark, provided a checksum of the
+older rows (``checksum_sql``) shows none of them changed; otherwise, or
+without a checksum, a refresh reloads the whole table. Any aggregate cubes the
+engine is given are built from the snapshot on a full load and afterwards
+updated with just the rows each refresh removed and added. With a
+:class:`labeling.ScoreLabeler`, rows that have a SENTIMENT_SCORE but no
+SENTIMENT_CAT or LABELS yet get them filled in on load. Fetched rows are
+held in the compact :mod:`feedback_schema` dtypes until they are loaded.
+"""
+
+import threading
+
+import pandas as pd
+
+from aggregate_cube import SIGN_COLUMN, apply_cube_delta
+from feedback_schema import CATEGORICAL_COLUMNS, INTEGER_COLUMNS, apply_schema
+
+try:
+    import duckdb
+except ImportError:  # the dashboard falls back to warehouse mode
+    duckdb = None
+
+WATERMARK_COLUMN = "FEEDBACK_DATE"
+DELTA_TABLE = "snapshot_delta"
+# One-value checksum of the rows before the watermark, per source dialect
+CHECKSUM_SQL = {
+    "snowflake": f"SELECT HASH_AGG(*) AS CHECKSUM FROM {{table}} WHERE {WATERMARK_COLUMN} < '{{watermark}}'",
+    "duckdb": f"SELECT CAST(SUM(HASH(t)::HUGEINT) AS VARCHAR) AS CHECKSUM FROM {{table}} AS t "
+              f"WHERE {WATERMARK_COLUMN} < '{{watermark}}'",
+}
+
+
+def prepare_snapshot_frame(df, labeler=None):
+    """Give the fetched rows the column types the page SQL expects"""
+    df = df.copy()
+    df.columns = [str(c).upper() for c in df.columns]
+    df = apply_schema(df)
+    if labeler is not None and "SENTIMENT_SCORE" in df.columns:
+        df = labeler.apply(df, only_missing=True)
+    return df
+
+
+def _incoming_select(df):
+    """SELECT over ``incoming_rows`` with plain table types
+
+    DuckDB would turn categoricals into ENUMs (which later rows may not fit)
+    and downcast integers into columns too narrow for later IDs.
+    """
+    casts = [f"CAST({c} AS VARCHAR) AS {c}" for c in CATEGORICAL_COLUMNS if c in df.columns]
+    casts += [f"CAST({c} AS BIGINT) AS {c}" for c in INTEGER_COLUMNS if c in df.columns]
+    return "SELECT * REPLACE (" + ", ".join(casts) + ") FROM incoming_rows" if casts else "SELECT * FROM incoming_rows"
+
+
+class LocalAnalyticsEngine:
+    """In-process snapshot of ``table_name`` that answers the page queries
+
+    ``table_name`` is the fully qualified warehouse name used in the page
+    SQL; it is rewritten to the local table name before execution.
+    ``cubes`` are :class:`aggregate_cube.CubeSpec` summaries kept alongside;
+    ``labeler`` fills in missing SENTIMENT_CAT and LABELS values on load.
+    ``checksum_sql`` is a :data:`CHECKSUM_SQL` template for the source
+    table's dialect; without one every refresh after the first is a full
+    reload, since the engine cannot tell whether older rows changed.
+    """
+
+    def __init__(self, table_name, snapshot_path=None, cubes=(), labeler=None, checksum_sql=None):
+        if duckdb is None:
+            raise ImportError("duckdb is required for the local analytics engine")
+        self.table_name = table_name
+        self.local_name = table_name.split(".")[-1]
+        self.snapshot_path = snapshot_path
+        self.cubes = tuple(cubes)
+        self.labeler = labeler
+        self.checksum_sql = checksum_sql
+        self.watermark = None
+        self._history_checksum = None
+        self.version = None
+        self._con = duckdb.connect(database=":memory:")
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def available():
+        return duckdb is not None
+
+    @property
+    def ready(self):
+        return self.watermark is not None
+
+    @property
+    def row_count(self):
+        if not self.ready:
+            return 0
+        return self._con.cursor().execute(f"SELECT COUNT(*) FROM {self.local_name}").fetchone()[0]
+
+    def refresh(self, fetch, version=None, expected_rows=None):
+        """Bring the snapshot up to date using ``fetch(sql) -> DataFrame``
+
+        The first call (or a call after ``reset``) loads the whole table.
+        Later calls replace every row at or after the watermark date when
+        the rows before it are unchanged, and fall back to a full reload
+        when they changed (or cannot be checked) or the row count still
+        disagrees with ``expected_rows``.
+        """
+        with self._lock:
+            if not self.ready and self.snapshot_path:
+                self._load_parquet()
+            if not self.ready or self._history_checksum is None \
+                    or self._fetch_checksum(fetch) != self._history_checksum:
+                self._replace(fetch(f"SELECT * FROM {self.table_name}"))
+            else:
+                delta = fetch(
+                    f"SELECT * FROM {self.table_name} WHERE {WATERMARK_COLUMN} >= '{self.watermark}'"
+                )
+                self._apply_delta(delta)
+                if expected_rows is not None and self.row_count != expected_rows:
+                    self._replace(fetch(f"SELECT * FROM {self.table_name}"))
+            self._history_checksum = self._fetch_checksum(fetch)
+            self.version = version
+            if self.snapshot_path:
+                self._con.execute(f"COPY {self.local_name} TO '{self.snapshot_path}' (FORMAT PARQUET)")
+                self._write_checksum()
+
+    def reset(self):
+        with self._lock:
+            self._con.execute(f"DROP TABLE IF EXISTS {self.local_name}")
+            for cube in self.cubes:
+                self._con.execute(f"DROP TABLE IF EXISTS {cube.table_name(self.local_name)}")
+            self.watermark = None
+            self.version = None
+            self._history_checksum = None
+
+    def sql(self, query, params=None):
+        """Run page SQL against the snapshot and return an upper-cased DataFrame"""
+        query = query.replace(self.table_name, self.local_name)
+        cursor = self._con.cursor()
+        try:
+            df = cursor.execute(query, params or []).df()
+        finally:
+            cursor.close()
+        df.columns = [str(c).upper() for c in df.columns]
+        return df
+
+    def sql_batches(self, query, params=None, vectors_per_batch=32):
+        """Yield the result of ``query`` as upper-cased DataFrames, a chunk at a time"""
+        query = query.replace(self.table_name, self.local_name)
+        cursor = self._con.cursor()
+        try:
+            cursor.execute(query, params or [])
+            while True:
+                df = cursor.fetch_df_chunk(vectors_per_batch)
+                if df.empty:
+                    break
+                df.columns = [str(c).upper() for c in df.columns]
+                yield df
+        finally:
+            cursor.close()
+
+    def _replace(self, df):
+        snapshot = prepare_snapshot_frame(df, self.labeler)
+        self._con.register("incoming_rows", snapshot)
+        try:
+            self._con.execute(f"CREATE OR REPLACE TABLE {self.local_name} AS {_incoming_select(snapshot)}")
+        finally:
+            self._con.unregister("incoming_rows")
+        self._build_cubes()
+        self._update_watermark()
+
+    def _apply_delta(self, df):
+        delta = prepare_snapshot_frame(df, self.labeler)
+        self._con.execute("BEGIN TRANSACTION")
+        try:
+            # The replaced rows leave the cubes with sign -1, the incoming ones enter with +1
+            self._con.execute(
+                f"CREATE OR REPLACE TEMPORARY TABLE {DELTA_TABLE} AS "
+                f"SELECT -1 AS {SIGN_COLUMN}, * FROM {self.local_name} WHERE {WATERMARK_COLUMN} >= CAST(? AS TIMESTAMP)",
+                [self.watermark],
+            )
+            self._con.execute(
+                f"DELETE FROM {self.local_name} WHERE {WATERMARK_COLUMN} >= CAST(? AS TIMESTAMP)",
+                [self.watermark],
+            )
+            if not delta.empty:
+                self._con.register("incoming_rows", delta)
+                try:
+                    self._con.execute(f"INSERT INTO {self.local_name} BY NAME {_incoming_select(delta)}")
+                    self._con.execute(
+                        f"INSERT INTO {DELTA_TABLE} BY NAME "
+                        f"SELECT 1 AS {SIGN_COLUMN}, * FROM ({_incoming_select(delta)})"
+                    )
+                finally:
+                    self._con.unregister("incoming_rows")
+            apply_cube_delta(self._con.execute, self.local_name, DELTA_TABLE, self.cubes)
+            self._con.execute(f"DROP TABLE {DELTA_TABLE}")
+            self._con.execute("COMMIT")
+        except Exception:
+            self._con.execute("ROLLBACK")
+            raise
+        self._update_watermark()
+
+    def _fetch_checksum(self, fetch):
+        """Checksum of the source rows before the watermark, or None without ``checksum_sql``"""
+        if self.checksum_sql is None:
+            return None
+        df = fetch(self.checksum_sql.format(table=self.table_name, watermark=self.watermark))
+        return str(df.iloc[0, 0])
+
+    def _checksum_path(self):
+        return f"{self.snapshot_path}.checksum"
+
+    def _write_checksum(self):
+        with open(self._checksum_path(), "w") as f:
+            f.write("" if self._history_checksum is None else f"{self.watermark} {self._history_checksum}")
+
+    def _load_parquet(self):
+        try:
+            self._con.execute(
+                f"CREATE OR REPLACE TABLE {self.local_name} AS SELECT * FROM read_parquet('{self.snapshot_path}')"
+            )
+        except duckdb.Error:
+            return
+        self._build_cubes()
+        self._update_watermark()
+        # The checksum saved with the snapshot, if it was taken at the same watermark
+        try:
+            with open(self._checksum_path()) as f:
+                watermark, _, checksum = f.read().partition(" ")
+        except OSError:
+            return
+        if watermark == self.watermark and checksum:
+            self._history_checksum = checksum
+
+    def _build_cubes(self):
+        for cube in self.cubes:
+            self._con.execute(cube.build_sql(self.local_name))
+
+    def _update_watermark(self):
+        latest = self._con.execute(f"SELECT MAX({WATERMARK_COLUMN}) FROM {self.local_name}").fetchone()[0]
+        self.watermark = pd.Timestamp(latest).strftime("%Y-%m-%d") if latest is not None else "1900-01-01"
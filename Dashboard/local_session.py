@@ -0,0 +1,315 @@
+"""Offline stand-in for the Snowpark session.
+
+:class:`LocalSession` loads a feedback CSV (``Dataset/Enriched_data.csv``
+by default) into an embedded database and answers ``session.sql(...)``
+with the same ``to_pandas`` / ``to_pandas_batches`` / ``collect`` calls
+the dashboard makes on Snowpark, so the page code runs unchanged without
+a warehouse -- for load tests and latency benchmarks on CI machines.
+
+Fully qualified names (``DB.SCHEMA.TABLE``) are reduced to the table name,
+and ``DB.INFORMATION_SCHEMA.TABLES`` is answered from a small ``TABLES``
+catalog the session keeps (row count and load, creation or last change
+time per table). ``write_pandas`` creates or appends to a table like Snowpark's.
+Temporary tables are created as ordinary tables, and statements run one
+at a time, without multi-statement transactions (``supports_transactions``).
+
+DuckDB, when installed, runs the dashboard's SQL as-is, including
+``GROUPING SETS``, ``MERGE`` and ``CREATE OR REPLACE``. The SQLite backend
+needs only the standard library; it registers ``YEAR``/``MONTH``/``DAY``,
+stores dates as ``YYYY-MM-DD`` text and rewrites ``CREATE OR REPLACE
+TABLE``, but has no ``GROUPING SETS`` or ``MERGE`` (see
+``supports_grouping_sets`` and ``supports_merge``).
+
+For the enrichment and reply jobs both backends also provide Snowflake's
+``SHA2`` (SHA-256 only) and ``WIDTH_BUCKET``, accept ``CURRENT_TIMESTAMP()``
+and the ``NUMBER`` and ``TIMESTAMP_NTZ`` column types, and treat ``BEGIN``,
+``COMMIT`` and ``ROLLBACK`` as no-ops.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+
+import pandas as pd
+
+from feedback_schema import CATEGORICAL_COLUMNS, INTEGER_COLUMNS, apply_schema
+
+try:
+    import duckdb
+except ImportError:  # the SQLite backend still works
+    duckdb = None
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Dataset", "Enriched_data.csv")
+DEFAULT_TABLE = "MODIFIED_DATA"
+CATALOG_TABLE = "TABLES"
+BATCH_ROWS = 100_000
+
+_QUALIFIED_NAME = re.compile(r"\b[A-Za-z_][A-Za-z0-9_$]*\.[A-Za-z_][A-Za-z0-9_$]*\.([A-Za-z_][A-Za-z0-9_$]*)\b")
+_CREATE_OR_REPLACE = re.compile(r"^\s*CREATE\s+OR\s+REPLACE\s+TABLE\s+([A-Za-z_][A-Za-z0-9_$]*)", re.IGNORECASE)
+_TEMPORARY = re.compile(r"^(\s*CREATE\s+(?:OR\s+REPLACE\s+)?)TEMP(?:ORARY)?\s+", re.IGNORECASE)
+_CURRENT_TIMESTAMP = re.compile(r"\bCURRENT_TIMESTAMP\s*\(\s*\)", re.IGNORECASE)
+_DDL = re.compile(r"^\s*(?:CREATE|ALTER)\b", re.IGNORECASE)
+_NUMBER_TYPE = re.compile(r"\bNUMBER\b(?:\s*\(\s*(\d+)\s*(?:,\s*(\d+)\s*)?\))?", re.IGNORECASE)
+_TIMESTAMP_NTZ = re.compile(r"\bTIMESTAMP_NTZ\b", re.IGNORECASE)
+_TRANSACTION_CONTROL = re.compile(r"^\s*(?:BEGIN|START\s+TRANSACTION|COMMIT|ROLLBACK)\b[\s\w]*;?\s*$", re.IGNORECASE)
+_CHANGED_TABLE = re.compile(
+    r"^\s*(?:MERGE\s+INTO|INSERT\s+INTO|UPDATE|DELETE\s+FROM|CREATE\s+(?:OR\s+REPLACE\s+)?TABLE"
+    r"(\s+IF\s+NOT\s+EXISTS)?)\s+([A-Za-z_][A-Za-z0-9_$]*)",
+    re.IGNORECASE,
+)
+
+
+def load_dataset(path=DEFAULT_DATASET):
+    """The dataset CSV with upper-case columns in the shared feedback schema"""
+    df = pd.read_csv(path, keep_default_na=False, na_values=[""])
+    df.columns = [str(c).upper() for c in df.columns]
+    return apply_schema(df)
+
+
+def _number_type(match):
+    precision, scale = match.group(1), match.group(2)
+    return f"DECIMAL({precision}, {scale})" if scale and int(scale) else "BIGINT"
+
+
+def local_sql(sql):
+    """``sql`` in the local dialect
+
+    Three-part names are reduced to the object name and
+    ``CURRENT_TIMESTAMP()`` loses its parentheses; in DDL, ``NUMBER`` becomes
+    ``BIGINT`` (``DECIMAL`` with a scale) and ``TIMESTAMP_NTZ`` ``TIMESTAMP``.
+    """
+    sql = _CURRENT_TIMESTAMP.sub("CURRENT_TIMESTAMP", _QUALIFIED_NAME.sub(r"\1", sql))
+    if _DDL.match(sql):
+        sql = _TIMESTAMP_NTZ.sub("TIMESTAMP", _NUMBER_TYPE.sub(_number_type, sql))
+    return sql
+
+
+def _sha2(value, bits=256):
+    return None if value is None else hashlib.sha256(str(value).encode("utf-8")).hexdigest()
+
+
+def _width_bucket(value, low, high, buckets):
+    # Edges rounded like labeling.width_bucket's, so 0.6 starts a bucket rather than ending one
+    if value is None:
+        return None
+    return sum(round(low + i * (high - low) / buckets, 12) <= value for i in range(buckets + 1))
+
+
+class _DuckDBBackend:
+    name = "duckdb"
+    supports_grouping_sets = True
+    supports_merge = True
+
+    def __init__(self):
+        self._con = duckdb.connect(database=":memory:")
+        self._con.execute("CREATE MACRO SHA2(value, bits) AS sha256(value)")
+        self._con.execute(
+            "CREATE MACRO WIDTH_BUCKET(value, low, high, buckets) AS CASE WHEN value IS NOT NULL THEN len(list_filter("
+            "list_transform(range(buckets + 1), i -> round(low + i * (high - low) / buckets, 12)), e -> e <= value)) END"
+        )
+
+    def load(self, table, df, append=False):
+        # Plain VARCHAR and BIGINT columns, so later rows with new values or larger IDs fit
+        casts = [f"CAST({c} AS VARCHAR) AS {c}" for c in CATEGORICAL_COLUMNS if c in df.columns]
+        casts += [f"CAST({c} AS BIGINT) AS {c}" for c in INTEGER_COLUMNS if c in df.columns]
+        select = "SELECT * REPLACE (" + ", ".join(casts) + ") FROM incoming_rows" if casts else "SELECT * FROM incoming_rows"
+        self._con.register("incoming_rows", df)
+        try:
+            if append:
+                self._con.execute(f"INSERT INTO {table} BY NAME {select}")
+            else:
+                self._con.execute(f"CREATE OR REPLACE TABLE {table} AS {select}")
+        finally:
+            self._con.unregister("incoming_rows")
+
+    def cursor(self, sql, params):
+        cursor = self._con.cursor()
+        cursor.execute(sql, list(params or []))
+        return cursor
+
+    def query(self, sql, params=None):
+        cursor = self.cursor(sql, params)
+        try:
+            return cursor.df() if cursor.description else pd.DataFrame()
+        finally:
+            cursor.close()
+
+    def batches(self, sql, params=None, batch_rows=BATCH_ROWS):
+        cursor = self.cursor(sql, params)
+        try:
+            if not cursor.description:
+                return
+            while True:
+                df = cursor.fetch_df_chunk(max(1, batch_rows // 2048))
+                if df.empty:
+                    break
+                yield df
+        finally:
+            cursor.close()
+
+
+def _date_part(start, stop):
+    # Dates are stored as YYYY-MM-DD text
+    def part(value):
+        return None if value is None else int(str(value)[start:stop])
+    return part
+
+
+class _SQLiteBackend:
+    name = "sqlite"
+    supports_grouping_sets = False
+    supports_merge = False
+
+    def __init__(self):
+        self._con = sqlite3.connect(":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        for name, start, stop in (("YEAR", 0, 4), ("MONTH", 5, 7), ("DAY", 8, 10)):
+            self._con.create_function(name, 1, _date_part(start, stop), deterministic=True)
+        self._con.create_function("SHA2", 2, _sha2, deterministic=True)
+        self._con.create_function("WIDTH_BUCKET", 4, _width_bucket, deterministic=True)
+
+    def load(self, table, df, append=False):
+        df = df.copy()
+        for col in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[col].dtype):
+                df[col] = df[col].dt.strftime("%Y-%m-%d")
+            elif isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype(object)
+        with self._lock:
+            df.to_sql(table, self._con, if_exists="append" if append else "replace", index=False)
+
+    @staticmethod
+    def _params(params):
+        # sqlite3's default date adapters are deprecated; dates compare as ISO text
+        return [v.isoformat()[:10] if isinstance(v, (date, datetime)) else v for v in params or []]
+
+    def query(self, sql, params=None):
+        with self._lock:
+            cursor = self._con.cursor()
+            try:
+                replaced = _CREATE_OR_REPLACE.match(sql)
+                if replaced:
+                    cursor.execute(f"DROP TABLE IF EXISTS {replaced.group(1)}")
+                    sql = _CREATE_OR_REPLACE.sub(r"CREATE TABLE \1", sql)
+                cursor.execute(sql, self._params(params))
+                if not cursor.description:
+                    self._con.commit()
+                    return pd.DataFrame()
+                columns = [d[0] for d in cursor.description]
+                return pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+            finally:
+                cursor.close()
+
+    def batches(self, sql, params=None, batch_rows=BATCH_ROWS):
+        df = self.query(sql, params)
+        for start in range(0, max(len(df), 1), batch_rows):
+            yield df.iloc[start:start + batch_rows].reset_index(drop=True)
+
+
+class LocalDataFrame:
+    """The lazily run result of :meth:`LocalSession.sql`"""
+
+    def __init__(self, session, sql, params=None):
+        self.session = session
+        self.sql = sql
+        self.params = params
+
+    def to_pandas(self):
+        return self.session.run(self.sql, self.params)
+
+    def to_pandas_batches(self):
+        yield from self.session.run_batches(self.sql, self.params)
+
+    def collect(self):
+        return list(self.to_pandas().itertuples(index=False, name="Row"))
+
+
+class LocalSession:
+    """Snowpark-compatible ``sql()`` over an embedded DuckDB or SQLite database
+
+    ``backend`` is ``"duckdb"``, ``"sqlite"`` or None for DuckDB when it is
+    installed. The dataset at ``dataset_path`` is loaded as ``table_name``.
+    """
+
+    # BEGIN/COMMIT/ROLLBACK are accepted but each statement commits on its own
+    supports_transactions = False
+
+    def __init__(self, dataset_path=DEFAULT_DATASET, table_name=DEFAULT_TABLE, backend=None, schema="PUBLIC"):
+        backend = backend or ("duckdb" if duckdb is not None else "sqlite")
+        if backend == "duckdb":
+            if duckdb is None:
+                raise ImportError("duckdb is required for the duckdb local session backend")
+            self.backend = _DuckDBBackend()
+        elif backend == "sqlite":
+            self.backend = _SQLiteBackend()
+        else:
+            raise ValueError(f"Unknown local session backend: {backend}")
+        self.schema = schema
+        self.backend.query(
+            f"CREATE TABLE {CATALOG_TABLE} (TABLE_SCHEMA VARCHAR, TABLE_NAME VARCHAR, "
+            f"ROW_COUNT BIGINT, LAST_ALTERED VARCHAR)"
+        )
+        if dataset_path:
+            self.load_table(table_name, load_dataset(dataset_path))
+
+    @property
+    def supports_grouping_sets(self):
+        return self.backend.supports_grouping_sets
+
+    @property
+    def supports_merge(self):
+        return self.backend.supports_merge
+
+    def load_table(self, table_name, df):
+        """(Re)load ``df`` as ``table_name`` and record it in the catalog"""
+        self.backend.load(table_name, df)
+        self._record_change(table_name)
+
+    def write_pandas(self, df, table_name, auto_create_table=False, overwrite=False, table_type="", **kwargs):
+        """Snowpark's ``write_pandas``: replace (``overwrite``), create or append to ``table_name``
+
+        ``table_type`` and Snowpark-only options are accepted and ignored.
+        """
+        exists = self._catalogued(table_name)
+        if not exists and not auto_create_table:
+            raise ValueError(f"Table {table_name} does not exist")
+        self.backend.load(table_name, df, append=exists and not overwrite)
+        self._record_change(table_name)
+        return self.sql(f"SELECT * FROM {table_name}")
+
+    def _catalogued(self, table_name):
+        return not self.backend.query(
+            f"SELECT TABLE_NAME FROM {CATALOG_TABLE} WHERE TABLE_NAME = ?", [table_name]
+        ).empty
+
+    def _record_change(self, table_name):
+        rows = int(self.backend.query(f"SELECT COUNT(*) AS N FROM {table_name}").iloc[0, 0])
+        self.backend.query(f"DELETE FROM {CATALOG_TABLE} WHERE TABLE_NAME = ?", [table_name])
+        self.backend.query(
+            f"INSERT INTO {CATALOG_TABLE} VALUES (?, ?, ?, ?)",
+            [self.schema, table_name, rows, datetime.now().isoformat(timespec="microseconds")],
+        )
+
+    def sql(self, query, params=None):
+        return LocalDataFrame(self, query, params)
+
+    def run(self, query, params=None):
+        if _TRANSACTION_CONTROL.match(query):
+            return pd.DataFrame()
+        query = _TEMPORARY.sub(r"\1", local_sql(query))
+        df = self.backend.query(query, params)
+        df.columns = [str(c).upper() for c in df.columns]
+        changed = _CHANGED_TABLE.match(query)
+        if changed and changed.group(2).upper() != CATALOG_TABLE:
+            # CREATE TABLE IF NOT EXISTS leaves an existing table as it was
+            if not (changed.group(1) and self._catalogued(changed.group(2))):
+                self._record_change(changed.group(2))
+        return df
+
+    def run_batches(self, query, params=None):
+        for df in self.backend.batches(local_sql(query), params):
+            df.columns = [str(c).upper() for c in df.columns]
+            yield df
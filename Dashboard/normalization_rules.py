@@ -0,0 +1,127 @@
+"""Declarative null/sentinel normalization for the feedback ETL.
+
+The notebook normalizes placeholders with a chain of whole-frame
+``replace``/``fillna`` calls, each copying the frame. Here the chain is a
+table of :class:`Rule` rows, applied in order exactly like the calls they
+stand for. :class:`RuleSet` composes the rules that touch a column into a
+single ``{value: final value}`` mapping (plus the final value for a
+missing cell) and applies it once over the column's categorical codes:
+each distinct value is looked up once and the cells are gathered by code
+(categorical columns just get their categories mapped). Columns that
+contain none of the mapped values are passed through without a copy.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+class _Missing:
+    def __repr__(self):
+        return "MISSING"
+
+
+MISSING = _Missing()  # a null cell, on either side of a rule
+
+
+def _is_missing(value):
+    return value is MISSING or (not isinstance(value, str) and pd.isna(value))
+
+
+@dataclass(frozen=True)
+class Rule:
+    """Replace any of ``values`` with ``target`` in ``columns`` (every column when empty)"""
+
+    values: tuple
+    target: object
+    columns: tuple = ()
+
+    def applies_to(self, column):
+        return not self.columns or column in self.columns
+
+    def matches(self, value):
+        if _is_missing(value):
+            return any(v is MISSING for v in self.values)
+        return value in self.values
+
+
+# FEEDBACK_ETL.ipynb, in notebook order
+FEEDBACK_RULES = (
+    Rule(("N/A",), MISSING),
+    Rule((MISSING,), "Not Specified", ("COMORBIDITIES",)),
+    Rule(("None",), "Not Specified"),
+    Rule((MISSING,), "Not Specified"),
+    Rule(("None Reported",), "Not Specified"),
+    Rule(("Not Specified",), "Unknown Doctor", ("DOCTOR_NAME",)),
+    Rule(("Not Specified",), MISSING, ("ADHERENCE",)),
+    Rule((MISSING,), "Unknown", ("ADHERENCE",)),
+    Rule(("Not Specified",), "None Reported", ("SIDE_EFFECTS_REPORTED",)),
+    Rule(("Not Specified",), "Unspecified"),
+)
+
+
+class RuleSet:
+    """Ordered rules compiled into one value mapping per column"""
+
+    def __init__(self, rules=FEEDBACK_RULES):
+        self.rules = tuple(rules)
+        self._compiled = {}
+
+    def final_value(self, value, column):
+        """Where ``value`` in ``column`` ends up after every rule in order"""
+        for rule in self.rules:
+            if rule.applies_to(column) and rule.matches(value):
+                value = rule.target
+        return value
+
+    def mapping(self, column):
+        """``(mapping, missing)``: final value of every rule-matched value, and of a missing cell"""
+        if column not in self._compiled:
+            keys = {
+                v for rule in self.rules if rule.applies_to(column)
+                for v in rule.values if v is not MISSING
+            }
+            mapping = {}
+            for key in keys:
+                final = self.final_value(key, column)
+                if final is not key:
+                    mapping[key] = final
+            self._compiled[column] = (mapping, self.final_value(MISSING, column))
+        return self._compiled[column]
+
+    def apply_column(self, series):
+        mapping, missing = self.mapping(series.name)
+        missing = np.nan if missing is MISSING else missing
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return self._apply_categorical(series, mapping, missing)
+        nulls = series.isna().to_numpy()
+        textual = series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+        hits = textual and bool(mapping) and series.isin(list(mapping)).any()
+        if not nulls.any() and not hits:
+            return series
+        # Look up each distinct value once, then gather by code; code -1 (missing) picks the last entry
+        codes, uniques = pd.factorize(series)
+        lookup = [mapping.get(u, u) if isinstance(u, str) else u for u in uniques] + [missing]
+        if textual and series.dtype != object:
+            values = pd.array(lookup, dtype=series.dtype).take(codes)
+        else:
+            values = np.asarray(lookup, dtype=object)[codes]
+        return pd.Series(values, index=series.index, name=series.name, dtype=values.dtype)
+
+    def _apply_categorical(self, series, mapping, missing):
+        # Map the categories, then re-point each code at its mapped category
+        categories = list(series.cat.categories)
+        targets = [mapping.get(c, c) for c in categories]
+        if missing is not np.nan and series.isna().any():
+            targets.append(missing)
+        else:
+            targets.append(np.nan)
+        new_categories = pd.Index(pd.unique(pd.Series([t for t in targets if not _is_missing(t)], dtype=object)))
+        lookup = np.array([new_categories.get_loc(t) if not _is_missing(t) else -1 for t in targets])
+        codes = lookup[series.cat.codes.to_numpy()]  # code -1 (missing) picks the last entry
+        return pd.Series(pd.Categorical.from_codes(codes, new_categories), index=series.index, name=series.name)
+
+    def apply(self, df):
+        """New frame with every column normalized; untouched columns are shared, not copied"""
+        return pd.DataFrame({col: self.apply_column(df[col]) for col in df.columns}, index=df.index)
@@ -0,0 +1,292 @@
+"""Query plans for each dashboard page.
+
+Every function returns a :class:`query_planner.PagePlan` whose members are
+named after the DataFrames the page renders, so the same plans can be run
+by the Streamlit app and by offline tooling. Page filters arrive as a
+:class:`query_filters.FeedbackFilter` and are bound as parameters.
+"""
+
+from query_filters import FeedbackFilter, date_range
+from query_planner import (
+    ADVERSE_LABELS,
+    SUCCESS_LABELS,
+    Aggregation,
+    PagePlan,
+    avg,
+    count,
+    count_distinct,
+    count_if,
+    labels_in,
+    maximum,
+    minimum,
+    pct_if,
+    sql_list,
+)
+
+DISCONTINUED_ACTIONS = ("Switched medication", "Consider alternative treatment")
+
+# Row-level reports page on (FEEDBACK_DATE, ID); grouped ones carry an ORDER BY
+REPORT_TYPES = (
+    "Complete Feedback Report",
+    "Drug Performance Report",
+    "Safety & Adverse Events Report",
+    "Patient Demographics Report",
+)
+
+
+def executive_plan(table, filters, start_date, end_date):
+    where, params = filters.where()
+    in_range, range_params = date_range(start_date, end_date)
+    return PagePlan("executive", table, where, params=params, aggregations=[
+        Aggregation("kpis", measures={
+            "TOTAL_FEEDBACK": count_distinct("ID"),
+            "UNIQUE_PATIENTS": count_distinct("PATIENT_NAME"),
+            "DRUGS_ANALYZED": count_distinct("DRUG_NAME"),
+            "AVG_SENTIMENT": avg("SENTIMENT_CAT", 2),
+            "SUCCESS_COUNT": count_if(labels_in(SUCCESS_LABELS)),
+            "ADVERSE_COUNT": count_if(labels_in(ADVERSE_LABELS)),
+            "TOTAL_CASES": count(),
+            "AVG_AGE": avg("AGE_AT_FEEDBACK", 1),
+        }),
+        Aggregation("trend", group_by=("YEAR",),
+                    measures={"AVG_SENTIMENT": avg("SENTIMENT_CAT"), "FEEDBACK_COUNT": count()},
+                    predicate=in_range, predicate_params=range_params,
+                    order_by=(("YEAR", True),)),
+        Aggregation("source", group_by=("FEEDBACK_SOURCE",),
+                    measures={"FEEDBACK_COUNT": count()},
+                    not_null=("FEEDBACK_SOURCE",),
+                    order_by=(("FEEDBACK_COUNT", False),)),
+        Aggregation("therapy", group_by=("THERAPAUTIC_AREA",),
+                    measures={
+                        "TOTAL_FEEDBACK": count(),
+                        "AVG_SENTIMENT": avg("SENTIMENT_CAT", 2),
+                        "SUCCESS_RATE": pct_if(labels_in(SUCCESS_LABELS), 1),
+                    },
+                    not_null=("THERAPAUTIC_AREA",),
+                    order_by=(("SUCCESS_RATE", False),)),
+    ])
+
+
+def drug_performance_plan(table, drug, start_date, end_date):
+    where, params = FeedbackFilter.of(drugs=[drug]).where()
+    in_range, range_params = date_range(start_date, end_date)
+    return PagePlan("drug_performance", table, where, params=params, aggregations=[
+        Aggregation("drug_info", group_by=("THERAPAUTIC_AREA", "INDICATION"),
+                    measures={"COUNTRIES_USED": count_distinct("COUNTRY")},
+                    limit=1),
+        Aggregation("metrics", predicate=in_range, predicate_params=range_params, measures={
+            "TOTAL_FEEDBACK": count(),
+            "AVG_SENTIMENT": avg("SENTIMENT_CAT", 2),
+            "AVG_AGE": avg("AGE_AT_FEEDBACK", 1),
+            "COUNTRIES": count_distinct("COUNTRY"),
+            "THERAPEUTIC_AREA": maximum("THERAPAUTIC_AREA"),
+            "CURED_PATIENTS": count_if("LABELS = 'Cured'"),
+            "DISCONTINUED_PATIENTS": count_if(f"FOLLOW_UP_ACTIONS IN ({sql_list(DISCONTINUED_ACTIONS)})"),
+        }),
+        Aggregation("outcomes", group_by=("LABELS",), predicate=in_range, predicate_params=range_params,
+                    measures={"COUNT": count()},
+                    not_null=("LABELS",),
+                    order_by=(("COUNT", False),)),
+        Aggregation("yearly", group_by=("YEAR",), predicate=in_range, predicate_params=range_params,
+                    measures={"FEEDBACK_COUNT": count()},
+                    order_by=(("YEAR", True),)),
+        Aggregation("geo", group_by=("COUNTRY",), predicate=in_range, predicate_params=range_params,
+                    measures={"FEEDBACK_COUNT": count()},
+                    order_by=(("FEEDBACK_COUNT", False),),
+                    limit=10),
+    ])
+
+
+def geographic_plan(table, filters):
+    where, params = filters.where()
+    return PagePlan("geographic", table, where, params=params, aggregations=[
+        Aggregation("country_feedback", group_by=("COUNTRY",),
+                    measures={"FEEDBACK_COUNT": count()},
+                    order_by=(("FEEDBACK_COUNT", False),),
+                    limit=15),
+        Aggregation("country_sentiment", group_by=("COUNTRY",),
+                    measures={"AVG_SENTIMENT": avg("SENTIMENT_CAT", 2), "FEEDBACK_COUNT": count()},
+                    having=("FEEDBACK_COUNT", 5),
+                    order_by=(("AVG_SENTIMENT", False),),
+                    limit=15),
+        Aggregation("language", group_by=("LANGUAGE",),
+                    measures={"FEEDBACK_COUNT": count()},
+                    not_null=("LANGUAGE",),
+                    order_by=(("FEEDBACK_COUNT", False),),
+                    limit=10),
+        Aggregation("duration", group_by=("COUNTRY",),
+                    measures={"AVG_DURATION": avg("TREATMENT_DURATION_DAYS", 0), "PATIENT_COUNT": count()},
+                    predicate="TREATMENT_DURATION_DAYS IS NOT NULL",
+                    having=("PATIENT_COUNT", 10),
+                    order_by=(("AVG_DURATION", False),),
+                    limit=15),
+        Aggregation("regional_adherence", group_by=("REGION", "ADHERENCE"),
+                    measures={"PATIENT_COUNT": count(), "AVG_SENTIMENT": avg("SENTIMENT_CAT", 2)},
+                    not_null=("REGION", "ADHERENCE"),
+                    order_by=(("REGION", True), ("ADHERENCE", True))),
+        Aggregation("region", group_by=("REGION",),
+                    measures={
+                        "FEEDBACK_COUNT": count(),
+                        "AVG_SENTIMENT": avg("SENTIMENT_CAT", 2),
+                        "COUNTRIES": count_distinct("COUNTRY"),
+                    },
+                    order_by=(("FEEDBACK_COUNT", False),)),
+    ])
+
+
+def segmentation_plan(table, filters):
+    where, params = filters.where()
+    return PagePlan("segmentation", table, where, params=params, aggregations=[
+        Aggregation("language_feedback", group_by=("LANGUAGE",),
+                    measures={"FEEDBACK_COUNT": count(), "AVG_SENTIMENT": avg("SENTIMENT_CAT", 2)},
+                    not_null=("LANGUAGE",),
+                    order_by=(("FEEDBACK_COUNT", False),),
+                    limit=15),
+        Aggregation("gender_age", group_by=("GENDER",),
+                    measures={
+                        "MIN_AGE": minimum("AGE_AT_FEEDBACK"),
+                        "MAX_AGE": maximum("AGE_AT_FEEDBACK"),
+                        "AVG_AGE": avg("AGE_AT_FEEDBACK", 1),
+                        "FEEDBACK_COUNT": count(),
+                    },
+                    predicate="AGE_AT_FEEDBACK IS NOT NULL",
+                    not_null=("GENDER",),
+                    order_by=(("FEEDBACK_COUNT", False),)),
+        Aggregation("adherence", group_by=("ADHERENCE",),
+                    measures={"FEEDBACK_COUNT": count(), "AVG_SENTIMENT": avg("SENTIMENT_CAT", 2)},
+                    not_null=("ADHERENCE",),
+                    order_by=(("FEEDBACK_COUNT", False),)),
+        Aggregation("adherence_labels", group_by=("ADHERENCE", "LABELS"),
+                    measures={"COUNT": count()},
+                    not_null=("ADHERENCE", "LABELS"),
+                    order_by=(("ADHERENCE", True), ("LABELS", True))),
+        Aggregation("word_labels", group_by=("FEEDBACK_WORD_COUNT", "LABELS", "SENTIMENT_CAT"),
+                    measures={"FREQUENCY": count()},
+                    predicate="FEEDBACK_WORD_COUNT > 0",
+                    not_null=("FEEDBACK_WORD_COUNT", "LABELS"),
+                    order_by=(("FEEDBACK_WORD_COUNT", True),)),
+        Aggregation("comorbid_risk", group_by=("COMORBIDITIES",),
+                    measures={
+                        "PATIENT_COUNT": count(),
+                        "AVG_SENTIMENT": avg("SENTIMENT_CAT", 2),
+                        "ADVERSE_COUNT": count_if(labels_in(ADVERSE_LABELS)),
+                        "RISK_PERCENTAGE": pct_if(labels_in(ADVERSE_LABELS), 1),
+                    },
+                    predicate="COMORBIDITIES != 'Unspecified'",
+                    not_null=("COMORBIDITIES",),
+                    having=("PATIENT_COUNT", 10),
+                    order_by=(("RISK_PERCENTAGE", False),),
+                    limit=10),
+    ])
+
+
+def safety_plan(table, filters):
+    where, params = filters.where()
+    return PagePlan("safety", table, where, params=params, aggregations=[
+        Aggregation("safety", group_by=("DRUG_NAME",),
+                    measures={
+                        "ADVERSE_COUNT": count_if(labels_in(ADVERSE_LABELS)),
+                        "TOTAL_FEEDBACK": count(),
+                        "ADVERSE_RATE": pct_if(labels_in(ADVERSE_LABELS), 2),
+                    },
+                    having=("TOTAL_FEEDBACK", 10),
+                    order_by=(("ADVERSE_RATE", False),),
+                    limit=20),
+        Aggregation("side_effects", group_by=("SIDE_EFFECTS_REPORTED",),
+                    measures={
+                        "CASE_COUNT": count(),
+                        "AVG_SENTIMENT": avg("SENTIMENT_CAT", 2),
+                        "DRUGS_INVOLVED": count_distinct("DRUG_NAME"),
+                    },
+                    predicate="SIDE_EFFECTS_REPORTED != 'Unspecified'",
+                    not_null=("SIDE_EFFECTS_REPORTED",),
+                    having=("CASE_COUNT", 5),
+                    order_by=(("CASE_COUNT", False),),
+                    limit=15),
+    ])
+
+
+def report_query(report_type, table, where):
+    """``(sql, order_by)`` of a Reports page report; ``order_by`` is empty for row-level reports"""
+    if report_type == "Complete Feedback Report":
+        return f"""
+            SELECT 
+                ID, PATIENT_NAME, DRUG_NAME, COUNTRY, REGION,
+                AGE_AT_FEEDBACK, GENDER, SENTIMENT_CAT, LABELS,
+                FEEDBACK_DATE, TREATMENT_DURATION_DAYS, ADHERENCE,
+                SIDE_EFFECTS_REPORTED, COMORBIDITIES, THERAPAUTIC_AREA
+            FROM {table}
+            {where}
+            """, ""
+    if report_type == "Drug Performance Report":
+        return f"""
+            SELECT 
+                DRUG_NAME,
+                THERAPAUTIC_AREA,
+                COUNT(DISTINCT PATIENT_NAME) AS unique_patients,
+                COUNT(*) AS total_feedback,
+                ROUND(AVG(SENTIMENT_CAT), 2) AS avg_sentiment,
+                ROUND(AVG(AGE_AT_FEEDBACK), 1) AS avg_patient_age,
+                ROUND(AVG(TREATMENT_DURATION_DAYS), 0) AS avg_treatment_days,
+                SUM(CASE WHEN LABELS = 'Cured' THEN 1 ELSE 0 END) AS cured_count,
+                SUM(CASE WHEN LABELS = 'Improvement' THEN 1 ELSE 0 END) AS improved_count,
+                SUM(CASE WHEN LABELS = 'No Progress' THEN 1 ELSE 0 END) AS no_progress_count,
+                SUM(CASE WHEN LABELS IN ('Adverse', 'Worsen') THEN 1 ELSE 0 END) AS adverse_count,
+                ROUND(SUM(CASE WHEN LABELS IN ('Cured', 'Improvement') THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 1) AS success_rate,
+                COUNT(DISTINCT COUNTRY) AS countries_served
+            FROM {table}
+            {where}
+            GROUP BY DRUG_NAME, THERAPAUTIC_AREA
+            """, "ORDER BY total_feedback DESC, DRUG_NAME, THERAPAUTIC_AREA"
+    if report_type == "Safety & Adverse Events Report":
+        return f"""
+            SELECT 
+                ID,
+                DRUG_NAME,
+                PATIENT_NAME,
+                AGE_AT_FEEDBACK,
+                GENDER,
+                COUNTRY,
+                SIDE_EFFECTS_REPORTED,
+                FEEDBACK_DATE,
+                SENTIMENT_CAT,
+                LABELS,
+                COMORBIDITIES,
+                TREATMENT_DURATION_DAYS
+            FROM {table}
+            {where}
+            AND LABELS IN ('Adverse', 'Worsen')
+            """, ""
+    if report_type == "Patient Demographics Report":
+        return f"""
+            SELECT 
+                CASE 
+                    WHEN AGE_AT_FEEDBACK < 30 THEN '18-29'
+                    WHEN AGE_AT_FEEDBACK < 50 THEN '30-49'
+                    WHEN AGE_AT_FEEDBACK < 65 THEN '50-64'
+                    ELSE '65+'
+                END AS age_group,
+                GENDER,
+                COUNTRY,
+                REGION,
+                COUNT(*) AS patient_count,
+                ROUND(AVG(SENTIMENT_CAT), 2) AS avg_sentiment,
+                SUM(CASE WHEN LABELS IN ('Cured', 'Improvement') THEN 1 ELSE 0 END) AS success_count,
+                ROUND(AVG(TREATMENT_DURATION_DAYS), 0) AS avg_treatment_days
+            FROM {table}
+            {where}
+            GROUP BY age_group, GENDER, COUNTRY, REGION
+            """, "ORDER BY patient_count DESC, age_group, GENDER, COUNTRY, REGION"
+    raise ValueError(f"Unknown report type: {report_type}")
+
+
+def report_summary_sql(sql, columns):
+    """Totals for the report footer, computed in the query instead of on a full frame"""
+    measures = ["COUNT(*) AS TOTAL_RECORDS"]
+    if 'DRUG_NAME' in columns:
+        measures.append("COUNT(DISTINCT DRUG_NAME) AS UNIQUE_DRUGS")
+    if 'COUNTRY' in columns:
+        measures.append("COUNT(DISTINCT COUNTRY) AS COUNTRIES")
+    if 'SENTIMENT_CAT' in columns:
+        measures.append("AVG(SENTIMENT_CAT) AS AVG_SENTIMENT")
+    return f"SELECT {', '.join(measures)} FROM ({sql}) AS report"
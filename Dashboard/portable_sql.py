@@ -0,0 +1,30 @@
+"""SQL shared by the warehouse jobs that Snowflake and both local backends accept.
+
+Snowflake lets one ``ALTER TABLE ... ADD COLUMN IF NOT EXISTS`` add several
+columns and names the columns of an inline ``(VALUES ...) AS v (...)``
+table; DuckDB and SQLite take neither. The helpers here spell both out in
+forms all three run, so the enrichment and reply jobs work offline on
+:class:`local_session.LocalSession` too.
+"""
+
+
+def table_columns(execute, table):
+    """Upper-cased column names of ``table``"""
+    df = execute(f"SELECT * FROM {table} LIMIT 0")
+    return {str(c).upper() for c in df.columns}
+
+
+def add_missing_columns(execute, table, columns):
+    """Add each of ``columns`` (``{name: type}``) that ``table`` lacks, one ALTER TABLE per column"""
+    existing = table_columns(execute, table)
+    for name, sql_type in columns.items():
+        if name.upper() not in existing:
+            execute(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}")
+
+
+def rows_sql(columns, rows):
+    """``(sql, params)`` of a SELECT returning ``rows`` as ``columns``; the values travel as bind parameters"""
+    row = "(" + ", ".join("?" for _ in columns) + ")"
+    names = ", ".join(columns)
+    sql = f"WITH v ({names}) AS (VALUES {', '.join(row for _ in rows)}) SELECT {names} FROM v"
+    return sql, [value for values in rows for value in values]
@@ -0,0 +1,130 @@
+"""Shared query-result cache for the Patient Pulse dashboard.
+
+Results are keyed on the normalized SQL text plus the filter tuple the
+page used to build it, expire after a TTL and are evicted least-recently-used
+once the cache grows past its memory budget.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """Collapse whitespace so formatting differences share one cache entry"""
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def frame_nbytes(df):
+    """Approximate in-memory size of a result DataFrame"""
+    try:
+        return int(df.memory_usage(index=True, deep=True).sum())
+    except AttributeError:
+        return 0
+
+
+class _Entry:
+    __slots__ = ("value", "nbytes", "expires_at", "tables")
+
+    def __init__(self, value, nbytes, expires_at, tables):
+        self.value = value
+        self.nbytes = nbytes
+        self.expires_at = expires_at
+        self.tables = tables
+
+
+class QueryCache:
+    """Thread-safe LRU cache of query results with TTL and table invalidation"""
+
+    def __init__(self, ttl_seconds=600, max_bytes=256 * 1024 * 1024, max_entries=2048):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._table_versions = {}
+        self._nbytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(sql, filters=()):
+        return (normalize_sql(sql), tuple(filters))
+
+    def get(self, sql, filters=()):
+        key = self.make_key(sql, filters)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def put(self, sql, filters, value, tables=()):
+        key = self.make_key(sql, filters)
+        nbytes = frame_nbytes(value)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(value, nbytes, time.monotonic() + self.ttl_seconds, frozenset(tables))
+            self._nbytes += nbytes
+            self._evict()
+
+    def get_or_load(self, sql, filters, loader, tables=()):
+        """Return a copy of the cached result, running ``loader`` on a miss"""
+        value = self.get(sql, filters)
+        if value is None:
+            self.misses += 1
+            value = loader()
+            self.put(sql, filters, value, tables)
+        else:
+            self.hits += 1
+        return value.copy()
+
+    def invalidate(self, table=None):
+        """Drop every entry, or only the entries that read ``table``"""
+        with self._lock:
+            if table is None:
+                self._entries.clear()
+                self._nbytes = 0
+                return
+            for key in [k for k, e in self._entries.items() if table in e.tables]:
+                self._drop(key)
+
+    def sync_table_version(self, table, version):
+        """Invalidate ``table`` when its version token differs from the last one seen"""
+        with self._lock:
+            previous = self._table_versions.get(table)
+            self._table_versions[table] = version
+            if previous is not None and previous != version:
+                self.invalidate(table)
+                return True
+        return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._nbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._nbytes -= entry.nbytes
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if e.expires_at <= now]:
+            self._drop(key)
+        while self._entries and (self._nbytes > self.max_bytes or len(self._entries) > self.max_entries):
+            self._drop(next(iter(self._entries)))
@@ -0,0 +1,87 @@
+"""Concurrent execution of a page's independent queries.
+
+Queries are submitted together to a bounded thread pool, so a page waits
+for its slowest query instead of the sum of all of them. Results are
+handed back in completion order so each chart can render as soon as its
+data arrives. Snowpark queries run as async jobs and are cancelled
+server-side when they exceed their timeout.
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+POLL_INTERVAL_SECONDS = 0.05
+
+
+class QueryTimeout(Exception):
+    """Raised when a query runs past its timeout and is cancelled"""
+
+
+def fetch_pandas(session, sql, timeout=None, cancel_event=None, params=None):
+    """Run ``sql`` on ``session`` and return a DataFrame
+
+    Sessions exposing Snowpark's ``collect_nowait`` run the statement as an
+    async job that is cancelled on timeout or when ``cancel_event`` is set;
+    other sessions run it synchronously.
+    """
+    frame = session.sql(sql, params=params) if params else session.sql(sql)
+    if not hasattr(frame, "collect_nowait"):
+        return frame.to_pandas()
+    job = frame.collect_nowait()
+    deadline = time.monotonic() + timeout if timeout else None
+    while not job.is_done():
+        if cancel_event is not None and cancel_event.is_set():
+            job.cancel()
+            raise QueryTimeout("Query cancelled")
+        if deadline is not None and time.monotonic() > deadline:
+            job.cancel()
+            raise QueryTimeout(f"Query exceeded {timeout}s and was cancelled")
+        time.sleep(POLL_INTERVAL_SECONDS)
+    return job.result("pandas")
+
+
+class QueryExecutor:
+    """Bounded thread pool that runs named query tasks concurrently"""
+
+    def __init__(self, max_workers=6, timeout_seconds=60):
+        self.max_workers = max_workers
+        self.timeout_seconds = timeout_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="page-query")
+        self.cancel_event = threading.Event()
+
+    def iter_completed(self, tasks, timeout=None):
+        """Run ``{name: callable}`` concurrently, yielding ``(name, result)``
+
+        ``result`` is the callable's return value, or the exception it
+        raised. Tasks still unfinished after ``timeout`` seconds (the
+        executor default if not given) are cancelled and reported as
+        :class:`QueryTimeout`.
+        """
+        timeout = self.timeout_seconds if timeout is None else timeout
+        futures = {self._pool.submit(fn): name for name, fn in tasks.items()}
+        deadline = time.monotonic() + timeout
+        pending = set(futures)
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                yield futures[future], error if error is not None else future.result()
+        for future in pending:
+            future.cancel()
+            yield futures[future], QueryTimeout(f"Query exceeded {timeout}s")
+
+    def submit(self, fn):
+        """Run ``fn`` in the background without waiting, e.g. to warm a cache"""
+        return self._pool.submit(fn)
+
+    def run_all(self, tasks, timeout=None):
+        """Like :meth:`iter_completed` but returns a ``{name: result}`` dict"""
+        return dict(self.iter_completed(tasks, timeout))
+
+    def shutdown(self):
+        self.cancel_event.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,75 @@
+"""Typed dashboard filters rendered as bind-parameter SQL.
+
+Filter values never appear in the statement text: conditions carry ``?``
+placeholders and the values travel as bind parameters, sorted and
+de-duplicated. The same logical selection therefore always produces the
+same statement, which keeps the warehouse result cache and compiled-plan
+cache warm, and quotes in drug or country names cannot break the SQL.
+"""
+
+from dataclasses import dataclass
+
+import pandas as pd
+
+DATE_COLUMN = "FEEDBACK_DATE"
+
+
+def _canonical(values):
+    return tuple(sorted({str(v) for v in values or () if v is not None}))
+
+
+def _as_date(value):
+    return pd.Timestamp(value).date() if value is not None and value != "" else None
+
+
+def placeholders(values):
+    return ", ".join("?" for _ in values)
+
+
+def date_range(start_date, end_date):
+    """``(sql, params)`` for an inclusive FEEDBACK_DATE range"""
+    return f"{DATE_COLUMN} BETWEEN ? AND ?", (_as_date(start_date), _as_date(end_date))
+
+
+@dataclass(frozen=True)
+class FeedbackFilter:
+    """The sidebar and page filters applied to the feedback table
+
+    Build instances with :meth:`of`, which normalizes the values so equal
+    selections compare, hash and render identically.
+    """
+
+    start_date: object = None
+    end_date: object = None
+    drugs: tuple = ()
+    regions: tuple = ()
+    countries: tuple = ()
+
+    @classmethod
+    def of(cls, start_date=None, end_date=None, drugs=None, regions=None, countries=None):
+        return cls(
+            start_date=_as_date(start_date),
+            end_date=_as_date(end_date),
+            drugs=_canonical(drugs),
+            regions=_canonical(regions),
+            countries=_canonical(countries),
+        )
+
+    def conditions(self):
+        """``[(sql, params)]`` for every active filter, in a fixed order"""
+        conditions = []
+        if self.start_date and self.end_date:
+            conditions.append(date_range(self.start_date, self.end_date))
+        for column, values in (("DRUG_NAME", self.drugs), ("REGION", self.regions), ("COUNTRY", self.countries)):
+            if values:
+                conditions.append((f"{column} IN ({placeholders(values)})", values))
+        return conditions
+
+    def where(self):
+        """``(sql, params)`` for the WHERE clause, always starting ``WHERE 1=1``"""
+        sql = ["1=1"]
+        params = []
+        for condition, values in self.conditions():
+            sql.append(condition)
+            params.extend(values)
+        return "WHERE " + " AND ".join(sql), tuple(params)
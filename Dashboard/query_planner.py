@@ -0,0 +1,369 @@
+"""Page-level query planner for the Patient Pulse dashboard.
+
+A page describes each chart's aggregation as an :class:`Aggregation`
+(group-by columns, measures, an optional row predicate and the
+HAVING/ORDER BY/LIMIT it needs). :class:`PagePlan` merges all of a page's
+aggregations into one ``GROUP BY GROUPING SETS`` statement over a single
+scan, using conditional aggregates for members with their own row
+predicate, and splits the result back into one DataFrame per chart.
+
+Filter values are passed as ``?`` bind parameters (see
+:mod:`query_filters`) so the statement text only changes when the shape of
+the page's filters does.
+"""
+
+from dataclasses import dataclass, field
+from functools import partial
+
+import pandas as pd
+
+ADVERSE_LABELS = ("Adverse", "Worsen")
+SUCCESS_LABELS = ("Cured", "Improvement")
+
+# Derived dimensions available to every aggregation
+DIMENSION_EXPRESSIONS = {
+    "YEAR": "YEAR(FEEDBACK_DATE)",
+}
+
+_COUNT_FUNCS = ("COUNT", "COUNT_DISTINCT", "COUNT_IF")
+
+
+def sql_list(values):
+    return ", ".join("'" + str(v).replace("'", "''") + "'" for v in values)
+
+
+def labels_in(labels):
+    return f"LABELS IN ({sql_list(labels)})"
+
+
+@dataclass(frozen=True)
+class Measure:
+    """One aggregate column
+
+    ``func`` is COUNT, COUNT_DISTINCT, AVG, MIN, MAX, COUNT_IF (rows
+    matching the ``column`` condition) or PCT_IF (percentage of rows
+    matching it). ``decimals`` wraps the result in ROUND.
+
+    ``rollup`` computes the same value from a pre-aggregated table whose
+    rows carry ``ROW_COUNT`` and, for averaged columns, ``<col>_SUM`` and
+    ``<col>_COUNT`` (see :mod:`aggregate_cube`).
+    """
+
+    func: str
+    column: str = None
+    decimals: int = None
+    rollup: bool = False
+
+    def sql(self, predicate=None):
+        func, col = self.func, self.column
+        rows = "ROW_COUNT" if self.rollup else "1"
+        if func == "COUNT" and self.rollup:
+            expr = f"COALESCE(SUM(CASE WHEN {predicate} THEN ROW_COUNT END), 0)" if predicate else "COALESCE(SUM(ROW_COUNT), 0)"
+        elif func == "COUNT":
+            expr = f"COUNT(CASE WHEN {predicate} THEN 1 END)" if predicate else "COUNT(*)"
+        elif func == "COUNT_DISTINCT":
+            expr = f"COUNT(DISTINCT CASE WHEN {predicate} THEN {col} END)" if predicate else f"COUNT(DISTINCT {col})"
+        elif func == "AVG" and self.rollup:
+            total, n = (f"CASE WHEN {predicate} THEN {c} END" if predicate else c for c in (f"{col}_SUM", f"{col}_COUNT"))
+            expr = f"SUM({total}) * 1.0 / NULLIF(SUM({n}), 0)"
+        elif func in ("AVG", "MIN", "MAX"):
+            expr = f"{func}(CASE WHEN {predicate} THEN {col} END)" if predicate else f"{func}({col})"
+        elif func in ("COUNT_IF", "PCT_IF"):
+            cond = f"({predicate}) AND ({col})" if predicate else col
+            expr = f"SUM(CASE WHEN {cond} THEN {rows} ELSE 0 END)"
+            if func == "PCT_IF":
+                total = Measure("COUNT", rollup=self.rollup).sql(predicate)
+                expr = f"{expr} * 100.0 / NULLIF({total}, 0)"
+        else:
+            raise ValueError(f"Unknown measure function: {func}")
+        if self.decimals is not None:
+            expr = f"ROUND({expr}, {self.decimals})"
+        return expr
+
+
+def count():
+    return Measure("COUNT")
+
+
+def count_distinct(column):
+    return Measure("COUNT_DISTINCT", column)
+
+
+def avg(column, decimals=None):
+    return Measure("AVG", column, decimals)
+
+
+def minimum(column):
+    return Measure("MIN", column)
+
+
+def maximum(column):
+    return Measure("MAX", column)
+
+
+def count_if(condition):
+    return Measure("COUNT_IF", condition)
+
+
+def pct_if(condition, decimals=None):
+    return Measure("PCT_IF", condition, decimals)
+
+
+@dataclass(frozen=True)
+class Aggregation:
+    """One chart's query, expressed so it can share a scan with its siblings
+
+    ``measures`` maps output column to :class:`Measure`. ``predicate`` is a
+    row condition applied on top of the page's WHERE clause. ``not_null``
+    lists group-by columns whose NULL group is dropped, ``having`` is a
+    ``(column, minimum)`` pair and ``order_by`` a sequence of
+    ``(column, ascending)`` pairs. ``predicate_params`` are the bind values
+    for ``?`` placeholders in ``predicate``.
+    """
+
+    name: str
+    group_by: tuple = ()
+    measures: dict = field(default_factory=dict)
+    predicate: str = None
+    predicate_params: tuple = ()
+    not_null: tuple = ()
+    having: tuple = None
+    order_by: tuple = ()
+    limit: int = None
+
+    def standalone_sql(self, table, where, expressions=DIMENSION_EXPRESSIONS):
+        """The member as its own statement, for backends without GROUPING SETS"""
+        select = [_dimension_sql(d, expressions) for d in self.group_by]
+        select += [f"{m.sql()} AS {alias}" for alias, m in self.measures.items()]
+        conditions = [where]
+        if self.predicate:
+            conditions.append(f"({self.predicate})")
+        conditions += [f"{_dimension_expr(d, expressions)} IS NOT NULL" for d in self.not_null]
+        sql = f"SELECT {', '.join(select)} FROM {table} {' AND '.join(conditions)}"
+        if self.group_by:
+            sql += " GROUP BY " + ", ".join(_dimension_expr(d, expressions) for d in self.group_by)
+        return sql
+
+    def standalone_params(self, where_params=()):
+        """Bind values for :meth:`standalone_sql`, in placeholder order"""
+        return tuple(where_params) + tuple(self.predicate_params)
+
+    def finish(self, df):
+        """Apply NOT NULL, HAVING, ORDER BY and LIMIT to this member's rows"""
+        for col in self.not_null:
+            df = df[df[col].notna()]
+        if self.having:
+            col, minimum_value = self.having
+            df = df[df[col] >= minimum_value]
+        if self.order_by:
+            # Group-by columns break ties so LIMIT picks the same rows every run
+            keys = list(self.order_by) + [(d, True) for d in self.group_by if d not in dict(self.order_by)]
+            df = df.sort_values(
+                [c for c, _ in keys],
+                ascending=[a for _, a in keys],
+                kind="mergesort",
+                na_position="last",
+            )
+        if self.limit is not None:
+            df = df.head(self.limit)
+        return _restore_integers(df.reset_index(drop=True), self)
+
+
+def _dimension_expr(dim, expressions=DIMENSION_EXPRESSIONS):
+    return expressions.get(dim, dim)
+
+
+def _dimension_sql(dim, expressions=DIMENSION_EXPRESSIONS):
+    expr = _dimension_expr(dim, expressions)
+    return f"{expr} AS {dim}" if expr != dim else dim
+
+
+def _restore_integers(df, aggregation):
+    """Undo the float upcast that NULLs from other grouping sets cause"""
+    int_columns = list(aggregation.group_by) + [
+        alias for alias, m in aggregation.measures.items() if m.func in _COUNT_FUNCS + ("MIN", "MAX")
+    ]
+    for col in int_columns:
+        series = df[col]
+        if pd.api.types.is_float_dtype(series) and series.notna().all() and (series % 1 == 0).all():
+            df[col] = series.astype("int64")
+    return df
+
+
+def stream_tasks(tasks, executor=None):
+    """Run ``PagePlan.tasks`` output, yielding ``(name, DataFrame or exception)``
+
+    Tasks run concurrently on ``executor`` when one is given, otherwise one
+    after another as the generator is consumed.
+    """
+    calls = {key: call for key, (_, call) in tasks.items()}
+    if executor is not None:
+        results = executor.iter_completed(calls)
+    else:
+        results = ((key, _call(call)) for key, call in calls.items())
+    for key, result in results:
+        if isinstance(result, Exception):
+            for name in tasks[key][0]:
+                yield name, result
+        else:
+            yield from result.items()
+
+
+def collect_frames(results):
+    """``dict(results)``, raising the first error instead of returning it"""
+    frames = dict(results)
+    for result in frames.values():
+        if isinstance(result, Exception):
+            raise result
+    return frames
+
+
+def _call(call):
+    try:
+        return call()
+    except Exception as e:
+        return e
+
+
+class PagePlan:
+    """All of a page's aggregations over one table and WHERE clause
+
+    ``dimension_expressions`` maps derived dimensions to the SQL computing
+    them; pass ``{}`` for tables that already store them as columns.
+    """
+
+    def __init__(self, name, table, where, aggregations, use_grouping_sets=True, params=(),
+                 dimension_expressions=DIMENSION_EXPRESSIONS):
+        self.name = name
+        self.table = table
+        self.where = where
+        self.params = tuple(params)
+        self.aggregations = list(aggregations)
+        self.use_grouping_sets = use_grouping_sets
+        self.dimension_expressions = dimension_expressions
+
+    def __iter__(self):
+        return iter(self.aggregations)
+
+    @property
+    def dimensions(self):
+        dims = []
+        for agg in self.aggregations:
+            dims += [d for d in agg.group_by if d not in dims]
+        return dims
+
+    @property
+    def grouping_sets(self):
+        sets = []
+        for agg in self.aggregations:
+            if tuple(agg.group_by) not in sets:
+                sets.append(tuple(agg.group_by))
+        return sets
+
+    def _predicate_flags(self):
+        """``{(predicate, params): column}`` for parameterized member predicates
+
+        Each one is evaluated once per row in the base subquery so its bind
+        values appear a single time in the statement.
+        """
+        flags = {}
+        for agg in self.aggregations:
+            key = (agg.predicate, tuple(agg.predicate_params))
+            if agg.predicate_params and key not in flags:
+                flags[key] = f"__P{len(flags)}"
+        return flags
+
+    def sql(self):
+        """One statement computing every member's measures in a single scan"""
+        dims = self.dimensions
+        flags = self._predicate_flags()
+        select = list(dims)
+        select += [f"GROUPING({d}) AS __G_{d}" for d in dims]
+        for i, agg in enumerate(self.aggregations):
+            predicate = flags.get((agg.predicate, tuple(agg.predicate_params)), agg.predicate)
+            select += [f"{m.sql(predicate)} AS {_member_column(i, alias)}" for alias, m in agg.measures.items()]
+            if predicate:
+                select.append(f"{count().sql(predicate)} AS {_member_column(i, '__ROWS')}")
+        expressions = self.dimension_expressions
+        derived = [f"{_dimension_expr(d, expressions)} AS {d}" for d in dims if _dimension_expr(d, expressions) != d]
+        derived += [f"({predicate}) AS {column}" for (predicate, _), column in flags.items()]
+        source = self.table
+        if derived:
+            source = f"(SELECT *, {', '.join(derived)} FROM {self.table} {self.where}) AS base"
+            where = ""
+        else:
+            where = self.where
+        sql = f"SELECT {', '.join(select)} FROM {source} {where}"
+        if dims:
+            sets = ", ".join("(" + ", ".join(s) + ")" for s in self.grouping_sets)
+            sql += f" GROUP BY GROUPING SETS ({sets})"
+        return sql
+
+    def sql_params(self):
+        """Bind values for :meth:`sql`, in placeholder order"""
+        params = []
+        for _, values in self._predicate_flags():
+            params.extend(values)
+        return tuple(params) + self.params
+
+    def split(self, df):
+        """Turn the combined result into ``{aggregation name: DataFrame}``"""
+        df = df.copy()
+        df.columns = [str(c).upper() for c in df.columns]
+        dims = self.dimensions
+        frames = {}
+        for i, agg in enumerate(self.aggregations):
+            mask = pd.Series(True, index=df.index)
+            for d in dims:
+                mask &= df[f"__G_{d}"] == (0 if d in agg.group_by else 1)
+            rows = df[mask]
+            if agg.predicate and agg.group_by:
+                rows = rows[rows[_member_column(i, "__ROWS")] > 0]
+            member = rows[list(agg.group_by)].copy()
+            for alias in agg.measures:
+                member[alias] = rows[_member_column(i, alias)].values
+            frames[agg.name] = agg.finish(member)
+        return frames
+
+    def tasks(self, run_query):
+        """``{key: (member names, callable)}``, each callable returning ``{name: DataFrame}``
+
+        With GROUPING SETS there is a single task for the whole page,
+        otherwise one per member.
+        """
+        if self.use_grouping_sets:
+            names = [agg.name for agg in self.aggregations]
+            return {self.name: (names, partial(self._run_batched, run_query))}
+        return {
+            f"{self.name}.{agg.name}": ([agg.name], partial(self._run_member, agg, run_query))
+            for agg in self.aggregations
+        }
+
+    def stream(self, run_query, executor=None):
+        """Yield ``(name, DataFrame or exception)`` as each member's result is ready
+
+        With GROUPING SETS every member arrives from the single statement.
+        Otherwise each member runs as its own statement, concurrently when a
+        :class:`query_executor.QueryExecutor` is given.
+        """
+        return stream_tasks(self.tasks(run_query), executor)
+
+    def run(self, run_query, executor=None):
+        """Execute the plan and return ``{name: DataFrame}``, raising the first error"""
+        return collect_frames(self.stream(run_query, executor))
+
+    def _run_batched(self, run_query):
+        return self.split(run_query(self.sql(), self.sql_params()))
+
+    def _run_member(self, agg, run_query):
+        sql = agg.standalone_sql(self.table, self.where, self.dimension_expressions)
+        return {agg.name: agg.finish(_upper(run_query(sql, agg.standalone_params(self.params))))}
+
+
+def _member_column(index, alias):
+    return f"M{index}_{alias}".upper()
+
+
+def _upper(df):
+    df.columns = [str(c).upper() for c in df.columns]
+    return df
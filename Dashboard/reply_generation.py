@@ -0,0 +1,292 @@
+"""Batched, resumable generation of the REPLY column.
+
+Replaces the notebook's single ``UPDATE ... SET REPLY = COMPLETE(...)``.
+:class:`ReplyJob` works through rows whose reply is missing or was made
+for different feedback text, a different model or a different prompt
+template version, in bounded batches, Adverse and Worsen rows first. Each
+row records the key its reply was generated for in ``REPLY_KEY``, so an
+interrupted or budget-limited run simply continues with what is left.
+
+Generated replies are stored in ``REPLY_CACHE`` keyed on (model, prompt
+template version, SHA-256 of the feedback); identical feedback is sent to
+the model once, and re-running after a reset costs nothing. Calls run on a
+small thread pool with an optional request rate limit and a token budget.
+:class:`CortexReplyModel` calls ``SNOWFLAKE.CORTEX.COMPLETE``;
+:class:`TemplateReplyModel` is an offline stand-in for testing, with which
+the job runs on :class:`local_session.LocalSession`.
+"""
+
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from portable_sql import add_missing_columns, rows_sql
+
+CACHE_TABLE = "REPLY_CACHE"
+PRIORITY_LABELS = ("Adverse", "Worsen")
+# Rows whose call failed are skipped for the rest of a run; this many failures end the run
+MAX_FAILED_ROWS = 500
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """A versioned prompt; bump ``version`` whenever ``text`` changes so cached replies are not reused"""
+
+    version: str
+    text: str
+
+    def render(self, feedback):
+        return self.text + feedback
+
+
+REPLY_TEMPLATE = PromptTemplate(
+    version="1",
+    text=(
+        "You are a polite, empathetic healthcare provider. Read the following patient feedback and "
+        "respond in the same language, using respectful and professional medical language, thanking "
+        "the patient and providing brief but supportive advice: "
+    ),
+)
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token) used for budgeting"""
+    return max(1, len(text or "") // 4)
+
+
+def _sql_string(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+class CortexReplyModel:
+    """``SNOWFLAKE.CORTEX.COMPLETE(model, prompt)`` through ``execute(sql, params)``"""
+
+    def __init__(self, execute, model="mistral-large2"):
+        self.execute = execute
+        self.name = model
+
+    def complete(self, prompt):
+        df = self.execute("SELECT SNOWFLAKE.CORTEX.COMPLETE(?, ?) AS REPLY", [self.name, prompt])
+        reply = df.iloc[0, 0]
+        # A NULL completion is a failed call, not the reply "None"
+        if reply is None or reply != reply or not str(reply).strip():
+            raise RuntimeError(f"{self.name} returned no completion")
+        return str(reply)
+
+
+class TemplateReplyModel:
+    """Offline stand-in that answers every prompt with a fixed, sentiment-aware reply"""
+
+    NEGATIVE = ("unfortunately", "poor", "worse", "side effect", "severe", "adverse", "not ")
+
+    def __init__(self, name="local-template", delay_seconds=0.0):
+        self.name = name
+        self.delay_seconds = delay_seconds
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete(self, prompt):
+        with self._lock:
+            self.calls += 1
+        if self.delay_seconds:
+            time.sleep(self.delay_seconds)
+        if any(word in prompt.lower() for word in self.NEGATIVE):
+            return ("Thank you for telling us about your experience. We are sorry the treatment has not "
+                    "worked as hoped; please contact your doctor to review your symptoms and options.")
+        return ("Thank you for your feedback. We are glad the treatment is helping; please continue to "
+                "follow your doctor's advice and keep us informed of any changes.")
+
+
+class RateLimiter:
+    """Spaces calls at least ``1 / per_second`` seconds apart across threads"""
+
+    def __init__(self, per_second=None):
+        self.interval = 1.0 / per_second if per_second else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+@dataclass
+class ReplyStats:
+    batches: int = 0
+    rows: int = 0
+    cache_hits: int = 0
+    generated: int = 0
+    failed: int = 0
+    tokens: int = 0
+    stopped: str = ""
+    seconds: float = 0.0
+
+
+class ReplyJob:
+    """Fills REPLY on ``table`` with ``model`` through ``execute(sql, params) -> DataFrame``
+
+    ``max_workers`` bounds concurrent model calls, ``requests_per_second``
+    rate-limits them and ``token_budget`` caps the estimated prompt plus
+    reply tokens of a run: no new call is made once a prompt would exceed it.
+    Rows whose call fails are retried on the next run; a run stops after
+    ``max_failed_rows`` of them.
+    """
+
+    def __init__(self, table, execute, model, template=REPLY_TEMPLATE, batch_size=50, max_workers=4,
+                 requests_per_second=None, token_budget=None, cache_table=CACHE_TABLE,
+                 priority_labels=PRIORITY_LABELS, max_failed_rows=MAX_FAILED_ROWS):
+        self.table = table
+        self.execute = execute
+        self.model = model
+        self.template = template
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(requests_per_second)
+        self.token_budget = token_budget
+        self.cache_table = cache_table
+        self.priority_labels = tuple(priority_labels)
+        self.max_failed_rows = max_failed_rows
+
+    @property
+    def key_prefix(self):
+        return f"{self.model.name}|{self.template.version}|"
+
+    def key_sql(self):
+        """SQL for the reply key of a row: SHA-256 of model, template version and feedback hash"""
+        return f"SHA2({_sql_string(self.key_prefix)} || SHA2(FEEDBACK, 256), 256)"
+
+    def row_key(self, digest):
+        """Python twin of :meth:`key_sql` for a feedback hash"""
+        return hashlib.sha256((self.key_prefix + digest).encode("utf-8")).hexdigest()
+
+    def prepare(self):
+        add_missing_columns(self.execute, self.table, {"REPLY": "STRING", "REPLY_KEY": "STRING"})
+        self.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.cache_table} ("
+            f"MODEL STRING, TEMPLATE_VERSION STRING, FEEDBACK_HASH STRING, REPLY STRING, "
+            f"TOKENS NUMBER, CREATED_AT TIMESTAMP_NTZ)"
+        )
+
+    def pending_condition(self):
+        return f"(FEEDBACK IS NOT NULL AND (REPLY IS NULL OR REPLY_KEY IS NULL OR REPLY_KEY <> {self.key_sql()}))"
+
+    def pending_count(self):
+        df = self.execute(f"SELECT COUNT(*) AS PENDING FROM {self.table} WHERE {self.pending_condition()}")
+        return int(df.iloc[0, 0])
+
+    def run(self, max_batches=None, progress=None):
+        """Generate replies batch by batch until nothing is pending, the budget runs out or ``max_batches``
+
+        ``progress(stats)`` is called after every batch. Returns :class:`ReplyStats`.
+        """
+        started = time.monotonic()
+        self.prepare()
+        stats = ReplyStats()
+        failed_ids = []
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="reply") as pool:
+            while max_batches is None or stats.batches < max_batches:
+                batch = self._next_batch(failed_ids)
+                if batch.empty:
+                    stats.stopped = stats.stopped or "done"
+                    break
+                replies = self._cached(batch)
+                stats.cache_hits += sum(1 for h in batch["FEEDBACK_HASH"] if h in replies)
+                generated, failed = self._generate(batch, replies, pool, stats)
+                replies.update(generated)
+                self._store(batch, replies, generated)
+                done = batch[batch["FEEDBACK_HASH"].isin(list(replies))]
+                failed_ids += [int(i) for i in batch.loc[batch["FEEDBACK_HASH"].isin(failed), "ID"]]
+                if len(failed_ids) >= self.max_failed_rows:
+                    # Keeps the exclusion list of the next batch query bounded
+                    stats.stopped = stats.stopped or "too many failures"
+                stats.batches += 1
+                stats.rows += len(done)
+                if progress is not None:
+                    progress(stats)
+                if stats.stopped:
+                    break
+        stats.seconds = time.monotonic() - started
+        return stats
+
+    def _next_batch(self, exclude_ids):
+        labels = ", ".join(_sql_string(label) for label in self.priority_labels) or "NULL"
+        exclude = f"AND ID NOT IN ({', '.join('?' for _ in exclude_ids)})" if exclude_ids else ""
+        df = self.execute(f"""
+            SELECT ID, FEEDBACK, SHA2(FEEDBACK, 256) AS FEEDBACK_HASH
+            FROM {self.table}
+            WHERE {self.pending_condition()} {exclude}
+            ORDER BY CASE WHEN LABELS IN ({labels}) THEN 0 ELSE 1 END, ID
+            LIMIT {int(self.batch_size)}
+        """, list(exclude_ids) or None)
+        return df
+
+    def _cached(self, batch):
+        """``{feedback_hash: reply}`` already in the cache for this model and template"""
+        hashes = sorted(set(batch["FEEDBACK_HASH"]))
+        df = self.execute(f"""
+            SELECT FEEDBACK_HASH, MIN(REPLY) AS REPLY
+            FROM {self.cache_table}
+            WHERE MODEL = ? AND TEMPLATE_VERSION = ? AND FEEDBACK_HASH IN ({', '.join('?' for _ in hashes)})
+            GROUP BY FEEDBACK_HASH
+        """, [self.model.name, self.template.version] + hashes)
+        return dict(zip(df["FEEDBACK_HASH"], df["REPLY"]))
+
+    def _generate(self, batch, cached, pool, stats):
+        """Call the model once per distinct uncached feedback, within the token budget"""
+        todo = {}
+        for text, digest in zip(batch["FEEDBACK"], batch["FEEDBACK_HASH"]):
+            if digest not in cached and digest not in todo:
+                todo[digest] = self.template.render(text)
+        futures = {}
+        for digest, prompt in todo.items():
+            if self.token_budget is not None and stats.tokens + estimate_tokens(prompt) > self.token_budget:
+                stats.stopped = "token budget"
+                break
+            stats.tokens += estimate_tokens(prompt)
+            futures[digest] = pool.submit(self._call, prompt)
+        generated = {}
+        failed = set()
+        for digest, future in futures.items():
+            try:
+                reply = future.result()
+            except Exception:
+                failed.add(digest)
+                stats.failed += 1
+                continue
+            generated[digest] = reply
+            stats.generated += 1
+            stats.tokens += estimate_tokens(reply)
+        return generated, failed
+
+    def _call(self, prompt):
+        self.limiter.wait()
+        return self.model.complete(prompt)
+
+    def _store(self, batch, replies, generated):
+        """Add new replies to the cache, then write every resolved reply back to its row"""
+        if generated:
+            rows = ", ".join("(?, ?, ?, ?, ?, CURRENT_TIMESTAMP())" for _ in generated)
+            params = []
+            for digest, reply in generated.items():
+                params += [self.model.name, self.template.version, digest, reply, estimate_tokens(reply)]
+            self.execute(
+                f"INSERT INTO {self.cache_table} (MODEL, TEMPLATE_VERSION, FEEDBACK_HASH, REPLY, TOKENS, CREATED_AT) "
+                f"VALUES {rows}", params)
+        rows = [(int(row_id), replies[digest], self.row_key(digest))
+                for row_id, digest in zip(batch["ID"], batch["FEEDBACK_HASH"]) if digest in replies]
+        if rows:
+            sql, params = rows_sql(("ID", "REPLY", "REPLY_KEY"), rows)
+            self.execute(f"""
+                UPDATE {self.table} AS t
+                SET REPLY = v.REPLY, REPLY_KEY = v.REPLY_KEY
+                FROM ({sql}) AS v
+                WHERE t.ID = v.ID
+            """, params)
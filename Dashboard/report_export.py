@@ -0,0 +1,158 @@
+"""Streaming report exports for the Reports page.
+
+A report's full result set is consumed batch by batch and appended to a
+temporary file as CSV, gzip-compressed CSV or Parquet, so the app never
+holds the whole export in memory as a DataFrame or a CSV string. The file
+is then handed to ``st.download_button``. Each browser session writes into
+its own :class:`ExportDirectory`, which keeps only the export for the
+current filters and is deleted with the session.
+"""
+
+import gzip
+import os
+import shutil
+import tempfile
+import weakref
+from dataclasses import dataclass
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet exports are offered only when pyarrow is installed
+    pa = None
+    pq = None
+
+# label: (file suffix, mime type)
+EXPORT_FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "CSV (gzip)": (".csv.gz", "application/gzip"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+
+def available_formats():
+    return [label for label in EXPORT_FORMATS if label != "Parquet" or pq is not None]
+
+
+def session_batches(session, sql, params=None):
+    """Yield DataFrames for ``sql`` using Snowpark's ``to_pandas_batches``"""
+    frame = session.sql(sql, params=params) if params else session.sql(sql)
+    if hasattr(frame, "to_pandas_batches"):
+        yield from frame.to_pandas_batches()
+    else:
+        yield frame.to_pandas()
+
+
+@dataclass(frozen=True)
+class ExportFile:
+    path: str
+    file_name: str
+    mime: str
+    rows: int
+
+    @property
+    def size_bytes(self):
+        return os.path.getsize(self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def write_export(batches, fmt, file_stem, directory=None):
+    """Write every batch to a temp file in ``fmt`` (under ``directory`` if given) and return an :class:`ExportFile`"""
+    suffix, mime = EXPORT_FORMATS[fmt]
+    handle, path = tempfile.mkstemp(prefix="report_", suffix=suffix, dir=directory)
+    os.close(handle)
+    try:
+        if fmt == "Parquet":
+            rows = _write_parquet(batches, path)
+        else:
+            rows = _write_csv(batches, path, compress=fmt == "CSV (gzip)")
+    except Exception:
+        os.remove(path)
+        raise
+    return ExportFile(path=path, file_name=file_stem + suffix, mime=mime, rows=rows)
+
+
+class ExportDirectory:
+    """A temp directory holding one session's export, keyed by what it was written for
+
+    Asking for a different key (the report's filters or format changed)
+    deletes the stale file. The directory itself is removed by
+    :meth:`cleanup`, when the object is garbage collected with its
+    session, or at interpreter exit.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.key = None
+        self.file = None
+        self._finalizer = None
+
+    def write(self, key, batches, fmt, file_stem):
+        """Replace the current export with ``batches`` written for ``key``"""
+        self.discard()
+        if self.path is None:
+            self.path = tempfile.mkdtemp(prefix="report_exports_")
+            self._finalizer = weakref.finalize(self, shutil.rmtree, self.path, ignore_errors=True)
+        self.file = write_export(batches, fmt, file_stem, directory=self.path)
+        self.key = key
+        return self.file
+
+    def get(self, key):
+        """The export written for ``key``, or None; an export for another key is deleted"""
+        if self.file is not None and self.key != key:
+            self.discard()
+        return self.file
+
+    def discard(self):
+        if self.file is not None:
+            self.file.remove()
+        self.key = None
+        self.file = None
+
+    def cleanup(self):
+        self.key = None
+        self.file = None
+        if self._finalizer is not None:
+            self._finalizer()
+        self.path = None
+
+
+def _write_csv(batches, path, compress):
+    opener = gzip.open if compress else open
+    rows = 0
+    header = True
+    with opener(path, "wt", newline="", encoding="utf-8") as out:
+        for batch in batches:
+            if batch.empty and not header:
+                continue
+            batch.to_csv(out, index=False, header=header)
+            header = False
+            rows += len(batch)
+    return rows
+
+
+def _write_parquet(batches, path):
+    if pq is None:
+        raise ImportError("pyarrow is required for Parquet exports")
+    rows = 0
+    writer = None
+    try:
+        for batch in batches:
+            if batch.empty and writer is not None:
+                continue
+            table = pa.Table.from_pandas(batch, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            else:
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+            rows += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
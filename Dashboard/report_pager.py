@@ -0,0 +1,89 @@
+"""Server-side pagination for the Reports page previews.
+
+Only the page on screen is fetched. Row-level reports use keyset
+pagination on their sort keys, by default ``(FEEDBACK_DATE, ID)``
+descending: each page starts strictly after the last row of the previous
+one, so the warehouse never skips over the earlier pages the way OFFSET
+does. Grouped reports have no such keys and are small, so they page with
+LIMIT/OFFSET. Page SQL is deterministic, so a page prefetched in the
+background lands in the result cache under the same key.
+"""
+
+import numpy as np
+import pandas as pd
+
+FEEDBACK_KEYS = (("FEEDBACK_DATE", False), ("ID", False))
+
+
+def _bindable(value):
+    """Turn pandas/NumPy scalars from a result row into plain Python bind values"""
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class KeysetPager:
+    """Pages through ``sql`` ordered by ``keys``, a sequence of ``(column, ascending)``
+
+    ``sql`` must not have its own ORDER BY, and the key columns must be
+    non-null and unique together. A cursor is the key tuple of the last row
+    shown; ``None`` is the first page.
+    """
+
+    def __init__(self, sql, params=(), keys=FEEDBACK_KEYS, page_size=100):
+        self.sql = sql
+        self.params = tuple(params)
+        self.keys = tuple(keys)
+        self.page_size = page_size
+
+    @property
+    def order_by(self):
+        return "ORDER BY " + ", ".join(f"{col} {'ASC' if asc else 'DESC'}" for col, asc in self.keys)
+
+    def page_sql(self, cursor=None):
+        """``(sql, params)`` for the page after ``cursor``"""
+        sql = f"SELECT * FROM ({self.sql}) AS report"
+        params = self.params
+        if cursor is not None:
+            condition, cursor_params = self._after(cursor)
+            sql += f" WHERE {condition}"
+            params += cursor_params
+        return f"{sql} {self.order_by} LIMIT {int(self.page_size)}", params
+
+    def next_cursor(self, page, cursor=None):
+        """Cursor for the page following ``page``, or ``None`` if it was the last"""
+        if len(page) < self.page_size:
+            return None
+        last = page.iloc[-1]
+        return tuple(_bindable(last[col]) for col, _ in self.keys)
+
+    def _after(self, cursor):
+        # (a, b) after (x, y) expands to a > x OR (a = x AND b > y), with < for DESC keys
+        clauses = []
+        params = []
+        for i, (col, asc) in enumerate(self.keys):
+            equal = [f"{c} = ?" for c, _ in self.keys[:i]]
+            clauses.append("(" + " AND ".join(equal + [f"{col} {'>' if asc else '<'} ?"]) + ")")
+            params += list(cursor[:i + 1])
+        return "(" + " OR ".join(clauses) + ")", tuple(params)
+
+
+class OffsetPager:
+    """LIMIT/OFFSET paging for small grouped reports; ``sql`` carries its ORDER BY"""
+
+    def __init__(self, sql, params=(), order_by="", page_size=100):
+        self.sql = sql
+        self.params = tuple(params)
+        self.order_by = order_by
+        self.page_size = page_size
+
+    def page_sql(self, cursor=None):
+        offset = cursor or 0
+        return f"{self.sql} {self.order_by} LIMIT {int(self.page_size)} OFFSET {int(offset)}", self.params
+
+    def next_cursor(self, page, cursor=None):
+        if len(page) < self.page_size:
+            return None
+        return (cursor or 0) + len(page)
@@ -0,0 +1,338 @@
+"""Headless adverse-rate spike monitoring per drug and country.
+
+Feedback rows are consumed in FEEDBACK_DATE order, batch by batch, and
+each report is a 0/1 observation for its (DRUG_NAME, COUNTRY) series: 1
+when LABELS is Adverse or Worsen (:data:`query_planner.ADVERSE_LABELS`,
+the definition the dashboard uses everywhere). Every series keeps a fixed
+handful of numbers -- reports, adverse reports, a Bernoulli CUSUM and an
+EWMA -- in arrays shared by all series, so memory does not grow with
+history and no past rows are ever read again. A batch is processed as a
+sequence of vectorized steps, each advancing every series that has a
+report in it by one report.
+
+A series' in-control rate is its own adverse rate shrunk towards the
+pooled rate of every series (:data:`PRIOR_REPORTS` reports' worth), so
+series with a handful of reports are judged against the portfolio; the
+pooled rate is refreshed after every step, so how rows are split into
+batches can shift the statistics slightly.
+The CUSUM alarms when the log-likelihood ratio for the odds of an adverse
+report having multiplied by :data:`CUSUM_ODDS_RATIO` passes
+:data:`CUSUM_THRESHOLD`; the EWMA alarms when the smoothed rate passes its
+upper control limit. For baselines near or above one half that limit
+would reach 1, which an average of 0/1 reports never passes, so it is
+capped where :data:`EWMA_ALARM_RUN` adverse reports in a row always cross
+it. A detector restarts after it alarms. Alerts are
+written to :class:`JsonLinesSink`, :class:`SQLiteSink` or
+:class:`WebhookSink`.
+
+Run headless with ``python safety_monitor.py`` (follows the feedback table)
+or ``python safety_monitor.py --csv export.csv`` (replays a file).
+"""
+
+import argparse
+import sqlite3
+import time
+import urllib.request
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from date_parsing import parse_dates
+from query_planner import ADVERSE_LABELS
+
+SERIES_COLUMNS = ("DRUG_NAME", "COUNTRY")
+TIME_COLUMN = "FEEDBACK_DATE"
+SOURCE_COLUMNS = ("ID", TIME_COLUMN, "LABELS") + SERIES_COLUMNS
+
+MIN_REPORTS = 5            # no alarms before a series has this many reports
+PRIOR_REPORTS = 20         # weight of the pooled rate in a series' baseline
+MIN_RATE = 0.01
+CUSUM_ODDS_RATIO = 2.0
+CUSUM_THRESHOLD = 4.0
+EWMA_LAMBDA = 0.2
+EWMA_LIMIT = 3.0           # control limit in EWMA standard deviations
+EWMA_ALARM_RUN = 8         # consecutive adverse reports that always pass the (capped) EWMA limit
+POLL_SECONDS = 60
+CSV_CHUNK_ROWS = 100_000
+DEFAULT_ALERTS = "safety_alerts.jsonl"
+
+ALERT_COLUMNS = [
+    *SERIES_COLUMNS, "DETECTOR", TIME_COLUMN, "ID", "REPORTS", "ADVERSE_RATE", "BASELINE", "EWMA",
+    "STATISTIC", "THRESHOLD",
+]
+
+
+class SafetyMonitor:
+    """Sequential CUSUM and EWMA detectors for every (drug, country) adverse rate"""
+
+    def __init__(self, min_reports=MIN_REPORTS, prior_reports=PRIOR_REPORTS, odds_ratio=CUSUM_ODDS_RATIO,
+                 cusum_threshold=CUSUM_THRESHOLD, ewma_lambda=EWMA_LAMBDA, ewma_limit=EWMA_LIMIT,
+                 ewma_alarm_run=EWMA_ALARM_RUN):
+        self.min_reports = min_reports
+        self.prior_reports = prior_reports
+        self.odds_ratio = odds_ratio
+        self.cusum_threshold = cusum_threshold
+        self.ewma_lambda = ewma_lambda
+        self.ewma_limit = ewma_limit
+        self.ewma_alarm_run = ewma_alarm_run
+        self.series = {}  # (drug, country) -> position in the state arrays
+        self.keys = []
+        self.reports = np.zeros(0, dtype=np.int64)
+        self.adverse = np.zeros(0, dtype=np.int64)
+        self.cusum = np.zeros(0)
+        self.ewma = np.zeros(0)
+        self.ewma_steps = np.zeros(0, dtype=np.int64)  # reports since the EWMA (re)started
+        self.total_reports = 0
+        self.total_adverse = 0
+        self.watermark = None
+
+    @property
+    def pooled_rate(self):
+        rate = self.total_adverse / self.total_reports if self.total_reports else 0.0
+        return min(max(rate, MIN_RATE), 1 - MIN_RATE)
+
+    def state(self):
+        """One row per series with its counters and detector values"""
+        index = pd.MultiIndex.from_tuples(self.keys, names=SERIES_COLUMNS)
+        return pd.DataFrame({
+            "REPORTS": self.reports, "ADVERSE": self.adverse, "BASELINE": self._baseline(np.arange(len(self.keys))),
+            "CUSUM": self.cusum, "EWMA": self.ewma,
+        }, index=index).reset_index()
+
+    def _positions(self, df):
+        """State-array position of each row's series, adding series seen for the first time"""
+        codes, uniques = pd.MultiIndex.from_frame(df[list(SERIES_COLUMNS)].astype(str)).factorize()
+        lookup = np.empty(len(uniques), dtype=np.int64)
+        for i, key in enumerate(uniques):
+            position = self.series.get(key)
+            if position is None:
+                position = self.series[key] = len(self.keys)
+                self.keys.append(key)
+            lookup[i] = position
+        grow = len(self.keys) - len(self.reports)
+        if grow:
+            self.reports = np.append(self.reports, np.zeros(grow, dtype=np.int64))
+            self.adverse = np.append(self.adverse, np.zeros(grow, dtype=np.int64))
+            self.cusum = np.append(self.cusum, np.zeros(grow))
+            self.ewma = np.append(self.ewma, np.zeros(grow))
+            self.ewma_steps = np.append(self.ewma_steps, np.zeros(grow, dtype=np.int64))
+        return lookup[codes]
+
+    def _baseline(self, s):
+        rate = (self.adverse[s] + self.prior_reports * self.pooled_rate) / (self.reports[s] + self.prior_reports)
+        return np.clip(rate, MIN_RATE, 1 - MIN_RATE)
+
+    def update(self, df):
+        """Feed a batch of feedback rows; returns the alerts it raised (:data:`ALERT_COLUMNS`)"""
+        df = df[[c for c in SOURCE_COLUMNS if c in df.columns]].dropna(subset=[*SERIES_COLUMNS, TIME_COLUMN])
+        if df.empty:
+            return pd.DataFrame(columns=ALERT_COLUMNS)
+        dates = parse_dates(df[TIME_COLUMN], TIME_COLUMN)
+        order = np.argsort(dates.to_numpy(), kind="stable")
+        df, dates = df.iloc[order], dates.iloc[order]
+        positions = self._positions(df)
+        observed = df["LABELS"].astype(object).isin(ADVERSE_LABELS).to_numpy(dtype=np.int64)
+
+        # Step r advances every series by its r-th report of the batch; no series appears twice in a step
+        step = pd.Series(positions).groupby(positions).cumcount().to_numpy()
+        by_step = np.argsort(step, kind="stable")
+        bounds = np.cumsum(np.bincount(step))[:-1]
+        lam = self.ewma_lambda
+        fired = []
+        for rows in np.split(by_step, bounds):
+            s, x = positions[rows], observed[rows]
+            p0 = self._baseline(s)
+            p1 = self.odds_ratio * p0 / (1 - p0 + self.odds_ratio * p0)
+            llr = np.where(x == 1, np.log(p1 / p0), np.log((1 - p1) / (1 - p0)))
+            self.cusum[s] = np.maximum(0.0, self.cusum[s] + llr)
+            # A new or restarted EWMA starts from the series' baseline
+            previous = np.where(self.ewma_steps[s] == 0, p0, self.ewma[s])
+            self.ewma[s] = lam * x + (1 - lam) * previous
+            self.ewma_steps[s] += 1
+            self.reports[s] += 1
+            self.adverse[s] += x
+            self.total_reports += len(s)
+            self.total_adverse += int(x.sum())
+
+            sigma = np.sqrt(p0 * (1 - p0) * lam / (2 - lam) * (1 - (1 - lam) ** (2 * self.ewma_steps[s])))
+            # The EWMA from p0 after n adverse reports in a row is 1 - (1 - p0) * (1 - lam) ** n
+            ucl = np.minimum(p0 + self.ewma_limit * sigma, 1 - (1 - p0) * (1 - lam) ** (self.ewma_alarm_run - 1))
+            ready = self.reports[s] >= self.min_reports
+            cusum_alarm = ready & (self.cusum[s] > self.cusum_threshold)
+            ewma_alarm = ready & (self.ewma[s] > ucl)
+            for detector, alarm, statistic, threshold in (
+                ("CUSUM", cusum_alarm, self.cusum[s], np.full(len(s), self.cusum_threshold)),
+                ("EWMA", ewma_alarm, self.ewma[s], ucl),
+            ):
+                if alarm.any():
+                    fired.append(pd.DataFrame({
+                        "POSITION": s[alarm], "ROW": rows[alarm], "DETECTOR": detector,
+                        "REPORTS": self.reports[s[alarm]],
+                        "ADVERSE_RATE": self.adverse[s[alarm]] / self.reports[s[alarm]],
+                        "BASELINE": p0[alarm], "EWMA": self.ewma[s[alarm]],
+                        "STATISTIC": statistic[alarm], "THRESHOLD": threshold[alarm],
+                    }))
+            # Restart the detectors that alarmed
+            self.cusum[s[cusum_alarm]] = 0.0
+            self.ewma_steps[s[ewma_alarm]] = 0
+
+        latest = dates.max()
+        if pd.notna(latest) and (self.watermark is None or latest > self.watermark):
+            self.watermark = latest
+        return self._alerts(fired, df, dates)
+
+    def _alerts(self, fired, df, dates):
+        if not fired:
+            return pd.DataFrame(columns=ALERT_COLUMNS)
+        alerts = pd.concat(fired, ignore_index=True).sort_values(["ROW", "DETECTOR"], kind="stable")
+        rows = alerts.pop("ROW").to_numpy()
+        keys = [self.keys[p] for p in alerts.pop("POSITION")]
+        for i, col in enumerate(SERIES_COLUMNS):
+            alerts[col] = [k[i] for k in keys]
+        alerts[TIME_COLUMN] = dates.to_numpy()[rows]
+        alerts["ID"] = df["ID"].to_numpy()[rows] if "ID" in df.columns else None
+        return alerts[ALERT_COLUMNS].reset_index(drop=True)
+
+
+class JsonLinesSink:
+    """Appends alerts to a file, one JSON object per line"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, alerts):
+        if len(alerts):
+            alerts.to_json(self.path, orient="records", lines=True, date_format="iso", mode="a")
+
+
+class SQLiteSink:
+    """Appends alerts to a table of a SQLite database"""
+
+    def __init__(self, path, table_name="SAFETY_ALERTS"):
+        self.path = path
+        self.table_name = table_name
+
+    def write(self, alerts):
+        if len(alerts):
+            with sqlite3.connect(self.path) as con:
+                alerts.to_sql(self.table_name, con, if_exists="append", index=False)
+
+
+class WebhookSink:
+    """POSTs each batch of alerts as a JSON array to ``url``"""
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def write(self, alerts):
+        if not len(alerts):
+            return
+        body = alerts.to_json(orient="records", date_format="iso").encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+def alert_sink(target):
+    """Sink for an http(s) URL, a ``.db``/``.sqlite`` file or (otherwise) a JSON lines file"""
+    if target.startswith(("http://", "https://")):
+        return WebhookSink(target)
+    if target.endswith((".db", ".sqlite", ".sqlite3")):
+        return SQLiteSink(target)
+    return JsonLinesSink(target)
+
+
+@dataclass
+class MonitorStats:
+    batches: int = 0
+    rows: int = 0
+    alerts: int = 0
+    seconds: float = 0.0
+
+
+def run_monitor(batches, monitor, sink, progress=None):
+    """Feed every batch to ``monitor`` and write its alerts to ``sink``; ``progress(stats)`` after each batch"""
+    started = time.monotonic()
+    stats = MonitorStats()
+    for batch in batches:
+        alerts = monitor.update(batch)
+        sink.write(alerts)
+        stats.batches += 1
+        stats.rows += len(batch)
+        stats.alerts += len(alerts)
+        if progress is not None:
+            progress(stats)
+    stats.seconds = time.monotonic() - started
+    return stats
+
+
+def csv_batches(path, chunk_rows=CSV_CHUNK_ROWS):
+    """Feedback rows of a CSV export, in bounded chunks"""
+    yield from pd.read_csv(path, usecols=list(SOURCE_COLUMNS), chunksize=chunk_rows,
+                           keep_default_na=False, na_values=[""])
+
+
+def follow_table(session, table, monitor, poll_seconds=POLL_SECONDS, stop=None):
+    """New rows of ``table`` since ``monitor``'s watermark, polled every ``poll_seconds`` until ``stop()``
+
+    Each poll is read in FEEDBACK_DATE order with ``to_pandas_batches``, so
+    the first one pages through the table rather than loading it whole.
+    Rows dated on the watermark day itself are read again on the next poll
+    (they may still be arriving); the IDs already fed from that day are
+    skipped. Rows that reach the table later with an earlier FEEDBACK_DATE
+    are not picked up -- the table has no load time to follow -- so replay
+    an export with ``--csv`` to include a late backfill.
+    """
+    seen_day, seen_ids = None, set()
+    while stop is None or not stop():
+        sql = f"SELECT {', '.join(SOURCE_COLUMNS)} FROM {table}"
+        params = []
+        if monitor.watermark is not None:
+            sql += f" WHERE {TIME_COLUMN} >= ?"
+            params = [monitor.watermark.date()]
+        sql += f" ORDER BY {TIME_COLUMN}, ID"
+        result = session.sql(sql, params=params) if params else session.sql(sql)
+        for df in result.to_pandas_batches():
+            dates = parse_dates(df[TIME_COLUMN], TIME_COLUMN).dt.normalize()
+            if seen_day is not None:
+                fresh = ~(dates.eq(seen_day) & df["ID"].isin(seen_ids)).to_numpy()
+                df, dates = df[fresh], dates[fresh]
+            if not len(df):
+                continue
+            yield df
+            day = monitor.watermark.normalize() if monitor.watermark is not None else None
+            if day != seen_day:
+                seen_day, seen_ids = day, set()
+            seen_ids.update(df.loc[dates.eq(seen_day).to_numpy(), "ID"])
+        time.sleep(poll_seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monitor adverse-rate spikes per drug and country")
+    parser.add_argument("--csv", help="replay a feedback CSV instead of following the table")
+    parser.add_argument("--table", default="MODIFIED_DATA", help="feedback table to follow")
+    parser.add_argument("--alerts", default=DEFAULT_ALERTS, help="JSON lines file, .db SQLite file or webhook URL")
+    parser.add_argument("--poll-seconds", type=float, default=POLL_SECONDS)
+    args = parser.parse_args(argv)
+
+    monitor = SafetyMonitor()
+    sink = alert_sink(args.alerts)
+    if args.csv:
+        batches = csv_batches(args.csv)
+    else:
+        try:
+            from snowflake.snowpark.context import get_active_session
+            session = get_active_session()
+        except Exception:
+            from local_session import LocalSession
+            session = LocalSession()
+        batches = follow_table(session, args.table, monitor, args.poll_seconds)
+    stats = run_monitor(batches, monitor, sink,
+                        progress=lambda s: print(f"{s.rows:,} rows, {s.alerts:,} alerts", flush=True))
+    print(f"{stats.rows:,} rows in {stats.seconds:.1f}s, {stats.alerts:,} alerts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Pluggable sentiment scoring for the enrichment pipeline.
+
+A scorer turns a batch of (English) feedback texts into SENTIMENT_SCORE
+values in [-1, 1]; SENTIMENT_CAT and LABELS are derived from the score by
+:class:`labeling.ScoreLabeler` with the warehouse's semantics.
+
+:class:`CortexScorer` sends a batch to ``SNOWFLAKE.CORTEX.SENTIMENT`` in a
+single statement. :class:`HashedNGramScorer` runs locally on CPU: texts
+are tokenized into word n-grams hashed into a fixed-size feature space and
+a whole batch is scored with one sparse matrix-vector product expressed as
+``np.bincount``. Its weights come from a small lexicon, or are fitted to
+scores Cortex already produced (e.g. ``Dataset/Enriched_data.csv``).
+"""
+
+import json
+import re
+import zlib
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from labeling import SCORE_MAX, SCORE_MIN, ScoreLabeler
+
+_TOKEN = re.compile(r"\w+")
+
+# Polarity of common words and phrases in translated patient feedback; phrases
+# longer than the scorer's n-grams would never match, so keep them to three words
+DEFAULT_LEXICON = {
+    "effective": 0.6, "effectively": 0.6, "improved": 0.6, "improvement": 0.6, "better": 0.5,
+    "pleased": 0.6, "satisfied": 0.6, "happy": 0.6, "great": 0.6, "excellent": 0.8, "recommend": 0.6,
+    "helped": 0.5, "well": 0.3, "relief": 0.5, "minimal side effects": 0.3, "changed my life": 0.7,
+    "life has improved": 0.6, "good": 0.4,
+    "unfortunately": -0.6, "poor": -0.6, "worse": -0.7, "worsened": -0.7, "not": -0.2, "no": -0.1,
+    "concerning": -0.5, "severe": -0.6, "serious": -0.5, "adverse": -0.7, "hospitalized": -0.8,
+    "stopped": -0.4, "discontinue": -0.5, "disappointed": -0.6, "alternative treatment": -0.4,
+    "not a good": -0.6, "side effects": -0.2, "pain": -0.4, "allergic reaction": -0.7,
+}
+
+
+class SentimentScorer(ABC):
+    """Interface: ``score(texts)`` returns one score in [-1, 1] per text, NaN where the text is missing"""
+
+    @abstractmethod
+    def score(self, texts):
+        """Scores of ``texts``, one per text"""
+
+    def score_frame(self, df, text_column="T_FEEDBACK", batch_size=50000, labeler=ScoreLabeler()):
+        """Copy of ``df`` with SENTIMENT_SCORE, SENTIMENT_CAT and LABELS computed from ``text_column``"""
+        texts = df[text_column].tolist()
+        scores = np.concatenate([
+            np.asarray(self.score(texts[start:start + batch_size]), dtype=float)
+            for start in range(0, len(texts), batch_size)
+        ]) if texts else np.empty(0)
+        out = df.copy()
+        out["SENTIMENT_SCORE"] = scores
+        return labeler.apply(out)
+
+
+class CortexScorer(SentimentScorer):
+    """``SNOWFLAKE.CORTEX.SENTIMENT`` for a whole batch in one statement via ``execute(sql, params)``"""
+
+    def __init__(self, execute):
+        self.execute = execute
+
+    def score(self, texts):
+        texts = [None if pd.isna(t) else str(t) for t in texts]
+        if not texts:
+            return np.empty(0)
+        df = self.execute("""
+            SELECT f.INDEX AS I, SNOWFLAKE.CORTEX.SENTIMENT(f.VALUE::STRING) AS SCORE
+            FROM TABLE(FLATTEN(INPUT => PARSE_JSON(?))) AS f
+        """, [json.dumps(texts)])
+        scores = np.full(len(texts), np.nan)
+        scores[df["I"].to_numpy(dtype=int)] = pd.to_numeric(df["SCORE"]).to_numpy(dtype=float)
+        return scores
+
+
+@lru_cache(maxsize=1 << 20)
+def _hash(gram):
+    return zlib.crc32(gram.encode("utf-8"))
+
+
+class HashedNGramScorer(SentimentScorer):
+    """Linear model over hashed word n-grams, scored as one sparse product per batch
+
+    Each text's n-gram counts are divided by the square root of its token
+    count so long and short feedback score on the same scale; the score is
+    ``bias + features @ weights`` clipped to [-1, 1].
+    """
+
+    def __init__(self, weights=None, bias=0.0, n_features=1 << 18, ngram_range=(1, 3)):
+        self.n_features = int(n_features)
+        self.ngram_range = tuple(ngram_range)
+        self.weights = np.zeros(self.n_features) if weights is None else np.asarray(weights, dtype=float)
+        self.bias = float(bias)
+
+    @classmethod
+    def from_lexicon(cls, lexicon=None, **kwargs):
+        """Scorer whose weights are the polarities of lexicon words and phrases
+
+        Raises ValueError for an entry whose word count is outside the
+        scorer's ``ngram_range``, since it could never match.
+        """
+        scorer = cls(**kwargs)
+        low, high = scorer.ngram_range
+        for phrase, polarity in (DEFAULT_LEXICON if lexicon is None else lexicon).items():
+            tokens = _TOKEN.findall(phrase.lower())
+            if not low <= len(tokens) <= high:
+                raise ValueError(
+                    f"Lexicon entry {phrase!r} has {len(tokens)} words, outside ngram_range {scorer.ngram_range}"
+                )
+            scorer.weights[scorer._index(" ".join(tokens))] += polarity
+        return scorer
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(weights=data["weights"], bias=float(data["bias"]),
+                   n_features=int(data["n_features"]), ngram_range=tuple(data["ngram_range"]))
+
+    def save(self, path):
+        np.savez_compressed(path, weights=self.weights, bias=self.bias,
+                            n_features=self.n_features, ngram_range=np.array(self.ngram_range))
+
+    def _index(self, gram):
+        return _hash(gram) % self.n_features
+
+    def _grams(self, text):
+        tokens = _TOKEN.findall(text.lower())
+        low, high = self.ngram_range
+        return [
+            " ".join(tokens[i:i + n])
+            for n in range(low, high + 1)
+            for i in range(len(tokens) - n + 1)
+        ], len(tokens)
+
+    def features(self, texts):
+        """Sparse batch features as ``(row_ids, feature_ids, values, missing)`` arrays"""
+        rows, cols, values = [], [], []
+        missing = np.zeros(len(texts), dtype=bool)
+        for row, text in enumerate(texts):
+            if text is None or (isinstance(text, float) and np.isnan(text)):
+                missing[row] = True
+                continue
+            grams, n_tokens = self._grams(str(text))
+            rows.extend([row] * len(grams))
+            cols.extend(_hash(g) for g in grams)
+            values.extend([1.0 / np.sqrt(max(n_tokens, 1))] * len(grams))
+        cols = np.asarray(cols, dtype=np.int64) % self.n_features
+        return np.asarray(rows, dtype=np.int64), cols, np.asarray(values, dtype=float), missing
+
+    def _matvec(self, rows, cols, values, n_rows, weights):
+        return np.bincount(rows, weights=weights[cols] * values, minlength=n_rows)
+
+    def score(self, texts):
+        # Templated feedback repeats a lot, so only distinct texts are featurized
+        codes, distinct = pd.factorize(pd.Series(list(texts), dtype=object))
+        rows, cols, values, _ = self.features(list(distinct))
+        scores = np.clip(self.bias + self._matvec(rows, cols, values, len(distinct), self.weights),
+                         SCORE_MIN, SCORE_MAX)
+        return np.where(codes >= 0, scores[np.maximum(codes, 0)] if len(distinct) else np.nan, np.nan)
+
+    def fit(self, texts, targets, l2=1.0, iterations=100, tol=1e-6):
+        """Ridge-fit the weights to ``targets`` (e.g. Cortex scores) by conjugate gradient
+
+        Rows with a missing text or target are ignored. Returns ``self``.
+        """
+        texts = list(texts)
+        targets = np.asarray(targets, dtype=float)
+        keep = ~pd.isna(pd.Series(texts, dtype=object)).to_numpy() & ~np.isnan(targets)
+        texts = [t for t, k in zip(texts, keep) if k]
+        y = targets[keep]
+        rows, cols, values, _ = self.features(texts)
+        n_rows = len(texts)
+        self.bias = float(y.mean()) if n_rows else 0.0
+
+        def normal(w):  # (X^T X + l2 I) w
+            fitted = self._matvec(rows, cols, values, n_rows, w)
+            return np.bincount(cols, weights=fitted[rows] * values, minlength=self.n_features) + l2 * w
+
+        w = np.zeros(self.n_features)
+        r = np.bincount(cols, weights=(y - self.bias)[rows] * values, minlength=self.n_features)
+        p = r.copy()
+        rs = r @ r
+        for _ in range(iterations):
+            if rs <= tol:
+                break
+            ap = normal(p)
+            alpha = rs / (p @ ap)
+            w += alpha * p
+            r -= alpha * ap
+            rs_next = r @ r
+            p = r + (rs_next / rs) * p
+            rs = rs_next
+        self.weights = w
+        return self
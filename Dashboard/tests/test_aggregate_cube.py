@@ -0,0 +1,120 @@
+import os
+
+import pandas as pd
+import pytest
+
+duckdb = pytest.importorskip("duckdb")
+
+import page_queries
+from aggregate_cube import DEFAULT_CUBES, SIGN_COLUMN, CubeRouter, RoutedPlan, apply_cube_delta, build_cubes
+from local_session import LocalSession
+from query_filters import FeedbackFilter
+
+DATASET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Dataset", "Enriched_data.csv")
+TABLE = "MODIFIED_DATA"
+
+
+@pytest.fixture(scope="module")
+def con():
+    con = duckdb.connect()
+    con.execute(f"CREATE TABLE {TABLE} AS SELECT * FROM read_csv_auto('{DATASET}', dateformat='%m/%d/%Y')")
+    build_cubes(lambda sql: con.execute(sql), TABLE)
+    return con
+
+
+def runner(con, log=None):
+    def run(sql, params=()):
+        if log is not None:
+            log.append(sql)
+        return con.execute(sql, list(params)).df()
+    return run
+
+
+def plans(filters):
+    return [
+        page_queries.executive_plan(TABLE, filters, "2020-01-01", "2023-12-31"),
+        page_queries.geographic_plan(TABLE, filters),
+        page_queries.segmentation_plan(TABLE, filters),
+        page_queries.safety_plan(TABLE, filters),
+    ]
+
+
+@pytest.mark.parametrize("filters", [FeedbackFilter.of(), FeedbackFilter.of(regions=["Eu", "Apac"], drugs=["Crestor"])],
+                         ids=["unfiltered", "filtered"])
+def test_routed_plans_match_the_base_table(con, filters):
+    router = CubeRouter(TABLE)
+    for plan in plans(filters):
+        expected = plan.run(runner(con))
+        routed = router.route(plan)
+        assert isinstance(routed, RoutedPlan), plan.name
+        actual = routed.run(runner(con))
+        assert actual.keys() == expected.keys()
+        for name in expected:
+            pd.testing.assert_frame_equal(actual[name], expected[name], check_dtype=False, obj=f"{plan.name}.{name}")
+
+
+def test_cubes_answer_the_safety_ranking_without_the_base_table(con):
+    log = []
+    plan = CubeRouter(TABLE).route(page_queries.safety_plan(TABLE, FeedbackFilter.of(countries=["France"])))
+    plan.run(runner(con, log))
+    scans = [sql for sql in log if f"FROM {TABLE} " in sql + " "]
+    assert [sql for sql in log if "_CUBE_" in sql]
+    assert all("SIDE_EFFECTS_REPORTED" in sql for sql in scans)
+
+
+def test_date_filters_stay_on_the_base_table():
+    router = CubeRouter(TABLE)
+    plan = page_queries.geographic_plan(TABLE, FeedbackFilter.of("2020-01-01", "2020-12-31"))
+    assert router.route(plan) is plan
+
+
+def test_sync_uses_only_cubes_no_older_than_the_base_table():
+    session = LocalSession(backend="sqlite", schema="SCHEMA")
+    execute = lambda sql, params=None: session.sql(sql, params=params).to_pandas()
+    base = f"DB.SCHEMA.{TABLE}"
+    router = CubeRouter(base)
+    plan = page_queries.geographic_plan(base, FeedbackFilter.of())
+
+    router.sync("v1", execute)
+    assert router.available == ()
+    assert router.route(plan, router.available) is plan
+
+    build_cubes(execute, base)
+    router.sync("v1", execute)
+    assert router.available == ()
+    router.sync("v2", execute)
+    assert set(router.available) == set(DEFAULT_CUBES)
+    assert isinstance(router.route(plan, router.available), RoutedPlan)
+
+    execute(f"UPDATE {base} SET DRUG_NAME = 'Crestor' WHERE ID = 1")
+    router.sync("v3", execute)
+    assert router.available == ()
+
+
+def test_sync_only_reads_the_catalog():
+    statements = []
+
+    def execute(sql, params=None):
+        statements.append(sql)
+        return pd.DataFrame({"TABLE_NAME": [], "LAST_ALTERED": []})
+
+    CubeRouter(f"DB.SCHEMA.{TABLE}").sync("v1", execute)
+    assert len(statements) == 1 and statements[0].startswith("SELECT TABLE_NAME, LAST_ALTERED FROM DB.INFORMATION_SCHEMA")
+
+
+@pytest.mark.parametrize("merge", [True, False])
+def test_applying_a_signed_delta_equals_a_rebuild(merge):
+    con = duckdb.connect()
+    con.execute(f"CREATE TABLE {TABLE} AS SELECT * FROM read_csv_auto('{DATASET}', dateformat='%m/%d/%Y')")
+    execute = lambda sql: con.execute(sql)
+    build_cubes(execute, TABLE)
+    changed = f"SELECT * FROM {TABLE} WHERE ID % 7 = 0"
+    con.execute(f"CREATE TABLE delta AS SELECT -1 AS {SIGN_COLUMN}, * FROM ({changed})")
+    con.execute(f"INSERT INTO delta SELECT 1, * REPLACE ('Crestor' AS DRUG_NAME, NULL AS SENTIMENT_SCORE) FROM ({changed})")
+    con.execute(f"UPDATE {TABLE} SET DRUG_NAME = 'Crestor', SENTIMENT_SCORE = NULL WHERE ID % 7 = 0")
+    apply_cube_delta(execute, TABLE, "delta", merge=merge)
+    for cube in DEFAULT_CUBES:
+        keys = list(cube.dimensions)
+        kept = con.execute(f"SELECT * FROM {cube.table_name(TABLE)}").df().sort_values(keys).reset_index(drop=True)
+        rebuilt = con.execute(cube.select_sql(TABLE)).df().sort_values(keys).reset_index(drop=True)
+        pd.testing.assert_frame_equal(kept, rebuilt, check_dtype=False, obj=cube.name)
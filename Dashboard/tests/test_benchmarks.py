@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import benchmarks
+from feedback_etl import transform_stages
+from page_queries import report_query, report_summary_sql
+
+
+def result(name, p50, p95, rows=1000):
+    return {"suite": "query", "group": "executive", "name": name, "backend": "duckdb", "rows": rows,
+            "p50_ms": p50, "p95_ms": p95, "mean_ms": p50, "runs": 5, "peak_python_mb": 1.0, "peak_rss_mb": None}
+
+
+BASELINE = {"results": [result("a", 10, 11), result("b", 10, 11), result("c", 10, 11), result("gone", 1, 1)]}
+CURRENT = {"results": [result("a", 5, 6), result("b", 20, 21), result("c", 10.5, 12), result("added", 1, 1)]}
+
+
+def test_compare_reports_a_verdict_per_statement():
+    table = benchmarks.compare(BASELINE, CURRENT)
+    assert dict(zip(table["NAME"], table["VERDICT"])) == {
+        "a": "faster", "b": "slower", "c": "same", "gone": "missing", "added": "new",
+    }
+    assert table.set_index("NAME").loc["b", "CHANGE"] == 1.0
+
+
+def test_overlapping_ranges_are_not_a_change():
+    table = benchmarks.compare({"results": [result("a", 10, 30)]}, {"results": [result("a", 13, 15)]})
+    assert table["VERDICT"].tolist() == ["same"]
+
+
+def test_compare_command_fails_on_a_slowdown(tmp_path, capsys):
+    for name, data in (("old.json", BASELINE), ("new.json", CURRENT), ("same.json", BASELINE)):
+        (tmp_path / name).write_text(json.dumps(data))
+    assert benchmarks.main(["compare", str(tmp_path / "old.json"), str(tmp_path / "new.json")]) == 1
+    assert benchmarks.main(["compare", str(tmp_path / "old.json"), str(tmp_path / "same.json")]) == 0
+    assert "1 slower" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("backend", ["duckdb", "sqlite"])
+def test_a_small_run_times_every_page_and_stage(backend):
+    report = benchmarks.run_benchmarks(scales=[500], backends=[backend], repeats=1, progress=None)
+    results = report["results"]
+    pages = {r["group"] for r in results if r["suite"] == "query"}
+    assert pages == set(benchmarks.PAGES)
+    assert {r["name"].rsplit("[", 1)[1] for r in results if r["suite"] == "query"} == {"all]", "filtered]"}
+    stages = [r["name"] for r in results if r["suite"] == "etl"]
+    assert stages == [name for name, _ in transform_stages()]
+    assert all(r["runs"] == 1 and r["p50_ms"] >= 0 and r["rows"] == 500 for r in results)
+    session = benchmarks.load_table(backend, 500)
+    assert session.sql(f"SELECT COUNT(DISTINCT ID) AS N FROM {benchmarks.TABLE}").to_pandas()["N"][0] == 500
+
+
+def test_report_sql_lives_in_page_queries():
+    sql, order_by = report_query("Drug Performance Report", "T", "WHERE 1=1")
+    assert order_by.startswith("ORDER BY total_feedback DESC")
+    summary = report_summary_sql(sql, ["DRUG_NAME", "TOTAL_FEEDBACK"])
+    assert "COUNT(DISTINCT DRUG_NAME)" in summary and "COUNTRIES" not in summary
+    with pytest.raises(ValueError):
+        report_query("Weekly Report", "T", "")
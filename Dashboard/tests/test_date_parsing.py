@@ -0,0 +1,46 @@
+import os
+
+import pandas as pd
+
+from date_parsing import DateParser, detect_format
+
+RAW = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Dataset", "NFeedback_Data.csv")
+
+
+def test_detect_format_picks_the_format_most_values_match():
+    assert detect_format(["1/31/2020", "12/1/2021", "1850-01-01"]) == "%m/%d/%Y"
+    assert detect_format(["31/01/2020", "13/12/2021"]) == "%d/%m/%Y"
+    assert detect_format(["2020-01-31", None]) == "%Y-%m-%d"
+    assert detect_format(["soon", "later"]) is None
+
+
+def test_parse_matches_an_explicit_format_on_the_raw_export():
+    raw = pd.read_csv(RAW, keep_default_na=False, na_values=[""])
+    parser = DateParser()
+    for col in ("DOB", "FEEDBACK_DATE", "TREATMENT_START_DATE", "TREATMENT_END_DATE"):
+        expected = pd.to_datetime(raw[col], format="%m/%d/%Y", errors="coerce")
+        pd.testing.assert_series_equal(parser.parse(raw[col]), expected, check_dtype=False)
+        pd.testing.assert_series_equal(parser.parse(raw[col].astype("category")), expected, check_dtype=False)
+    assert set(parser.formats.values()) == {"%m/%d/%Y"}
+
+
+def test_the_detected_format_is_kept_for_later_chunks():
+    parser = DateParser()
+    first = parser.parse(pd.Series(["1/2/2020", "12/31/2020"], name="DOB"))
+    later = parser.parse(pd.Series(["2020-02-01", "3/4/2021", None], name="DOB"))
+    assert first.tolist() == [pd.Timestamp("2020-01-02"), pd.Timestamp("2020-12-31")]
+    assert pd.isna(later[0]) and later[1] == pd.Timestamp("2021-03-04") and pd.isna(later[2])
+    assert parser.formats == {"DOB": "%m/%d/%Y"}
+
+
+def test_typed_dates_pass_through():
+    series = pd.Series(pd.to_datetime(["2020-01-01"]), name="DOB")
+    assert DateParser().parse(series) is series
+
+
+def test_a_format_that_fails_most_values_is_detected_again():
+    parser = DateParser()
+    parser.parse(pd.Series(["1/2/2020", "12/31/2020"], name="DOB"))
+    iso = parser.parse(pd.Series(["2020-01-02", "2020-12-31", "2021-03-04"], name="DOB"))
+    assert iso.tolist() == [pd.Timestamp("2020-01-02"), pd.Timestamp("2020-12-31"), pd.Timestamp("2021-03-04")]
+    assert parser.formats == {"DOB": "%Y-%m-%d"}
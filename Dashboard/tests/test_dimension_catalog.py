@@ -0,0 +1,53 @@
+import duckdb
+import pandas as pd
+
+from dimension_catalog import DimensionCatalogStore, catalog_sql
+
+
+def test_catalog_sql_returns_every_distinct_filter_value():
+    con = duckdb.connect()
+    con.execute(
+        "CREATE TABLE T AS SELECT * FROM (VALUES ('B', 'EU', 'FR', 1), ('A', 'EU', 'DE', 2), "
+        "('A', 'EU', 'DE', 3), ('B', NULL, 'US', 4)) AS v (DRUG_NAME, REGION, COUNTRY, X)"
+    )
+    df = con.execute(catalog_sql("T")).df()
+    store = DimensionCatalogStore()
+    catalog = store.get("v1", lambda: df)
+    assert catalog.drugs == ("A", "B")
+    assert catalog.regions == ("EU",)
+    assert catalog.countries == ("DE", "FR", "US")
+
+
+def test_catalog_reloads_only_when_the_version_changes():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return pd.DataFrame({"DRUG_NAME": ["A"], "REGION": ["EU"], "COUNTRY": ["DE"]})
+
+    store = DimensionCatalogStore()
+    first = store.get("v1", loader)
+    assert store.get("v1", loader) is first
+    assert len(calls) == 1
+    store.get("v2", loader)
+    assert len(calls) == 2
+    store.invalidate()
+    store.get("v2", loader)
+    assert len(calls) == 3
+
+
+def test_catalog_without_version_expires_after_max_age():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return pd.DataFrame({"DRUG_NAME": [], "REGION": [], "COUNTRY": []})
+
+    store = DimensionCatalogStore(max_age_seconds=0)
+    store.get(None, loader)
+    store.get(None, loader)
+    assert len(calls) == 2
+    store = DimensionCatalogStore(max_age_seconds=3600)
+    store.get(None, loader)
+    store.get(None, loader)
+    assert len(calls) == 3
@@ -0,0 +1,59 @@
+import math
+
+import pandas as pd
+import pytest
+
+from disproportionality import ContingencyTable
+
+# Drug X: 20 reports of E among 100; every other drug: 10 reports of E among 900
+COUNTS = pd.DataFrame({
+    "DRUG_NAME": ["X", "X", "X", "Y", "Y", "Y"],
+    "SIDE_EFFECTS_REPORTED": ["E", "None Reported", None, "E", "F", "Unspecified"],
+    "REPORTS": [20, 70, 10, 10, 600, 290],
+})
+
+
+def row(signals, drug, effect):
+    match = signals[(signals["DRUG_NAME"] == drug) & (signals["SIDE_EFFECTS_REPORTED"] == effect)]
+    assert len(match) == 1
+    return match.iloc[0]
+
+
+def test_statistics_of_a_known_two_by_two_table():
+    out = ContingencyTable.from_counts(COUNTS).signals()
+    x = row(out, "X", "E")
+    a, b, c, d = 20, 80, 10, 890
+    assert (x["CASES"], x["DRUG_REPORTS"], x["EFFECT_REPORTS"]) == (a, a + b, a + c)
+    assert x["PRR"] == pytest.approx((a / (a + b)) / (c / (c + d)))
+    assert x["ROR"] == pytest.approx(a * d / (b * c))
+    se = math.sqrt(1 / a - 1 / (a + b) + 1 / c - 1 / (c + d))
+    assert x["PRR_LOWER"] == pytest.approx(x["PRR"] * math.exp(-1.96 * se))
+    n = a + b + c + d
+    assert x["CHI_SQUARE"] == pytest.approx(n * (abs(a * d - b * c) - n / 2) ** 2 / ((a + b) * (c + d) * (a + c) * (b + d)))
+    assert x["SIGNAL"] and x["PRR_SIGNAL"]
+    assert not row(out, "Y", "E")["SIGNAL"]
+    # no-event reports form no pair; the signal ranks first
+    assert len(out) == 3 and out.iloc[0]["DRUG_NAME"] == "X"
+
+
+def test_empty_cells_use_the_haldane_correction():
+    out = ContingencyTable.from_counts(COUNTS).signals()
+    f = row(out, "Y", "F")
+    # no other drug reports F, so c = 0
+    assert f["PRR"] == pytest.approx((600.5 / 901) / (0.5 / 101))
+
+
+def test_incremental_rows_match_counting_everything_at_once():
+    rows = COUNTS.loc[COUNTS.index.repeat(COUNTS["REPORTS"]), ["DRUG_NAME", "SIDE_EFFECTS_REPORTED"]]
+    rows = rows.sample(frac=1, random_state=0).reset_index(drop=True)
+    table = ContingencyTable()
+    for start in range(0, len(rows), 137):
+        table.add_rows(rows.iloc[start:start + 137])
+    pd.testing.assert_frame_equal(table.signals(), ContingencyTable.from_counts(COUNTS).signals())
+    assert table.total == 1000
+
+
+def test_drug_profile_and_empty_table():
+    profile = ContingencyTable.from_counts(COUNTS).drug_profile("Y")
+    assert profile["SIDE_EFFECTS_REPORTED"].tolist() == ["F", "E"]
+    assert ContingencyTable().signals().empty
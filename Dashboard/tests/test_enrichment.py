@@ -0,0 +1,202 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregate_cube import DEFAULT_CUBES, CubeRouter
+from enrichment import CHECKPOINT_TABLE, EnrichmentJob
+from labeling import ScoreLabeler
+from local_session import LocalSession, duckdb
+from sentiment_engine import HashedNGramScorer, SentimentScorer
+
+STAGE = "CREATE OR REPLACE TEMPORARY TABLE T_ENRICH_STAGE AS"
+
+
+class ScriptedWarehouse:
+    """``execute`` that records statements and stages ``batches`` rows at a time"""
+
+    def __init__(self, batches, checkpoint=None, fail_merge=False):
+        self.batches = list(batches)
+        self.checkpoint = checkpoint
+        self.fail_merge = fail_merge
+        self.statements = []
+
+    def __call__(self, sql, params=None):
+        sql = " ".join(sql.split())
+        self.statements.append((sql, params))
+        if sql.startswith(f"SELECT LAST_ID, ROWS_DONE, STATUS FROM {CHECKPOINT_TABLE}"):
+            if self.checkpoint is None:
+                return pd.DataFrame(columns=["LAST_ID", "ROWS_DONE", "STATUS"])
+            return pd.DataFrame([self.checkpoint], columns=["LAST_ID", "ROWS_DONE", "STATUS"])
+        if sql.startswith(STAGE):
+            self.after_id = params[0]
+        if sql.startswith("SELECT COUNT(*) AS N, MAX(ID)"):
+            rows = self.batches.pop(0) if self.batches else 0
+            return pd.DataFrame({"N": [rows], "LAST_ID": [self.after_id + rows if rows else None]})
+        if sql.startswith("UPDATE T AS t") and self.fail_merge:
+            raise RuntimeError("merge failed")
+        if sql.startswith("SELECT COUNT(*) AS SENTENCES"):
+            return pd.DataFrame({"SENTENCES": [6], "DISTINCT_KEYS": [2]})
+        if sql.startswith("SELECT COUNT(*) AS ENTRIES"):
+            # Every memory insert adds the batch's two distinct sentences
+            inserts = sum(s.startswith("INSERT INTO TRANSLATION_MEMORY") for s, _ in self.statements)
+            return pd.DataFrame({"ENTRIES": [2 * inserts]})
+        if sql.startswith(f"INSERT INTO {CHECKPOINT_TABLE}"):
+            self.checkpoint = (params[1], params[2], params[3])
+        return pd.DataFrame()
+
+    def kinds(self):
+        return [sql.split(" (")[0].split(" AS ")[0] for sql, _ in self.statements]
+
+
+def test_each_batch_is_merged_with_its_checkpoint_in_one_transaction():
+    warehouse = ScriptedWarehouse([3, 2])
+    stats = EnrichmentJob("T", warehouse, translation_memory=False).run()
+
+    assert (stats.batches, stats.rows, stats.last_id) == (2, 5, 4)
+    assert warehouse.checkpoint == (4, 5, "complete")
+    stage_params = [params for sql, params in warehouse.statements if sql.startswith(STAGE)]
+    assert stage_params == [[-1], [2], [4]]
+    kinds = warehouse.kinds()
+    first = kinds.index("BEGIN")
+    assert kinds[first:first + 5] == [
+        "BEGIN", "UPDATE T", f"DELETE FROM {CHECKPOINT_TABLE} WHERE JOB = ?", f"INSERT INTO {CHECKPOINT_TABLE}", "COMMIT",
+    ]
+    assert kinds.count("COMMIT") == 2
+
+
+def test_an_interrupted_run_resumes_after_its_checkpoint():
+    warehouse = ScriptedWarehouse([4], checkpoint=(41, 42, "running"))
+    stats = EnrichmentJob("T", warehouse, translation_memory=False).run()
+
+    stage_params = [params for sql, params in warehouse.statements if sql.startswith(STAGE)]
+    assert stage_params[0] == [41]
+    assert stats.rows == 4
+    assert warehouse.checkpoint == (45, 46, "complete")
+
+
+def test_max_batches_leaves_the_checkpoint_running():
+    warehouse = ScriptedWarehouse([10, 10, 10])
+    job = EnrichmentJob("T", warehouse, batch_size=10, translation_memory=False)
+    assert job.run(max_batches=2).rows == 20
+    assert warehouse.checkpoint == (19, 20, "running")
+    assert job.checkpoint() == (19, 20)
+
+
+def test_a_failed_merge_is_rolled_back_without_advancing_the_checkpoint():
+    warehouse = ScriptedWarehouse([3], fail_merge=True)
+    with pytest.raises(RuntimeError):
+        EnrichmentJob("T", warehouse, translation_memory=False).run()
+    assert warehouse.kinds()[-1] == "ROLLBACK"
+    assert warehouse.checkpoint == (-1, 0, "running")
+
+
+def test_pending_rows_include_changed_feedback():
+    condition = EnrichmentJob("T", ScriptedWarehouse([]), translation_memory=False).pending_condition()
+    assert "ENRICHED_HASH <> SHA2(FEEDBACK, 256)" in condition
+    assert "LABELS IS NULL" in condition
+
+
+def test_translations_come_from_the_memory_before_scoring():
+    warehouse = ScriptedWarehouse([3, 2])
+    stats = EnrichmentJob("T", warehouse).run()
+
+    assert (stats.sentences, stats.translated) == (12, 4)
+    stage = next(sql for sql, _ in warehouse.statements if sql.startswith(STAGE))
+    assert "TRANSLATE(FEEDBACK" not in stage
+    statements = [sql for sql, _ in warehouse.statements]
+    memory = next(i for i, sql in enumerate(statements) if sql.startswith("INSERT INTO TRANSLATION_MEMORY"))
+    scoring = next(i for i, sql in enumerate(statements) if sql.startswith("UPDATE T_ENRICH_STAGE SET SENTIMENT_SCORE"))
+    assert memory < scoring
+
+
+BACKENDS = [pytest.param("duckdb", marks=pytest.mark.skipif(duckdb is None, reason="duckdb not installed")), "sqlite"]
+
+
+def untranslated(texts, languages):
+    return texts
+
+
+@pytest.fixture(params=BACKENDS)
+def execute(request):
+    session = LocalSession(backend=request.param)
+    return lambda sql, params=None: session.sql(sql, params=params).to_pandas()
+
+
+def offline_job(execute, batch_size=400):
+    return EnrichmentJob("DB.SCHEMA.MODIFIED_DATA", execute, batch_size=batch_size,
+                         scorer=HashedNGramScorer.from_lexicon(), translate=untranslated)
+
+
+def test_offline_run_resumes_and_labels_every_row(execute):
+    job = offline_job(execute)
+    job.prepare()
+    total = job.pending_count()
+
+    first = job.run(max_batches=2)
+    assert first.rows == 800
+    assert job.checkpoint() == (first.last_id, 800)
+
+    rest = job.run()
+    assert first.rows + rest.rows == total
+    assert job.pending_count() == 0
+
+    df = execute("SELECT FEEDBACK, T_FEEDBACK, SENTIMENT_SCORE, SENTIMENT_CAT, LABELS FROM MODIFIED_DATA ORDER BY ID")
+    expected = ScoreLabeler().apply(df[["SENTIMENT_SCORE"]].astype(float))
+    assert (df["T_FEEDBACK"] == df["FEEDBACK"]).all()
+    assert list(df["LABELS"].astype(str)) == list(expected["LABELS"].astype(str))
+    assert list(df["SENTIMENT_CAT"].astype("Int64")) == list(expected["SENTIMENT_CAT"].astype("Int64"))
+
+
+def test_changed_feedback_is_enriched_again(execute):
+    job = offline_job(execute)
+    job.run()
+    execute("UPDATE MODIFIED_DATA SET FEEDBACK = 'Severe side effects, I feel much worse.' WHERE ID = 5")
+
+    assert job.pending_count() == 1
+    stats = job.run()
+    assert stats.rows == 1
+    row = execute("SELECT LABELS, SENTIMENT_SCORE FROM MODIFIED_DATA WHERE ID = 5")
+    assert row.iloc[0]["SENTIMENT_SCORE"] < 0
+
+
+class UnscoredShortTexts(SentimentScorer):
+    """Like a SENTIMENT call that returns NULL for texts under 150 characters"""
+
+    def __init__(self):
+        self.texts = []
+
+    def score(self, texts):
+        self.texts += texts
+        return np.array([0.5 if len(text) >= 150 else np.nan for text in texts])
+
+
+def test_rows_left_without_a_score_are_not_sent_again(execute):
+    scorer = UnscoredShortTexts()
+    job = EnrichmentJob("DB.SCHEMA.MODIFIED_DATA", execute, scorer=scorer, translate=untranslated)
+    assert job.run().rows > 0
+    unscored = execute("SELECT COUNT(*) AS N FROM MODIFIED_DATA WHERE FEEDBACK IS NOT NULL AND SENTIMENT_SCORE IS NULL")
+    assert int(unscored["N"][0]) > 0
+    assert job.pending_count() == 0
+
+    scorer.texts.clear()
+    assert job.run().rows == 0
+    assert scorer.texts == []
+
+    # A scored row that lost its label is re-derived without scoring again
+    scored = execute("SELECT MIN(ID) AS ID FROM MODIFIED_DATA WHERE SENTIMENT_SCORE IS NOT NULL")["ID"][0]
+    execute("UPDATE MODIFIED_DATA SET LABELS = NULL WHERE ID = ?", [int(scored)])
+    assert job.run().rows == 1
+    assert scorer.texts == []
+    assert job.pending_count() == 0
+
+
+def test_a_run_leaves_current_cubes_for_the_dashboard(execute):
+    offline_job(execute).run(max_batches=1)
+
+    router = CubeRouter("DB.PUBLIC.MODIFIED_DATA")
+    router.sync(None, execute)
+    assert set(router.available) == set(DEFAULT_CUBES)
+    cube = DEFAULT_CUBES[0].table_name("MODIFIED_DATA")
+    totals = execute(f"SELECT SUM(ROW_COUNT) AS N, SUM(SENTIMENT_CAT_COUNT) AS SCORED FROM {cube}")
+    expected = execute("SELECT COUNT(*) AS N, COUNT(SENTIMENT_CAT) AS SCORED FROM MODIFIED_DATA")
+    assert totals.astype(int).iloc[0].tolist() == expected.astype(int).iloc[0].tolist()
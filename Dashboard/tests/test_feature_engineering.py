@@ -0,0 +1,55 @@
+import pandas as pd
+
+from feature_engineering import FeatureStage, word_counts
+
+AS_OF = "2024-06-30"
+
+
+def frame():
+    return pd.DataFrame({
+        "ID": [1, 1, 2, 3],
+        "DOB": pd.to_datetime(["1980-06-30", "1980-06-30", None, "2000-01-01"]),
+        "FEEDBACK_DATE": pd.to_datetime(["2020-06-29", "2020-06-30", "2021-01-01", "2021-01-01"]),
+        "TREATMENT_START_DATE": pd.to_datetime(["2020-01-01", None, "2024-06-01", "2020-01-01"]),
+        "TREATMENT_END_DATE": pd.to_datetime(["2020-01-31", None, None, "2020-01-02"]),
+        "FEEDBACK": ["It worked well.", "Didn't help - self-reported", None, "我很好"],
+    })
+
+
+def test_word_counts_by_script():
+    texts = ["It worked well.", "Didn't help - self-reported", "", None, "我很好", "שָׁלוֹם עוֹלָם", "नमस्ते दुनिया"]
+    assert word_counts(texts).tolist() == [3, 3, 0, 0, 3, 2, 2]
+
+
+def test_japanese_counts_han_characters_and_kana_runs():
+    # 薬 / が / 効 / きました, and コーヒー / を / 飲 / みました; spaced Korean counts by space
+    texts = ["薬が効きました。", "コーヒーを飲みました", "약이 효과가 있었어요"]
+    assert word_counts(texts).tolist() == [4, 4, 3]
+
+
+def test_features_are_integer_with_missing_inputs_left_missing():
+    out = FeatureStage(AS_OF).apply(frame())
+    assert out["AGE_AT_FEEDBACK"].dtype == "Int64"
+    assert out["AGE_AT_FEEDBACK"].tolist()[:2] == [40, 40]
+    assert pd.isna(out["AGE_AT_FEEDBACK"][2])
+    assert out["TREATMENT_END_DATE_FILL"].tolist()[1:3] == [pd.Timestamp(AS_OF)] * 2
+    assert out["TREATMENT_DURATION_DAYS"].tolist()[2:] == [29, 1]
+    assert pd.isna(out["TREATMENT_DURATION_DAYS"][1])
+    assert out["FEEDBACK_WORD_COUNT"].tolist() == [3, 3, 0, 3]
+
+
+def test_feedback_counts_come_from_the_whole_source_when_given():
+    stage = FeatureStage(AS_OF)
+    assert stage.apply(frame())["FEEDBACK_COUNT"].tolist() == [2, 2, 0, 1]
+    counts = pd.Series({1: 5, 2: 1, 3: 1})
+    assert stage.apply(frame(), counts)["FEEDBACK_COUNT"].tolist() == [5, 5, 1, 1]
+
+
+def test_update_recomputes_only_changed_rows():
+    stage = FeatureStage(AS_OF)
+    previous = stage.apply(frame())
+    changed = frame()
+    changed.loc[3, "FEEDBACK"] = "Much better now"
+    updated = stage.update(changed, previous)
+    assert stage.recomputed == 1
+    pd.testing.assert_frame_equal(updated, FeatureStage(AS_OF).apply(changed))
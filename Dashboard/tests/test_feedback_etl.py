@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from feature_engineering import FeatureStage
+from feedback_etl import normalize_sentinels, run_csv_etl, transform
+
+RAW = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Dataset", "NFeedback_Data.csv")
+TODAY = "2024-06-30"
+
+
+def raw_row(**values):
+    row = {col: "x" for col in pd.read_csv(RAW, nrows=0).columns}
+    row.update(ID=1, DOB="1/1/1980", FEEDBACK_DATE="1/1/2020", TREATMENT_START_DATE="1/1/2019",
+               TREATMENT_END_DATE="6/1/2019", LANGUAGE_CODE=" EN ")
+    row.update(values)
+    return row
+
+
+def test_chunked_run_matches_a_single_chunk(tmp_path):
+    whole, chunked = str(tmp_path / "whole.csv"), str(tmp_path / "chunked.csv")
+    whole_stats = run_csv_etl(RAW, whole, chunk_rows=10_000, as_of=TODAY)
+    chunked_stats = run_csv_etl(RAW, chunked, chunk_rows=150, as_of=TODAY)
+
+    assert chunked_stats.chunks == -(-chunked_stats.rows_in // 150)
+    assert (whole_stats.rows_in, whole_stats.rows_out) == (chunked_stats.rows_in, chunked_stats.rows_out)
+    pd.testing.assert_frame_equal(pd.read_csv(whole), pd.read_csv(chunked))
+
+
+def test_feedback_count_spans_chunks():
+    chunks = [pd.DataFrame([raw_row(ID=7)]), pd.DataFrame([raw_row(ID=7), raw_row(ID=8)])]
+    counts = pd.concat(chunks)["ID"].value_counts()
+    out = pd.concat([transform(chunk, counts, FeatureStage(TODAY)) for chunk in chunks])
+    assert out["FEEDBACK_COUNT"].tolist() == [2, 2, 1]
+
+
+def test_sentinels_follow_the_notebook_order():
+    df = pd.DataFrame([raw_row(COMORBIDITIES=np.nan, DOCTOR_NAME="None", ADHERENCE="N/A",
+                               SIDE_EFFECTS_REPORTED="None Reported", GENDER="Not Specified", REGION=np.nan)])
+    out = normalize_sentinels(df).iloc[0]
+    assert out["COMORBIDITIES"] == "Unspecified"
+    assert out["DOCTOR_NAME"] == "Unknown Doctor"
+    assert out["ADHERENCE"] == "Unknown"
+    assert out["SIDE_EFFECTS_REPORTED"] == "None Reported"
+    assert out["GENDER"] == "Unspecified"
+    assert out["REGION"] == "Unspecified"
+
+
+def test_transform_derives_ages_durations_and_drops_implausible_rows():
+    df = pd.DataFrame([
+        raw_row(ID=1, TREATMENT_END_DATE=np.nan),
+        raw_row(ID=2, DOB="1/1/1900"),
+    ])
+    out = transform(df, features=FeatureStage(TODAY))
+    assert out["ID"].tolist() == [1]
+    row = out.iloc[0]
+    assert row["AGE_AT_FEEDBACK"] == 40
+    assert row["TREATMENT_END_DATE_FILL"] == pd.Timestamp(TODAY)
+    assert row["TREATMENT_DURATION_DAYS"] == (pd.Timestamp(TODAY) - pd.Timestamp("2019-01-01")).days
+    assert row["LANGUAGE_CODE"] == "en"
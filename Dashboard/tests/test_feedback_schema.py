@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from feature_engineering import FeatureStage
+from feedback_etl import transform
+from feedback_schema import CATEGORICAL_COLUMNS, CSV_DTYPES, apply_schema, concat_frames, map_categories, memory_bytes
+
+DATASET = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + "/Dataset"
+
+
+def test_apply_schema_uses_compact_dtypes():
+    df = apply_schema(pd.DataFrame({
+        "DRUG_NAME": ["Crestor", "Brilinta", "Crestor"],
+        "FEEDBACK_DATE": ["2020-01-01", "2020-02-01", "not a date"],
+        "AGE_AT_FEEDBACK": [30, 40, 50],
+        "SENTIMENT_CAT": [1, None, 3],
+        "FEEDBACK": ["a", "b", "c"],
+    }))
+    assert isinstance(df["DRUG_NAME"].dtype, pd.CategoricalDtype)
+    assert pd.api.types.is_datetime64_any_dtype(df["FEEDBACK_DATE"]) and df["FEEDBACK_DATE"].isna().tolist()[-1]
+    assert df["AGE_AT_FEEDBACK"].dtype == np.int8
+    assert df["SENTIMENT_CAT"].dtype == np.float64
+    assert not isinstance(df["FEEDBACK"].dtype, pd.CategoricalDtype)
+
+
+def test_schema_frame_is_smaller_than_plain_strings():
+    df = pd.read_csv(f"{DATASET}/Enriched_data.csv")
+    compact = apply_schema(df)
+    columns = list(CATEGORICAL_COLUMNS)
+    assert memory_bytes(compact[columns]) < memory_bytes(df[columns]) / 5
+    assert compact["COUNTRY"].astype(str).tolist() == df["COUNTRY"].astype(str).tolist()
+
+
+def test_concat_frames_unions_categories():
+    a = apply_schema(pd.DataFrame({"COUNTRY": ["France", "Spain"], "ID": [1, 2]}))
+    b = apply_schema(pd.DataFrame({"COUNTRY": ["Japan", "France"], "ID": [3, 4]}))
+    out = concat_frames([a, b])
+    assert isinstance(out["COUNTRY"].dtype, pd.CategoricalDtype)
+    assert out["COUNTRY"].tolist() == ["France", "Spain", "Japan", "France"]
+    assert out["ID"].tolist() == [1, 2, 3, 4]
+
+
+def test_map_categories_merges_values_that_collide():
+    series = pd.Series([" spain", "Spain ", None, "france"], dtype="category", name="COUNTRY")
+    mapped = map_categories(series, lambda values: values.str.strip().str.title())
+    assert sorted(mapped.cat.categories) == ["France", "Spain"]
+    assert mapped.tolist()[:2] == ["Spain", "Spain"] and pd.isna(mapped.tolist()[2])
+
+
+def test_transform_gives_the_same_values_for_categorical_input():
+    raw = pd.read_csv(f"{DATASET}/NFeedback_Data.csv", keep_default_na=False, na_values=[""], nrows=300)
+    categorical = raw.astype({col: dtype for col, dtype in CSV_DTYPES.items() if col in raw.columns})
+    plain = transform(raw, features=FeatureStage("2024-06-30"))
+    compact = transform(categorical, features=FeatureStage("2024-06-30"))
+    pd.testing.assert_frame_equal(compact.astype(str), plain.astype(str))
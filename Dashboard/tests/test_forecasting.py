@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from forecasting import ForecastStore, fit_series, series_key
+from query_filters import FeedbackFilter
+
+MONTHS = pd.period_range("2020-01", "2023-12", freq="M")
+
+
+def panel_frame(shift_drug=None):
+    rows = []
+    for i, month in enumerate(MONTHS):
+        for drug, region, country in (("Alpha", "Eu", "France"), ("Beta", "Apac", "Japan")):
+            score = 3 + np.sin(2 * np.pi * i / 12) + (0.5 if drug == shift_drug and month == MONTHS[-1] else 0)
+            rows.append({"MONTH_YEAR": str(month), "DRUG_NAME": drug, "REGION": region, "COUNTRY": country,
+                         "SENTIMENT_SUM": 10 * score, "SENTIMENT_COUNT": 10, "FEEDBACK_COUNT": 12})
+    return pd.DataFrame(rows)
+
+
+def test_constant_series_forecast_stays_flat():
+    Y = np.full((1, 36), 2.5)
+    Y[0, 5] = np.nan
+    result = fit_series(Y, MONTHS[:36], ["all"], horizon=6)["all"]
+    np.testing.assert_allclose(result.forecast["FORECAST"], 2.5, atol=1e-9)
+    assert result.params["seasonal"] and result.params["observed_months"] == 35
+    assert len(result.history) == 35
+    assert list(result.forecast["MONTH"]) == list(pd.period_range("2023-01", periods=6, freq="M").to_timestamp())
+
+
+def test_short_series_are_fitted_without_seasonality_and_intervals_widen():
+    rng = np.random.default_rng(0)
+    Y = 3 + rng.normal(0, 0.3, (2, 18))
+    results = fit_series(Y, MONTHS[:18], ["a", "b"], horizon=12)
+    for result in results.values():
+        assert not result.params["seasonal"] and result.params["gamma"] == 0.0
+        width = (result.forecast["UPPER"] - result.forecast["LOWER"]).to_numpy()
+        assert (np.diff(width) >= 0).all() and width[0] > 0
+
+
+def test_store_refits_only_series_whose_months_changed():
+    store = ForecastStore(horizon=6)
+    store.refresh(1, panel_frame)
+    # all feedback, two drugs, two regions, two countries
+    assert store.refitted == len(store) == 7
+    store.refresh(1, lambda: pytest.fail("the same version must not reload"))
+    store.refresh(2, lambda: panel_frame(shift_drug="Beta"))
+    # all feedback plus Beta's drug, region and country series
+    assert store.refitted == 4
+
+
+def test_other_selections_are_fitted_on_request_and_kept():
+    store = ForecastStore(horizon=6)
+    with pytest.raises(RuntimeError):
+        store.get(FeedbackFilter.of())
+    store.refresh(1, panel_frame)
+    both = store.get(FeedbackFilter.of(drugs=["Beta", "Alpha"]))
+    assert both.key == series_key(FeedbackFilter.of(drugs=["Alpha", "Beta"]))
+    assert len(store) == 8
+    everything = store.get(FeedbackFilter.of())
+    pd.testing.assert_frame_equal(both.forecast, everything.forecast)
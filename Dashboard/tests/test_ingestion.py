@@ -0,0 +1,173 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from aggregate_cube import DEFAULT_CUBES, build_cubes
+import ingestion
+from ingestion import DirectoryWatcher, MicroBatchIngestor
+from local_session import LocalSession
+
+RAW = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Dataset", "NFeedback_Data.csv")
+TABLE = "MODIFIED_DATA"
+
+
+def raw_records():
+    return pd.read_csv(RAW, keep_default_na=False, na_values=[""])
+
+
+def count(session, where=""):
+    return int(session.sql(f"SELECT COUNT(*) AS N FROM {TABLE} {where}").to_pandas()["N"][0])
+
+
+def assert_cubes_match_a_rebuild(session):
+    for cube in DEFAULT_CUBES:
+        keys = list(cube.dimensions)
+        kept = session.sql(f"SELECT * FROM {cube.table_name(TABLE)}").to_pandas()
+        rebuilt = session.sql(cube.select_sql(TABLE)).to_pandas()
+        pd.testing.assert_frame_equal(
+            kept.sort_values(keys).reset_index(drop=True), rebuilt.sort_values(keys).reset_index(drop=True),
+            check_dtype=False,
+        )
+
+
+@pytest.fixture(params=["duckdb", "sqlite"])
+def fresh_session(request):
+    return LocalSession(backend=request.param)
+
+
+@pytest.fixture
+def session(fresh_session):
+    build_cubes(lambda sql: fresh_session.sql(sql).to_pandas(), TABLE)
+    return fresh_session
+
+
+def new_records(n, offset=100_000):
+    new = raw_records().iloc[:n].copy()
+    new["ID"] += offset
+    return new
+
+
+def test_batches_upsert_by_id_and_keep_the_cubes_current(session):
+    raw = raw_records()
+    before = count(session)
+    new = raw.iloc[:300].copy()
+    new["ID"] += 100_000
+    batch = pd.concat([new, raw.iloc[300:400]], ignore_index=True)
+    ingestor = MicroBatchIngestor(session, as_of="2024-06-30")
+    ids = ingestor.prepare(batch)["ID"]
+    matched = count(session, f"WHERE ID IN ({', '.join(map(str, ids))})")
+    assert matched > 0
+
+    inserted, updated = ingestor.ingest(batch)
+    assert (inserted, updated) == (len(ids) - matched, matched)
+    assert count(session) == before + inserted
+    enriched = session.sql(f"SELECT LABELS, T_FEEDBACK FROM {TABLE} WHERE ID >= 100000").to_pandas()
+    assert len(enriched) == (ids >= 100_000).sum()
+    assert enriched["LABELS"].notna().all() and enriched["T_FEEDBACK"].notna().all()
+    assert_cubes_match_a_rebuild(session)
+
+    # The same IDs again, now all updates
+    again = raw.iloc[300:400].copy()
+    again["DRUG_NAME"] = "Crestor"
+    again_ids = (ids < 100_000).sum()
+    assert ingestor.ingest(again) == (0, again_ids)
+    assert count(session, "WHERE ID BETWEEN 301 AND 400 AND DRUG_NAME = 'Crestor'") == again_ids
+    assert_cubes_match_a_rebuild(session)
+
+
+def test_write_pandas_creates_appends_and_replaces(session):
+    df = pd.DataFrame({"ID": [1, 2], "NAME": ["a", "b"]})
+    with pytest.raises(ValueError):
+        session.write_pandas(df, "SCRATCH")
+    session.write_pandas(df, "SCRATCH", auto_create_table=True)
+    session.write_pandas(df, "SCRATCH")
+    assert session.sql("SELECT COUNT(*) AS N FROM SCRATCH").to_pandas()["N"][0] == 4
+    session.write_pandas(df, "SCRATCH", overwrite=True)
+    catalog = session.sql("SELECT ROW_COUNT FROM DB.INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'SCRATCH'")
+    assert catalog.to_pandas()["ROW_COUNT"].tolist() == [2]
+
+
+def test_run_ingests_settled_files_and_sets_bad_ones_aside(session, tmp_path):
+    raw = raw_records()
+    new = raw.iloc[:50].copy()
+    new["ID"] += 100_000
+    new.to_csv(tmp_path / "a.csv", index=False)
+    raw.iloc[50:80].to_json(tmp_path / "b.jsonl", orient="records", lines=True)
+    (tmp_path / "bad.json").write_text("{not json")
+    (tmp_path / "notes.txt").write_text("ignored")
+    settled = time.time() - 60
+    for name in ("a.csv", "b.jsonl", "bad.json"):
+        os.utime(tmp_path / name, (settled, settled))
+    (tmp_path / "late.csv").write_text(new.iloc[:1].to_csv(index=False))
+
+    watcher = DirectoryWatcher(str(tmp_path))
+    assert [os.path.basename(p) for p in watcher.pending()] == ["a.csv", "b.jsonl", "bad.json"]
+    polls = []
+    stats = MicroBatchIngestor(session, as_of="2024-06-30").run(
+        watcher, poll_seconds=0, stop=lambda: polls.append(1) or len(polls) > 1)
+    assert (stats.batches, stats.files, stats.failed_files, stats.rows_in) == (1, 2, 1, 80)
+    assert sorted(os.listdir(tmp_path / "processed")) == ["a.csv", "b.jsonl"]
+    assert os.listdir(tmp_path / "failed") == ["bad.json"]
+    assert (tmp_path / "late.csv").exists()
+
+
+def test_the_first_batch_creates_missing_cubes(fresh_session):
+    MicroBatchIngestor(fresh_session, as_of="2024-06-30").ingest(new_records(50))
+    assert_cubes_match_a_rebuild(fresh_session)
+
+
+def test_ingested_rows_are_marked_enriched_and_keep_other_columns(session):
+    session.sql(f"ALTER TABLE {TABLE} ADD COLUMN ENRICHED_HASH VARCHAR").to_pandas()
+    session.sql(f"UPDATE {TABLE} SET REPLY = 'Thank you' WHERE ID BETWEEN 301 AND 400").to_pandas()
+    kept = count(session, "WHERE REPLY = 'Thank you'")
+
+    ingestor = MicroBatchIngestor(session, as_of="2024-06-30")
+    ingestor.ingest(pd.concat([new_records(50), raw_records().iloc[300:400]], ignore_index=True))
+
+    assert count(session, "WHERE REPLY = 'Thank you'") == kept
+    ids = ", ".join(map(str, ingestor.prepare(raw_records().iloc[300:400])["ID"]))
+    assert count(session, f"WHERE ID IN ({ids}) AND ENRICHED_HASH = SHA2(FEEDBACK, 256)") == len(ids.split(", "))
+    assert count(session, "WHERE ID >= 100000 AND ENRICHED_HASH = SHA2(FEEDBACK, 256)") == \
+        count(session, "WHERE ID >= 100000")
+
+
+def test_a_failed_batch_is_undone_without_transactions(session, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("cube update failed")
+
+    before = session.sql(f"SELECT * FROM {TABLE} ORDER BY ID").to_pandas()
+    monkeypatch.setattr(ingestion, "apply_cube_delta", fail)
+    changed = raw_records().iloc[300:400].copy()
+    changed["DRUG_NAME"] = "Crestor"
+    with pytest.raises(RuntimeError):
+        MicroBatchIngestor(session, as_of="2024-06-30").ingest(pd.concat([new_records(50), changed]))
+    after = session.sql(f"SELECT * FROM {TABLE} ORDER BY ID").to_pandas()
+    pd.testing.assert_frame_equal(after, before)
+    assert_cubes_match_a_rebuild(session)
+
+
+def test_run_carries_on_after_a_failed_batch(session, tmp_path):
+    settled = time.time() - 60
+    for i, name in enumerate(("a.csv", "b.csv")):
+        new_records(20, offset=100_000 * (i + 1)).to_csv(tmp_path / name, index=False)
+        os.utime(tmp_path / name, (settled + i, settled + i))
+    ingestor = MicroBatchIngestor(session, as_of="2024-06-30")
+    ingest = ingestor.ingest
+    calls = []
+
+    def fail_first(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise RuntimeError("warehouse unavailable")
+        return ingest(batch)
+
+    ingestor.ingest = fail_first
+    polls = []
+    stats = ingestor.run(DirectoryWatcher(str(tmp_path)), poll_seconds=0, max_batch_rows=20,
+                         stop=lambda: polls.append(1) or len(polls) > 2)
+    assert (stats.batches, stats.failed_batches, stats.files, stats.failed_files) == (1, 1, 1, 1)
+    assert stats.last_error == "RuntimeError: warehouse unavailable"
+    assert os.listdir(tmp_path / "failed") == ["a.csv"]
+    assert os.listdir(tmp_path / "processed") == ["b.csv"]
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from labeling import LABEL_BINS, Bins, ScoreLabeler, width_bucket
+
+# The notebook's first-match UPDATE, which the default bins must reproduce
+NOTEBOOK_LABELS = """CASE
+    WHEN SENTIMENT_SCORE BETWEEN 0.70 AND 1.00 THEN 'Cured'
+    WHEN SENTIMENT_SCORE BETWEEN 0.2 AND 0.70 THEN 'Improved'
+    WHEN SENTIMENT_SCORE BETWEEN -0.04 AND 0.2 THEN 'No progress'
+    WHEN SENTIMENT_SCORE BETWEEN -0.5 AND -0.04 THEN 'Worsen'
+    WHEN SENTIMENT_SCORE BETWEEN -1.00 AND -0.5 THEN 'Adverse'
+    ELSE 'Unknown'
+END"""
+
+EDGE_SCORES = [-1.0, -0.5, -0.04, 0.2, 0.7, 1.0]
+
+
+def test_label_edges_belong_to_the_bin_above():
+    assert list(LABEL_BINS.assign(EDGE_SCORES)) == ["Adverse", "Worsen", "No progress", "Improved", "Cured", "Cured"]
+    assert list(LABEL_BINS.assign([-1.01, 1.01, np.nan])) == ["Unknown"] * 3
+
+
+def test_labels_match_the_notebook_case_and_the_generated_sql():
+    duckdb = pytest.importorskip("duckdb")
+    scores = sorted(set(np.round(np.linspace(-1.1, 1.1, 221), 2)) | set(EDGE_SCORES) | {-0.0401, 0.1999, 0.6999})
+    con = duckdb.connect()
+    con.execute("CREATE TABLE S (SENTIMENT_SCORE DOUBLE)")
+    con.executemany("INSERT INTO S VALUES (?)", [[float(s)] for s in scores])
+    df = con.execute(
+        f"SELECT SENTIMENT_SCORE, {NOTEBOOK_LABELS} AS NOTEBOOK, {LABEL_BINS.case_sql('SENTIMENT_SCORE')} AS GENERATED "
+        f"FROM S ORDER BY SENTIMENT_SCORE"
+    ).df()
+    assigned = list(LABEL_BINS.assign(df["SENTIMENT_SCORE"]))
+    assert assigned == df["NOTEBOOK"].tolist()
+    assert assigned == df["GENERATED"].tolist()
+
+
+def test_width_bucket_edges():
+    buckets = width_bucket([-1.5, -1.0, -0.8, -0.8000001, 0.0, 0.19999999999999996, 0.2, 0.9999, 1.0, np.nan])
+    assert list(buckets.astype(object)) == [0, 1, 2, 1, 6, 6, 7, 10, 11, pd.NA]
+
+
+def test_bins_reject_overlaps_and_miscounted_edges():
+    with pytest.raises(ValueError):
+        Bins(edges=(0.0, 0.5, 0.5, 1.0), labels=("a", "b", "c"))
+    with pytest.raises(ValueError):
+        Bins(edges=(0.0, 1.0), labels=("a", "b"))
+
+
+def test_apply_derives_both_columns_from_the_score():
+    df = pd.DataFrame({"SENTIMENT_SCORE": [0.9, -0.9, None], "LABELS": ["Kept", None, None]})
+    labeled = ScoreLabeler().apply(df)
+    assert labeled["SENTIMENT_CAT"].astype(object).tolist() == [10, 1, pd.NA]
+    assert labeled["LABELS"].tolist() == ["Cured", "Adverse", "Unknown"]
+    assert ScoreLabeler().apply(df, only_missing=True)["LABELS"].tolist() == ["Kept", "Adverse", "Unknown"]
+
+
+def test_only_missing_fills_category_gaps_and_keeps_the_rest():
+    df = pd.DataFrame({"SENTIMENT_SCORE": [0.9, -0.9, None], "SENTIMENT_CAT": [3, None, None]}, index=[5, 6, 7])
+    labeled = ScoreLabeler().apply(df, only_missing=True)
+    assert labeled["SENTIMENT_CAT"].astype(object).tolist() == [3, 1, pd.NA]
+    assert labeled.index.tolist() == [5, 6, 7]
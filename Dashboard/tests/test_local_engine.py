@@ -0,0 +1,83 @@
+import pytest
+
+duckdb = pytest.importorskip("duckdb")
+
+from local_engine import CHECKSUM_SQL, LocalAnalyticsEngine
+
+TABLE = "MODIFIED_DATA"
+LABEL_COUNTS = f"SELECT LABELS, COUNT(*) AS N FROM {TABLE} GROUP BY LABELS ORDER BY LABELS"
+
+
+@pytest.fixture
+def source():
+    con = duckdb.connect()
+    con.execute(
+        f"CREATE TABLE {TABLE} AS SELECT i AS ID, DATE '2023-01-01' + CAST(i % 90 AS INTEGER) AS FEEDBACK_DATE, "
+        f"CASE WHEN i % 3 = 0 THEN 'Adverse' ELSE 'Improved' END AS LABELS FROM range(300) t(i)"
+    )
+    return con
+
+
+def fetcher(con, log):
+    def fetch(sql):
+        log.append(sql)
+        return con.execute(sql).df()
+    return fetch
+
+
+def row_count(con):
+    return con.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0]
+
+
+def assert_in_sync(engine, con):
+    local = engine.sql(LABEL_COUNTS)
+    assert local.astype(str).to_dict("records") == con.execute(LABEL_COUNTS).df().astype(str).to_dict("records")
+
+
+def test_first_refresh_loads_the_table_and_sets_the_watermark(source):
+    engine = LocalAnalyticsEngine(TABLE)
+    engine.refresh(fetcher(source, []), version="v1")
+    assert engine.ready and engine.version == "v1"
+    assert engine.watermark == "2023-03-31"
+    assert engine.row_count == 300
+    assert_in_sync(engine, source)
+
+
+def test_refresh_pulls_only_new_rows_when_history_is_unchanged(source):
+    log = []
+    engine = LocalAnalyticsEngine(TABLE, checksum_sql=CHECKSUM_SQL["duckdb"])
+    engine.refresh(fetcher(source, log), version="v1")
+
+    source.execute(f"INSERT INTO {TABLE} VALUES (1000, DATE '2023-04-02', 'Adverse'), (1001, DATE '2023-03-31', 'Worsen')")
+    log.clear()
+    engine.refresh(fetcher(source, log), version="v2", expected_rows=row_count(source))
+
+    assert f"SELECT * FROM {TABLE}" not in log
+    assert engine.row_count == row_count(source)
+    assert engine.watermark == "2023-04-02"
+    assert_in_sync(engine, source)
+
+
+@pytest.mark.parametrize("checksum_sql", [CHECKSUM_SQL["duckdb"], None])
+def test_refresh_sees_updated_old_rows(source, checksum_sql):
+    engine = LocalAnalyticsEngine(TABLE, checksum_sql=checksum_sql)
+    engine.refresh(fetcher(source, []), version="v1")
+
+    source.execute(f"UPDATE {TABLE} SET LABELS = 'Cured' WHERE FEEDBACK_DATE < DATE '2023-02-01'")
+    engine.refresh(fetcher(source, []), version="v2", expected_rows=row_count(source))
+
+    assert engine.version == "v2"
+    assert_in_sync(engine, source)
+
+
+def test_parquet_snapshot_is_reused_with_its_checksum(source, tmp_path):
+    path = str(tmp_path / "snapshot.parquet")
+    LocalAnalyticsEngine(TABLE, snapshot_path=path, checksum_sql=CHECKSUM_SQL["duckdb"]).refresh(
+        fetcher(source, []), version="v1")
+
+    log = []
+    engine = LocalAnalyticsEngine(TABLE, snapshot_path=path, checksum_sql=CHECKSUM_SQL["duckdb"])
+    engine.refresh(fetcher(source, log), version="v1")
+    assert f"SELECT * FROM {TABLE}" not in log
+    assert engine.row_count == 300
+    assert_in_sync(engine, source)
@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+from local_session import LocalSession, load_dataset, local_sql
+
+BACKENDS = ["duckdb", "sqlite"]
+
+
+@pytest.fixture(scope="module", params=BACKENDS)
+def session(request):
+    return LocalSession(backend=request.param)
+
+
+def test_qualified_names_are_reduced_to_the_table():
+    assert local_sql("SELECT * FROM DB.PUBLIC.MODIFIED_DATA m") == "SELECT * FROM MODIFIED_DATA m"
+    assert local_sql("SELECT m.DRUG_NAME FROM MODIFIED_DATA m") == "SELECT m.DRUG_NAME FROM MODIFIED_DATA m"
+
+
+def test_the_dataset_is_loaded_and_catalogued(session):
+    rows = len(load_dataset())
+    assert session.sql("SELECT COUNT(*) AS N FROM DB.PUBLIC.MODIFIED_DATA").to_pandas()["N"][0] == rows
+    catalog = session.sql(
+        "SELECT ROW_COUNT FROM DB.INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = ?", ["MODIFIED_DATA"]
+    ).to_pandas()
+    assert catalog["ROW_COUNT"].tolist() == [rows]
+
+
+def test_date_functions_and_date_parameters(session):
+    df = session.sql(
+        "SELECT YEAR(FEEDBACK_DATE) AS Y, MONTH(FEEDBACK_DATE) AS M, DAY(FEEDBACK_DATE) AS D, COUNT(*) AS N "
+        "FROM MODIFIED_DATA WHERE FEEDBACK_DATE >= ? GROUP BY 1, 2, 3 ORDER BY 1, 2, 3",
+        [pd.Timestamp("2023-01-01").date()],
+    ).to_pandas()
+    data = load_dataset()
+    dates = data.loc[data["FEEDBACK_DATE"] >= "2023-01-01", "FEEDBACK_DATE"]
+    assert df["N"].sum() == len(dates)
+    assert (int(df["Y"][0]), int(df["M"][0]), int(df["D"][0])) == (
+        dates.min().year, dates.min().month, dates.min().day,
+    )
+
+
+def test_batches_and_collect_cover_every_row(session):
+    query = session.sql("SELECT ID, DRUG_NAME FROM MODIFIED_DATA ORDER BY ID")
+    batched = pd.concat(list(query.to_pandas_batches()), ignore_index=True)
+    assert list(batched.columns) == ["ID", "DRUG_NAME"]
+    assert len(batched) == len(query.collect()) == len(load_dataset())
+
+
+def test_create_or_replace_table(session):
+    for n in (1, 2):
+        session.sql(f"CREATE OR REPLACE TABLE SCRATCH AS SELECT {n} AS N").to_pandas()
+    assert session.sql("SELECT N FROM SCRATCH").to_pandas()["N"].tolist() == [2]
+
+
+def test_grouping_sets_support_is_reported():
+    assert LocalSession(dataset_path=None, backend="duckdb").supports_grouping_sets
+    assert not LocalSession(dataset_path=None, backend="sqlite").supports_grouping_sets
+    with pytest.raises(ValueError):
+        LocalSession(dataset_path=None, backend="oracle")
@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from normalization_rules import FEEDBACK_RULES, MISSING, Rule, RuleSet
+
+RAW = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Dataset", "NFeedback_Data.csv")
+
+
+def notebook_chain(df):
+    """FEEDBACK_ETL.ipynb's replace/fillna calls, verbatim"""
+    df = df.replace("N/A", np.nan)
+    df["COMORBIDITIES"] = df["COMORBIDITIES"].fillna("Not Specified")
+    df = df.replace("None", "Not Specified")
+    df = df.replace(np.nan, "Not Specified")
+    df = df.replace("None Reported", "Not Specified")
+    df["DOCTOR_NAME"] = df["DOCTOR_NAME"].replace("Not Specified", "Unknown Doctor")
+    df["ADHERENCE"] = df["ADHERENCE"].replace(["Not Specified"], np.nan).fillna("Unknown")
+    df["SIDE_EFFECTS_REPORTED"] = df["SIDE_EFFECTS_REPORTED"].replace("Not Specified", "None Reported")
+    return df.replace("Not Specified", "Unspecified")
+
+
+def sentinel_frame():
+    values = ["N/A", "None", "None Reported", "Not Specified", None, "Unspecified", "Aspirin"]
+    columns = ["COMORBIDITIES", "DOCTOR_NAME", "ADHERENCE", "SIDE_EFFECTS_REPORTED", "REGION"]
+    return pd.DataFrame({col: values[i:] + values[:i] for i, col in enumerate(columns)}, dtype=object)
+
+
+def as_text(df):
+    return df.astype(object).where(df.notna(), None)
+
+
+@pytest.mark.parametrize("frame", ["sentinels", "raw"])
+def test_rule_set_matches_the_notebook_chain(frame):
+    df = sentinel_frame() if frame == "sentinels" else pd.read_csv(RAW, keep_default_na=False, na_values=[""])
+    expected = notebook_chain(df.copy())
+    actual = RuleSet(FEEDBACK_RULES).apply(df)
+    pd.testing.assert_frame_equal(as_text(actual), as_text(expected))
+
+
+def test_categorical_columns_map_their_categories():
+    df = sentinel_frame()
+    categorical = df.astype("category")
+    actual = RuleSet().apply(categorical)
+    assert all(isinstance(actual[col].dtype, pd.CategoricalDtype) for col in actual)
+    pd.testing.assert_frame_equal(as_text(actual), as_text(notebook_chain(df.copy())))
+
+
+def test_final_value_follows_every_rule_in_order():
+    rules = RuleSet()
+    assert rules.final_value("N/A", "ADHERENCE") == "Unknown"
+    assert rules.final_value(MISSING, "COMORBIDITIES") == "Unspecified"
+    assert rules.final_value("None", "DOCTOR_NAME") == "Unknown Doctor"
+    assert rules.final_value("None Reported", "SIDE_EFFECTS_REPORTED") == "None Reported"
+
+
+def test_untouched_columns_are_passed_through():
+    series = pd.Series(["a", "b"], name="DRUG_NAME", dtype=object)
+    assert RuleSet().apply_column(series) is series
+    custom = RuleSet([Rule(("b",), "c", ("DRUG_NAME",))])
+    assert custom.apply_column(series).tolist() == ["a", "c"]
@@ -0,0 +1,84 @@
+import pandas as pd
+
+import query_cache
+from query_cache import QueryCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def frame(n=10):
+    return pd.DataFrame({"A": range(n)})
+
+
+def test_whitespace_variants_share_an_entry():
+    cache = QueryCache()
+    cache.put("SELECT *\n  FROM   T", ("x",), frame())
+    assert cache.get("SELECT * FROM T", ("x",)) is not None
+    assert cache.get("SELECT * FROM T", ("y",)) is None
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache.time, "monotonic", clock)
+    cache = QueryCache(ttl_seconds=60)
+    cache.put("SELECT 1", (), frame())
+    clock.now += 59
+    assert cache.get("SELECT 1") is not None
+    clock.now += 2
+    assert cache.get("SELECT 1") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = QueryCache(max_entries=2)
+    cache.put("SELECT 1", (), frame())
+    cache.put("SELECT 2", (), frame())
+    cache.get("SELECT 1")
+    cache.put("SELECT 3", (), frame())
+    assert cache.get("SELECT 1") is not None
+    assert cache.get("SELECT 2") is None
+    assert cache.get("SELECT 3") is not None
+
+
+def test_memory_budget_evicts_and_skips_oversized_results():
+    one = query_cache.frame_nbytes(frame(1000))
+    cache = QueryCache(max_bytes=int(one * 2.5))
+    for i in range(3):
+        cache.put(f"SELECT {i}", (), frame(1000))
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes"] <= cache.max_bytes
+    cache.put("SELECT big", (), frame(10000))
+    assert cache.get("SELECT big") is None
+
+
+def test_get_or_load_runs_the_loader_once_and_returns_copies():
+    cache = QueryCache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return frame()
+
+    first = cache.get_or_load("SELECT 1", (), loader)
+    first.loc[0, "A"] = 99
+    second = cache.get_or_load("SELECT 1", (), loader)
+    assert len(calls) == 1
+    assert second.loc[0, "A"] == 0
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_table_version_change_invalidates_only_that_table():
+    cache = QueryCache()
+    cache.put("SELECT * FROM A", (), frame(), tables=("A",))
+    cache.put("SELECT * FROM B", (), frame(), tables=("B",))
+    assert cache.sync_table_version("A", "v1") is False
+    assert cache.sync_table_version("A", "v1") is False
+    assert cache.sync_table_version("A", "v2") is True
+    assert cache.get("SELECT * FROM A") is None
+    assert cache.get("SELECT * FROM B") is not None
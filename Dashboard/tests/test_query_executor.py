@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from query_executor import QueryExecutor, QueryTimeout, fetch_pandas
+
+
+class Job:
+    def __init__(self, seconds):
+        self.done_at = time.monotonic() + seconds
+        self.cancelled = False
+
+    def is_done(self):
+        return time.monotonic() >= self.done_at
+
+    def cancel(self):
+        self.cancelled = True
+
+    def result(self, kind):
+        return pd.DataFrame({"X": [1]})
+
+
+class AsyncFrame:
+    def __init__(self, job):
+        self.job = job
+
+    def collect_nowait(self):
+        return self.job
+
+
+class AsyncSession:
+    def __init__(self, seconds):
+        self.job = Job(seconds)
+
+    def sql(self, sql, params=None):
+        return AsyncFrame(self.job)
+
+
+def test_results_arrive_in_completion_order():
+    executor = QueryExecutor(max_workers=3)
+    try:
+        results = list(executor.iter_completed({
+            "slow": lambda: time.sleep(0.3) or "slow",
+            "fast": lambda: "fast",
+            "medium": lambda: time.sleep(0.1) or "medium",
+        }))
+    finally:
+        executor.shutdown()
+    assert [name for name, _ in results] == ["fast", "medium", "slow"]
+    assert dict(results)["slow"] == "slow"
+
+
+def test_errors_and_timeouts_are_reported_per_task():
+    executor = QueryExecutor(max_workers=2)
+    try:
+        results = executor.run_all({
+            "broken": lambda: 1 / 0,
+            "stuck": lambda: time.sleep(1),
+            "ok": lambda: 42,
+        }, timeout=0.2)
+    finally:
+        executor.shutdown()
+    assert results["ok"] == 42
+    assert isinstance(results["broken"], ZeroDivisionError)
+    assert isinstance(results["stuck"], QueryTimeout)
+
+
+def test_async_query_is_cancelled_after_its_timeout():
+    session = AsyncSession(seconds=5)
+    with pytest.raises(QueryTimeout):
+        fetch_pandas(session, "SELECT 1", timeout=0.1)
+    assert session.job.cancelled
+
+
+def test_async_query_is_cancelled_when_the_event_is_set():
+    session = AsyncSession(seconds=5)
+    event = threading.Event()
+    threading.Timer(0.1, event.set).start()
+    with pytest.raises(QueryTimeout):
+        fetch_pandas(session, "SELECT 1", cancel_event=event)
+    assert session.job.cancelled
+
+
+def test_async_query_returns_its_result():
+    session = AsyncSession(seconds=0.05)
+    assert fetch_pandas(session, "SELECT 1", timeout=5)["X"].tolist() == [1]
+    assert not session.job.cancelled
+
+
+def test_shutdown_cancels_queries_running_with_the_executor_event():
+    session = AsyncSession(seconds=5)
+    executor = QueryExecutor()
+    future = executor.submit(lambda: fetch_pandas(session, "SELECT 1", timeout=10, cancel_event=executor.cancel_event))
+    time.sleep(0.1)
+    executor.shutdown()
+    with pytest.raises(QueryTimeout):
+        future.result(timeout=2)
+    assert session.job.cancelled
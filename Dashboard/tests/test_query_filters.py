@@ -0,0 +1,40 @@
+import datetime
+
+import pytest
+
+duckdb = pytest.importorskip("duckdb")
+
+from query_filters import FeedbackFilter
+
+
+def test_equal_selections_render_identical_sql_and_params():
+    a = FeedbackFilter.of("2020-01-01", "2021-06-30", drugs=["Crestor", "Brilinta", "Crestor"], countries=["France"])
+    b = FeedbackFilter.of(datetime.date(2020, 1, 1), "2021-06-30", drugs=("Brilinta", "Crestor"),
+                          countries={"France"})
+    assert a == b and hash(a) == hash(b)
+    assert a.where() == b.where()
+
+
+def test_params_follow_placeholder_order():
+    where, params = FeedbackFilter.of("2020-01-01", "2020-12-31", drugs=["B", "A"], regions=["Eu"],
+                                      countries=["Spain", "France"]).where()
+    assert where == ("WHERE 1=1 AND FEEDBACK_DATE BETWEEN ? AND ? AND DRUG_NAME IN (?, ?) "
+                     "AND REGION IN (?) AND COUNTRY IN (?, ?)")
+    assert params == (datetime.date(2020, 1, 1), datetime.date(2020, 12, 31), "A", "B", "Eu", "France", "Spain")
+    assert where.count("?") == len(params)
+
+
+def test_statement_text_depends_only_on_the_filter_shape():
+    first, _ = FeedbackFilter.of(drugs=["A", "B"]).where()
+    second, _ = FeedbackFilter.of(drugs=["C", "D"]).where()
+    assert first == second
+    assert FeedbackFilter.of().where() == ("WHERE 1=1", ())
+
+
+def test_quotes_in_values_are_bound_not_spliced():
+    con = duckdb.connect()
+    con.execute("CREATE TABLE T AS SELECT * FROM (VALUES ('O''Brien', DATE '2020-05-01'), ('Other', DATE '2020-05-01')) "
+                "AS v (DRUG_NAME, FEEDBACK_DATE)")
+    where, params = FeedbackFilter.of("2020-01-01", "2020-12-31", drugs=["O'Brien"]).where()
+    assert "O'Brien" not in where
+    assert con.execute(f"SELECT DRUG_NAME FROM T {where}", list(params)).fetchall() == [("O'Brien",)]
@@ -0,0 +1,68 @@
+import os
+
+import pandas as pd
+import pytest
+
+duckdb = pytest.importorskip("duckdb")
+
+import page_queries
+from query_filters import FeedbackFilter
+from query_planner import Aggregation, PagePlan, count, pct_if
+
+DATASET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Dataset", "Enriched_data.csv")
+TABLE = "MODIFIED_DATA"
+FILTERS = FeedbackFilter.of(start_date="2015-01-01", end_date="2023-12-31", regions=["Eu", "Apac", "Latam"])
+
+
+@pytest.fixture(scope="module")
+def run_query():
+    con = duckdb.connect()
+    con.execute(f"CREATE TABLE {TABLE} AS SELECT * FROM read_csv_auto('{DATASET}', dateformat='%m/%d/%Y')")
+
+    def run(sql, params=()):
+        return con.execute(sql, list(params)).df()
+    return run
+
+
+def plans():
+    return [
+        page_queries.executive_plan(TABLE, FILTERS, "2020-01-01", "2023-12-31"),
+        page_queries.drug_performance_plan(TABLE, "Crestor", "2020-01-01", "2023-12-31"),
+        page_queries.geographic_plan(TABLE, FILTERS),
+        page_queries.segmentation_plan(TABLE, FILTERS),
+        page_queries.safety_plan(TABLE, FILTERS),
+    ]
+
+
+@pytest.mark.parametrize("plan", plans(), ids=lambda plan: plan.name)
+def test_grouping_sets_match_one_query_per_chart(run_query, plan):
+    combined = plan.run(run_query)
+    plan.use_grouping_sets = False
+    separate = plan.run(run_query)
+    assert combined.keys() == separate.keys()
+    for name in combined:
+        assert not separate[name].empty or name == "drug_info"
+        pd.testing.assert_frame_equal(combined[name], separate[name], check_dtype=False, obj=name)
+
+
+def test_plan_scans_the_table_once(run_query):
+    plan = page_queries.geographic_plan(TABLE, FILTERS)
+    calls = []
+    plan.run(lambda sql, params=(): calls.append(sql) or run_query(sql, params))
+    assert len(calls) == 1
+    assert "GROUPING SETS" in calls[0]
+
+
+def test_member_predicates_count_only_matching_rows(run_query):
+    plan = PagePlan("test", TABLE, "WHERE 1=1", [
+        Aggregation("all", group_by=("REGION",), measures={"N": count()}, order_by=(("REGION", True),)),
+        Aggregation("adverse", group_by=("REGION",), measures={"N": count(), "PCT": pct_if("GENDER = 'Female'", 1)},
+                    predicate="LABELS = 'Adverse'", order_by=(("REGION", True),)),
+    ])
+    frames = plan.run(run_query)
+    expected = run_query(
+        f"SELECT REGION, COUNT(*) AS N FROM {TABLE} WHERE LABELS = 'Adverse' GROUP BY REGION ORDER BY REGION"
+    )
+    assert frames["adverse"]["REGION"].tolist() == expected["REGION"].tolist()
+    assert frames["adverse"]["N"].tolist() == expected["N"].tolist()
+    assert frames["all"]["N"].sum() == run_query(f"SELECT COUNT(*) FROM {TABLE}").iloc[0, 0]
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+from local_session import LocalSession, duckdb
+from reply_generation import PRIORITY_LABELS, CortexReplyModel, ReplyJob, TemplateReplyModel
+
+BACKENDS = [pytest.param("duckdb", marks=pytest.mark.skipif(duckdb is None, reason="duckdb not installed")), "sqlite"]
+TABLE = "DB.SCHEMA.MODIFIED_DATA"
+
+
+@pytest.fixture(params=BACKENDS)
+def execute(request):
+    session = LocalSession(backend=request.param)
+    execute = lambda sql, params=None: session.sql(sql, params=params).to_pandas()
+    execute("UPDATE MODIFIED_DATA SET REPLY = NULL")
+    return execute
+
+
+def test_offline_run_fills_every_reply_priority_rows_first(execute):
+    model = TemplateReplyModel()
+    job = ReplyJob(TABLE, execute, model, batch_size=100)
+    job.prepare()
+    total = job.pending_count()
+
+    first = job.run(max_batches=1)
+    replied = execute("SELECT LABELS FROM MODIFIED_DATA WHERE REPLY IS NOT NULL")
+    assert first.rows == len(replied) == 100
+    assert replied["LABELS"].isin(PRIORITY_LABELS).all()
+
+    rest = job.run()
+    assert rest.stopped == "done"
+    assert first.rows + rest.rows == total
+    assert job.pending_count() == 0
+    distinct = execute("SELECT COUNT(DISTINCT FEEDBACK) AS N FROM MODIFIED_DATA WHERE FEEDBACK IS NOT NULL")
+    assert model.calls == int(distinct.iloc[0, 0])
+
+
+def test_reply_key_sql_matches_python_key(execute):
+    job = ReplyJob(TABLE, execute, TemplateReplyModel())
+    job.run(max_batches=1)
+    df = execute(f"SELECT REPLY_KEY, {job.key_sql()} AS SQL_KEY, SHA2(FEEDBACK, 256) AS FEEDBACK_HASH "
+                 f"FROM MODIFIED_DATA WHERE REPLY_KEY IS NOT NULL")
+    assert not df.empty
+    assert (df["REPLY_KEY"] == df["SQL_KEY"]).all()
+    assert df["REPLY_KEY"].tolist() == [job.row_key(digest) for digest in df["FEEDBACK_HASH"]]
+
+
+def test_rerun_after_reset_is_served_from_the_cache(execute):
+    ReplyJob(TABLE, execute, TemplateReplyModel()).run()
+    execute("UPDATE MODIFIED_DATA SET REPLY = NULL")
+
+    model = TemplateReplyModel()
+    stats = ReplyJob(TABLE, execute, model).run()
+    assert stats.generated == 0
+    assert model.calls == 0
+    assert stats.cache_hits == stats.rows
+
+
+class FailingModel(TemplateReplyModel):
+    def complete(self, prompt):
+        super().complete(prompt)
+        raise RuntimeError("model unavailable")
+
+
+def test_a_null_completion_is_a_failed_call():
+    model = CortexReplyModel(lambda sql, params: pd.DataFrame({"REPLY": [None]}))
+    with pytest.raises(RuntimeError):
+        model.complete("Thank the patient")
+    ok = CortexReplyModel(lambda sql, params: pd.DataFrame({"REPLY": ["Thank you"]}))
+    assert ok.complete("Thank the patient") == "Thank you"
+
+
+def test_failed_rows_are_skipped_and_end_the_run_at_the_cap(execute):
+    model = FailingModel()
+    stats = ReplyJob(TABLE, execute, model, batch_size=20, max_failed_rows=50).run()
+    assert stats.stopped == "too many failures"
+    assert stats.rows == 0 and 50 <= stats.failed < 70
+    assert model.calls == stats.failed
+    assert execute("SELECT COUNT(*) AS N FROM MODIFIED_DATA WHERE REPLY IS NOT NULL")["N"][0] == 0
@@ -0,0 +1,75 @@
+import os
+
+import pandas as pd
+import pytest
+
+import report_export
+from report_export import ExportDirectory, write_export
+
+BATCHES = [
+    pd.DataFrame({"ID": [1, 2], "DRUG_NAME": ["Crestor", "Brilinta"], "SCORE": [0.5, -0.25]}),
+    pd.DataFrame({"ID": [], "DRUG_NAME": [], "SCORE": []}).astype({"ID": "int64", "SCORE": "float64"}),
+    pd.DataFrame({"ID": [3], "DRUG_NAME": ["Crestor, \"new\""], "SCORE": [0.0]}),
+]
+EXPECTED = pd.concat([BATCHES[0], BATCHES[2]], ignore_index=True)
+
+
+def read_back(export, fmt):
+    if fmt == "Parquet":
+        return pd.read_parquet(export.path)
+    return pd.read_csv(export.path, compression="gzip" if fmt == "CSV (gzip)" else None)
+
+
+@pytest.mark.parametrize("fmt", report_export.available_formats())
+def test_every_batch_is_written_once(fmt):
+    export = write_export(iter(BATCHES), fmt, "safety_report")
+    try:
+        assert export.rows == 3
+        assert export.file_name == "safety_report" + report_export.EXPORT_FORMATS[fmt][0]
+        assert export.size_bytes > 0
+        pd.testing.assert_frame_equal(read_back(export, fmt), EXPECTED, check_dtype=False)
+    finally:
+        export.remove()
+    assert not os.path.exists(export.path)
+
+
+def test_a_failed_export_leaves_no_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(report_export.tempfile, "tempdir", str(tmp_path))
+
+    def batches():
+        yield BATCHES[0]
+        raise RuntimeError("warehouse went away")
+
+    with pytest.raises(RuntimeError):
+        write_export(batches(), "CSV", "report")
+    assert os.listdir(tmp_path) == []
+
+
+def test_export_directory_keeps_only_the_export_for_the_current_key():
+    exports = ExportDirectory()
+    first = exports.write(("filters a", "CSV"), iter(BATCHES), "CSV", "report")
+    assert exports.get(("filters a", "CSV")) is first
+    second = exports.write(("filters a", "CSV (gzip)"), iter(BATCHES), "CSV (gzip)", "report")
+    assert not os.path.exists(first.path)
+    assert os.listdir(exports.path) == [os.path.basename(second.path)]
+
+    assert exports.get(("filters b", "CSV (gzip)")) is None
+    assert os.listdir(exports.path) == []
+
+    directory = exports.path
+    exports.write(("filters b", "CSV"), iter(BATCHES), "CSV", "report")
+    exports.cleanup()
+    assert not os.path.exists(directory)
+
+
+def test_local_engine_streams_query_results_in_chunks():
+    duckdb = pytest.importorskip("duckdb")
+    from local_engine import LocalAnalyticsEngine
+
+    source = duckdb.connect()
+    source.execute("CREATE TABLE MODIFIED_DATA AS SELECT i AS ID, DATE '2023-01-01' AS FEEDBACK_DATE FROM range(5000) t(i)")
+    engine = LocalAnalyticsEngine("MODIFIED_DATA")
+    engine.refresh(lambda sql: source.execute(sql).df())
+    chunks = list(engine.sql_batches("SELECT ID FROM MODIFIED_DATA ORDER BY ID", vectors_per_batch=1))
+    assert len(chunks) > 1
+    assert pd.concat(chunks)["ID"].tolist() == list(range(5000))
@@ -0,0 +1,60 @@
+import pytest
+
+duckdb = pytest.importorskip("duckdb")
+
+from report_pager import KeysetPager, OffsetPager
+
+
+@pytest.fixture(scope="module")
+def con():
+    con = duckdb.connect()
+    # Several rows share each date, so ID has to break ties across page boundaries
+    con.execute(
+        "CREATE TABLE T AS SELECT i AS ID, TIMESTAMP '2023-01-01' + INTERVAL (i % 7) DAY AS FEEDBACK_DATE, "
+        "CASE WHEN i % 2 = 0 THEN 'Eu' ELSE 'Apac' END AS REGION FROM range(250) t(i)"
+    )
+    return con
+
+
+def all_pages(con, pager):
+    pages = []
+    cursor = None
+    while True:
+        sql, params = pager.page_sql(cursor)
+        page = con.execute(sql, list(params)).df()
+        pages.append(page)
+        cursor = pager.next_cursor(page, cursor)
+        if cursor is None:
+            return pages
+
+
+def test_keyset_pages_cover_every_row_once_in_order(con):
+    pager = KeysetPager("SELECT * FROM T WHERE REGION = ?", params=("Eu",), page_size=40)
+    pages = all_pages(con, pager)
+    expected = con.execute("SELECT ID FROM T WHERE REGION = 'Eu' ORDER BY FEEDBACK_DATE DESC, ID DESC").df()
+    assert [len(page) for page in pages] == [40, 40, 40, 5]
+    assert [i for page in pages for i in page["ID"]] == expected["ID"].tolist()
+
+
+def test_keyset_page_after_cursor_starts_strictly_after_it(con):
+    pager = KeysetPager("SELECT * FROM T", keys=(("FEEDBACK_DATE", True), ("ID", True)), page_size=10)
+    first = con.execute(*pager.page_sql()).df()
+    cursor = pager.next_cursor(first)
+    sql, params = pager.page_sql(cursor)
+    second = con.execute(sql, list(params)).df()
+    assert params == (cursor[0], cursor[0], cursor[1])
+    assert set(first["ID"]).isdisjoint(second["ID"])
+    assert (second.iloc[0]["FEEDBACK_DATE"], second.iloc[0]["ID"]) > (first.iloc[-1]["FEEDBACK_DATE"], first.iloc[-1]["ID"])
+
+
+def test_an_exact_multiple_ends_with_an_empty_page(con):
+    pager = KeysetPager("SELECT * FROM T", page_size=125)
+    assert [len(page) for page in all_pages(con, pager)] == [125, 125, 0]
+
+
+def test_offset_pager_pages_grouped_reports(con):
+    sql = "SELECT ID % 30 AS BUCKET, COUNT(*) AS N FROM T GROUP BY 1"
+    pager = OffsetPager(sql, order_by="ORDER BY BUCKET", page_size=12)
+    pages = all_pages(con, pager)
+    assert [len(page) for page in pages] == [12, 12, 6]
+    assert [b for page in pages for b in page["BUCKET"]] == list(range(30))
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+from safety_monitor import EWMA_ALARM_RUN, SafetyMonitor, follow_table
+
+
+def reports(labels, drug="Drug A", country="Spain", start="2024-01-01", first_id=1):
+    return pd.DataFrame({
+        "ID": np.arange(first_id, first_id + len(labels)),
+        "FEEDBACK_DATE": pd.date_range(start, periods=len(labels), freq="D"),
+        "LABELS": labels,
+        "DRUG_NAME": drug,
+        "COUNTRY": country,
+    })
+
+
+def test_ewma_alarms_on_a_run_of_adverse_reports_at_a_high_baseline():
+    monitor = SafetyMonitor()
+    # A series already running at a 60% adverse rate
+    history = ["Adverse", "Adverse", "Improved"] * 20
+    monitor.update(reports(history))
+    spike = monitor.update(reports(["Adverse"] * 15, start="2024-03-01", first_id=100))
+    assert "EWMA" in set(spike["DETECTOR"])
+    assert (spike.loc[spike["DETECTOR"] == "EWMA", "THRESHOLD"] < 1).all()
+
+
+def test_capped_limit_fires_within_the_alarm_run():
+    monitor = SafetyMonitor(cusum_threshold=np.inf)
+    monitor.update(reports(["Adverse", "Improved"] * 30))
+    spike = monitor.update(reports(["Adverse"] * EWMA_ALARM_RUN, start="2024-03-01", first_id=100))
+    assert len(spike) >= 1
+
+
+def test_stable_series_raises_no_alerts():
+    monitor = SafetyMonitor()
+    alerts = monitor.update(reports(["Adverse", "Improved", "Improved", "Cured", "Improved"] * 40))
+    assert alerts.empty
+
+
+class PagedTable:
+    """Session stand-in that serves ``rows`` only through ``to_pandas_batches``"""
+
+    def __init__(self, rows, batch_rows):
+        self.rows = rows
+        self.batch_rows = batch_rows
+        self.statements = []
+
+    def sql(self, sql, params=None):
+        self.statements.append(sql)
+        rows = self.rows.sort_values(["FEEDBACK_DATE", "ID"])
+        if params:
+            rows = rows[rows["FEEDBACK_DATE"] >= pd.Timestamp(params[0])]
+        return PagedResult(rows, self.batch_rows)
+
+
+class PagedResult:
+    def __init__(self, rows, batch_rows):
+        self.rows = rows
+        self.batch_rows = batch_rows
+
+    def to_pandas_batches(self):
+        for start in range(0, len(self.rows), self.batch_rows):
+            yield self.rows.iloc[start:start + self.batch_rows]
+
+
+def test_follow_table_pages_each_poll_and_feeds_every_row_once():
+    table = PagedTable(reports(["Positive"] * 30), batch_rows=7)
+    monitor = SafetyMonitor()
+    polls = []
+
+    def stop():
+        polls.append(1)
+        if len(polls) == 2:
+            # One more report on the watermark day, and a late one dated well before it
+            table.rows = pd.concat([table.rows, reports(["Adverse"], start="2024-01-30", first_id=31),
+                                    reports(["Adverse"], start="2024-01-10", first_id=32)])
+        return len(polls) > 2
+
+    fed = []
+    for batch in follow_table(table, "FEEDBACK", monitor, poll_seconds=0, stop=stop):
+        assert len(batch) <= 7
+        monitor.update(batch)
+        fed += batch["ID"].tolist()
+
+    assert sorted(fed) == list(range(1, 32))
+    assert all("ORDER BY FEEDBACK_DATE, ID" in sql for sql in table.statements)
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sentiment_engine import _TOKEN, DEFAULT_LEXICON, HashedNGramScorer, SentimentScorer
+
+
+def test_every_default_lexicon_entry_fits_the_ngram_range():
+    low, high = HashedNGramScorer().ngram_range
+    for phrase in DEFAULT_LEXICON:
+        assert low <= len(_TOKEN.findall(phrase.lower())) <= high, phrase
+
+
+def test_lexicon_entries_longer_than_the_ngrams_are_rejected():
+    with pytest.raises(ValueError):
+        HashedNGramScorer.from_lexicon({"quality of life has improved": 0.6})
+
+
+def test_multi_word_phrases_move_the_score():
+    scorer = HashedNGramScorer.from_lexicon({"not a good": -0.6, "life has improved": 0.6})
+    negative, positive, neutral = scorer.score(["It was not a good fit", "My life has improved", "It was a fit"])
+    assert negative < neutral < positive
+
+
+def test_missing_texts_score_nan_and_scores_stay_in_range():
+    scores = HashedNGramScorer.from_lexicon().score(
+        ["excellent excellent excellent great great", None, "worse severe adverse hospitalized", float("nan")]
+    )
+    assert scores[0] > 0 and scores[2] < 0
+    assert np.isnan(scores[1]) and np.isnan(scores[3])
+    assert np.nanmax(np.abs(scores)) <= 1
+
+
+def test_score_frame_is_the_same_for_any_batch_size():
+    df = pd.DataFrame({"T_FEEDBACK": ["I am pleased", None, "Severe pain", "It helped", "Not a good fit"]})
+    scorer = HashedNGramScorer.from_lexicon()
+    whole = scorer.score_frame(df)
+    split = scorer.score_frame(df, batch_size=2)
+    pd.testing.assert_frame_equal(whole, split)
+    assert whole["SENTIMENT_CAT"].isna().tolist() == [False, True, False, False, False]
+
+
+def test_fit_learns_the_targets_and_survives_a_round_trip(tmp_path):
+    texts = ["the drug worked and I feel fine", "terrible rash and dizziness", "no change at all"] * 20
+    targets = [0.8, -0.7, 0.0] * 20
+    scorer = HashedNGramScorer(n_features=1 << 12).fit(texts, targets, l2=0.1)
+    fitted = scorer.score(texts[:3])
+    assert np.allclose(fitted, [0.8, -0.7, 0.0], atol=0.1)
+
+    path = str(tmp_path / "scorer.npz")
+    scorer.save(path)
+    assert np.allclose(HashedNGramScorer.load(path).score(texts[:3]), fitted)
+
+
+def test_scorers_must_implement_score():
+    class Unfinished(SentimentScorer):
+        pass
+
+    class Constant(SentimentScorer):
+        def score(self, texts):
+            return [0.5] * len(texts)
+
+    with pytest.raises(TypeError):
+        Unfinished()
+    out = Constant().score_frame(pd.DataFrame({"T_FEEDBACK": ["a", "b"]}))
+    assert out["SENTIMENT_SCORE"].tolist() == [0.5, 0.5]
+    assert out["LABELS"].notna().all()
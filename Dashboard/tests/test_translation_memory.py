@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+from enrichment import EnrichmentJob
+from local_session import LocalSession
+from translation_memory import SENTENCE_PATTERN, TranslationMemory
+
+
+def split_sentences(text):
+    duckdb = pytest.importorskip("duckdb")
+    parts = duckdb.execute("SELECT regexp_extract_all(?, ?)", [text, SENTENCE_PATTERN]).fetchone()[0]
+    return [" ".join(part.split()) for part in parts if part.strip()]
+
+
+def test_sentences_end_at_a_terminator_followed_by_space():
+    assert split_sentences("Take 2.5 mg daily. It helped!  Would I recommend it? Yes") == [
+        "Take 2.5 mg daily.", "It helped!", "Would I recommend it?", "Yes",
+    ]
+
+
+def test_cjk_full_stops_always_end_a_sentence():
+    assert split_sentences("薬が効きました。副作用はありません。") == ["薬が効きました。", "副作用はありません。"]
+
+
+class MemoryWarehouse:
+    def __init__(self, sentences, new_keys):
+        self.sentences = sentences
+        self.new_keys = new_keys
+        self.statements = []
+
+    def __call__(self, sql, params=None):
+        sql = " ".join(sql.split())
+        self.statements.append((sql, params))
+        if sql.startswith("SELECT COUNT(*) AS SENTENCES"):
+            return pd.DataFrame({"SENTENCES": [self.sentences], "DISTINCT_KEYS": [min(self.sentences, 3)]})
+        if sql.startswith("SELECT COUNT(*) AS ENTRIES"):
+            inserted = any(s.startswith("INSERT INTO TRANSLATION_MEMORY") for s, _ in self.statements)
+            return pd.DataFrame({"ENTRIES": [10 + (self.new_keys if inserted else 0)]})
+        return pd.DataFrame()
+
+
+def test_only_keys_missing_from_the_memory_are_translated():
+    warehouse = MemoryWarehouse(sentences=8, new_keys=1)
+    counts = TranslationMemory(warehouse).translate_into("STAGE")
+
+    assert counts == {"sentences": 8, "distinct": 3, "translated": 1}
+    insert, params = next((s, p) for s, p in warehouse.statements if s.startswith("INSERT INTO TRANSLATION_MEMORY"))
+    assert "LEFT JOIN TRANSLATION_MEMORY AS t" in insert and "WHERE t.TEXT_HASH IS NULL" in insert
+    assert params == ["en", "en", "en"]
+    assert any(s.startswith("UPDATE STAGE SET T_FEEDBACK = r.TRANSLATED") for s, _ in warehouse.statements)
+
+
+def test_a_batch_without_sentences_calls_no_translation():
+    warehouse = MemoryWarehouse(sentences=0, new_keys=0)
+    counts = TranslationMemory(warehouse).translate_into("STAGE")
+
+    assert counts["translated"] == 0
+    assert not any("TRANSLATE(" in s for s, _ in warehouse.statements)
+    assert warehouse.statements[-1][0].startswith("UPDATE STAGE SET T_FEEDBACK = FEEDBACK")
+
+
+@pytest.mark.parametrize("backend", ["duckdb", "sqlite"])
+def test_other_backends_are_told_the_memory_needs_snowflake(backend):
+    session = LocalSession(backend=backend)
+    execute = lambda sql, params=None: session.sql(sql, params=params).to_pandas()
+    columns = list(execute("SELECT * FROM MODIFIED_DATA LIMIT 0").columns)
+    with pytest.raises(RuntimeError, match="translation_memory=False"):
+        EnrichmentJob("MODIFIED_DATA", execute).run()
+    assert list(execute("SELECT * FROM MODIFIED_DATA LIMIT 0").columns) == columns
+
+
+def test_prepare_creates_the_table_where_the_probe_runs():
+    warehouse = MemoryWarehouse(sentences=0, new_keys=0)
+    TranslationMemory(warehouse).prepare()
+    assert warehouse.statements[-1][0].startswith("CREATE TABLE IF NOT EXISTS TRANSLATION_MEMORY")
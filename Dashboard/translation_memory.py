@@ -0,0 +1,128 @@
+"""Content-addressed translation memory in front of Cortex TRANSLATE.
+
+Feedback text is split into sentences, and every sentence is looked up in
+``TRANSLATION_MEMORY`` by ``(SHA-256 of the whitespace-normalized
+sentence, source LANGUAGE_CODE, target language)``. Only sentences the
+memory has never seen are sent to TRANSLATE, once per distinct key, and
+the translated sentences are joined back in their original order. The
+source feedback repeats sentences such as "It has changed my life for the
+better." across thousands of rows and uses a few templates per language,
+so most of a batch is answered from the memory.
+
+The memory's SQL (``LATERAL FLATTEN``, ``REGEXP_SUBSTR_ALL``, ``LISTAGG``
+and Cortex) only runs on Snowflake; :meth:`TranslationMemory.prepare`
+fails with an explanation anywhere else. Offline, enrichment translates
+with a Python ``translate`` function instead.
+"""
+
+CORTEX_TRANSLATE = "SNOWFLAKE.CORTEX.TRANSLATE"
+MEMORY_TABLE = "TRANSLATION_MEMORY"
+TARGET_LANGUAGE = "en"
+
+# A sentence runs up to a terminator followed by whitespace or the end of the
+# text, so "2.5 mg" stays whole; CJK full stops always end a sentence.
+SENTENCE_PATTERN = "([^.!?。！？]|[.!?][^[:space:]])+[.!?。！？]*"
+
+
+def normalized(expr):
+    """SQL for ``expr`` with runs of whitespace collapsed and the ends trimmed"""
+    return f"TRIM(REGEXP_REPLACE({expr}, '[[:space:]]+', ' '))"
+
+
+class TranslationMemory:
+    """Sentence-level translation cache kept in ``table``, driven by ``execute(sql, params) -> DataFrame``"""
+
+    def __init__(self, execute, table=MEMORY_TABLE, target=TARGET_LANGUAGE):
+        self.execute = execute
+        self.table = table
+        self.target = target
+
+    def prepare(self):
+        try:
+            self.execute("SELECT ARRAY_SIZE(REGEXP_SUBSTR_ALL('a.', '[^.]+')) AS N")
+        except Exception as exc:
+            raise RuntimeError(
+                "The translation memory needs Snowflake (REGEXP_SUBSTR_ALL, FLATTEN and Cortex TRANSLATE); "
+                "on other backends pass translation_memory=False or a translate function to EnrichmentJob"
+            ) from exc
+        self.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            f"TEXT_HASH STRING, SOURCE_LANG STRING, TARGET_LANG STRING, "
+            f"SOURCE_TEXT STRING, TRANSLATION STRING, CREATED_AT TIMESTAMP_NTZ)"
+        )
+
+    def size(self):
+        df = self.execute(f"SELECT COUNT(*) AS ENTRIES FROM {self.table} WHERE TARGET_LANG = ?", [self.target])
+        return int(df.iloc[0, 0])
+
+    def translate_into(self, table, text_column="FEEDBACK", lang_column="LANGUAGE_CODE", output_column="T_FEEDBACK"):
+        """Fill ``output_column`` of every ``table`` row where it is NULL
+
+        ``table`` must be keyed by ``ID``. Returns ``{"sentences", "distinct",
+        "translated"}``: sentences seen, distinct memory keys among them, and
+        keys that had to be sent to TRANSLATE.
+        """
+        segments = f"{table.split('.')[-1]}_SEGMENTS"
+        self.execute(f"""
+            CREATE OR REPLACE TEMPORARY TABLE {segments} AS
+            SELECT ID, SEGMENT_NO, SEGMENT, SOURCE_LANG, SHA2(SEGMENT, 256) AS TEXT_HASH
+            FROM (
+                SELECT s.ID, f.INDEX AS SEGMENT_NO, {normalized('f.VALUE::STRING')} AS SEGMENT,
+                       LOWER(s.{lang_column}) AS SOURCE_LANG
+                FROM {table} AS s,
+                     LATERAL FLATTEN(INPUT => REGEXP_SUBSTR_ALL(s.{text_column}, '{SENTENCE_PATTERN}')) AS f
+                WHERE s.{output_column} IS NULL
+            ) AS split
+            WHERE SEGMENT <> ''
+        """)
+        df = self.execute(f"""
+            SELECT COUNT(*) AS SENTENCES, COUNT(DISTINCT TEXT_HASH || '|' || SOURCE_LANG) AS DISTINCT_KEYS
+            FROM {segments}
+        """)
+        counts = {"sentences": int(df.iloc[0, 0]), "distinct": int(df.iloc[0, 1]), "translated": 0}
+        if counts["sentences"] == 0:
+            self._fill_untranslatable(table, text_column, output_column)
+            return counts
+
+        before = self.size()
+        self.execute(f"""
+            INSERT INTO {self.table} (TEXT_HASH, SOURCE_LANG, TARGET_LANG, SOURCE_TEXT, TRANSLATION, CREATED_AT)
+            SELECT m.TEXT_HASH, m.SOURCE_LANG, ?, m.SEGMENT,
+                   {CORTEX_TRANSLATE}(m.SEGMENT, m.SOURCE_LANG, ?), CURRENT_TIMESTAMP()
+            FROM (
+                SELECT TEXT_HASH, SOURCE_LANG, MIN(SEGMENT) AS SEGMENT
+                FROM {segments}
+                GROUP BY TEXT_HASH, SOURCE_LANG
+            ) AS m
+            LEFT JOIN {self.table} AS t
+              ON t.TEXT_HASH = m.TEXT_HASH AND t.SOURCE_LANG = m.SOURCE_LANG AND t.TARGET_LANG = ?
+            WHERE t.TEXT_HASH IS NULL
+        """, [self.target, self.target, self.target])
+        counts["translated"] = self.size() - before
+
+        self.execute(f"""
+            UPDATE {table}
+            SET {output_column} = r.TRANSLATED
+            FROM (
+                SELECT g.ID, LISTAGG(t.TRANSLATION, ' ') WITHIN GROUP (ORDER BY g.SEGMENT_NO) AS TRANSLATED
+                FROM {segments} AS g
+                JOIN (  -- one entry per key even if two jobs raced to insert it
+                    SELECT TEXT_HASH, SOURCE_LANG, MIN(TRANSLATION) AS TRANSLATION
+                    FROM {self.table}
+                    WHERE TARGET_LANG = ?
+                    GROUP BY TEXT_HASH, SOURCE_LANG
+                ) AS t
+                  ON t.TEXT_HASH = g.TEXT_HASH AND t.SOURCE_LANG = g.SOURCE_LANG
+                GROUP BY g.ID
+            ) AS r
+            WHERE {table}.ID = r.ID
+        """, [self.target])
+        self._fill_untranslatable(table, text_column, output_column)
+        return counts
+
+    def _fill_untranslatable(self, table, text_column, output_column):
+        # Blank text has no sentences; keep it as-is
+        self.execute(f"""
+            UPDATE {table} SET {output_column} = {text_column}
+            WHERE {output_column} IS NULL AND {normalized(text_column)} = ''
+        """)